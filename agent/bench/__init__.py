@@ -0,0 +1,25 @@
+"""
+Offline load test of the agent.
+
+Runs simulated rooms in process against fake LiveKit rooms, LLM, TTS and PostgREST, reports turn
+latency percentiles, event loop lag, task counts and memory, and compares them to a JSON baseline:
+
+    python -m bench --rooms 50 --baseline bench/baseline.json
+
+`python -m bench.decode` compares the TTS decoders with decoding through pydub and ffmpeg.
+`python -m bench.llm_stub` serves OpenAI-compatible chat completions to run the agent against.
+
+The settings get defaults here, before the modules of the agent are imported by the entry points.
+"""
+import os
+
+# the settings require these, nothing is sent to the real services
+for _name, _value in (
+    ("AGENT_ID", "bench-agent-0"),
+    ("AGENT_NAME", "Bench0"),
+    ("LIVEKIT_URL", "ws://127.0.0.1:7880"),
+    ("LIVEKIT_API_KEY", "bench"),
+    ("LIVEKIT_API_SECRET", "bench"),
+    ("OPENAI_API_KEY", "bench"),
+):
+    os.environ.setdefault(_name, _value)
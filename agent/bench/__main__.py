@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import json
+import logging
+import sys
+
+from .fakes import LLMProfile, STTProfile, TTSProfile
+from .harness import BenchConfig, compare, run_bench
+
+
+def _parse_args() -> argparse.Namespace:
+    defaults = BenchConfig()
+    llm = LLMProfile()
+    tts = TTSProfile()
+    stt = STTProfile()
+
+    parser = argparse.ArgumentParser(prog="python -m bench", description=__doc__)
+    parser.add_argument("--rooms", type=int, default=defaults.rooms)
+    parser.add_argument("--agents", type=int, default=defaults.agents, help="agents the rooms are spread over")
+    parser.add_argument("--turns", type=int, default=defaults.turns, help="chat messages per room")
+    parser.add_argument("--think-time", type=float, default=defaults.think_time)
+    parser.add_argument("--ramp", type=float, default=defaults.ramp, help="seconds over which rooms start")
+    parser.add_argument("--config-update-turn", type=int, default=defaults.config_update_turn)
+    parser.add_argument("--no-tts-streaming", dest="tts_streaming", action="store_false")
+    parser.add_argument("--tts-format", default=defaults.tts_format, choices=("pcm", "wav", "mp3", "opus"))
+    parser.add_argument("--postgrest-latency", type=float, default=defaults.postgrest_latency)
+    parser.add_argument("--llm-first-token", type=float, default=llm.first_token_latency)
+    parser.add_argument("--llm-token-interval", type=float, default=llm.token_interval)
+    parser.add_argument("--reply-words", type=int, default=llm.reply_words)
+    parser.add_argument("--llm-stall-rate", type=float, default=llm.stall_rate, help="share of late first tokens")
+    parser.add_argument("--llm-stall-latency", type=float, default=llm.stall_latency)
+    parser.add_argument("--llm-error-rate", type=float, default=llm.error_rate)
+    parser.add_argument("--llm-backends", type=int, default=defaults.llm_backends, help="routed backends")
+    parser.add_argument("--hedge-delay", type=float, default=defaults.hedge_delay, help="0 disables hedging")
+    parser.add_argument("--tts-first-byte", type=float, default=tts.first_byte_latency)
+    parser.add_argument("--tts-chars-per-second", type=float, default=tts.chars_per_second)
+    parser.add_argument("--voice", action="store_true", help="speak the turns instead of chatting")
+    parser.add_argument("--speech-seconds", type=float, default=defaults.speech_seconds)
+    parser.add_argument("--stt-final-latency", type=float, default=stt.final_latency)
+    parser.add_argument("--trace-memory", action="store_true", help="also report the tracemalloc peak")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--baseline", help="JSON report to compare with, exits with 1 on regressions")
+    parser.add_argument("--update-baseline", action="store_true", help="write the report to --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="relative slowdown tolerated")
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = _parse_args()
+    logging.basicConfig(level=args.log_level)
+
+    config = BenchConfig(
+        rooms=args.rooms,
+        agents=args.agents,
+        turns=args.turns,
+        think_time=args.think_time,
+        ramp=args.ramp,
+        config_update_turn=args.config_update_turn,
+        tts_streaming=args.tts_streaming,
+        tts_format=args.tts_format,
+        postgrest_latency=args.postgrest_latency,
+        llm=LLMProfile(
+            first_token_latency=args.llm_first_token,
+            token_interval=args.llm_token_interval,
+            reply_words=args.reply_words,
+            stall_rate=args.llm_stall_rate,
+            stall_latency=args.llm_stall_latency,
+            error_rate=args.llm_error_rate,
+        ),
+        llm_backends=args.llm_backends,
+        hedge_delay=args.hedge_delay,
+        tts=TTSProfile(first_byte_latency=args.tts_first_byte, chars_per_second=args.tts_chars_per_second),
+        voice=args.voice,
+        speech_seconds=args.speech_seconds,
+        stt=STTProfile(final_latency=args.stt_final_latency),
+        trace_memory=args.trace_memory,
+        seed=args.seed,
+    )
+    report = asyncio.run(run_bench(config))
+    text = json.dumps(report, indent=2)
+    print(text)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    if not args.baseline:
+        return 0
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            f.write(text + "\n")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != report["config"]:
+        print("warning: the baseline was recorded with a different configuration", file=sys.stderr)
+
+    regressions = compare(report, baseline, args.tolerance)
+    for name, base, value in regressions:
+        print(f"regression: {name} {base:g} -> {value:g}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
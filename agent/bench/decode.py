@@ -0,0 +1,196 @@
+"""
+Benchmark of the TTS decoders against decoding through pydub, which runs an ffmpeg subprocess per
+utterance:
+
+    python -m bench.decode --utterances 200 --concurrency 8
+
+Every path decodes the same synthetic utterance, fed in chunks like a downloading response. MP3 and
+Opus inputs are encoded with PyAV, or with pydub for MP3, unless `--mp3` gives a file; paths whose
+input or decoder is unavailable are reported as skipped.
+"""
+import argparse
+import io
+import json
+import resource
+import sys
+import time
+import tracemalloc
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+from plugins.openai.tts_codecs import PCM_NUM_CHANNELS, PCM_SAMPLE_RATE, create_decoder
+from .harness import percentiles
+
+Decode = Callable[[bytes], int]
+
+
+def _utterance(seconds: float) -> bytes:
+    """A voiced-like signal, harmonics of a gliding pitch, as 16-bit PCM."""
+    t = np.arange(int(seconds * PCM_SAMPLE_RATE)) / PCM_SAMPLE_RATE
+    pitch = 2 * np.pi * np.cumsum(180 + 40 * np.sin(2 * np.pi * 0.5 * t)) / PCM_SAMPLE_RATE
+    signal = sum(np.sin(k * pitch) / k for k in range(1, 6))
+    return (signal / np.abs(signal).max() * 12000).astype(np.int16).tobytes()
+
+
+def _wav(pcm: bytes) -> bytes:
+    out = io.BytesIO()
+    with wave.open(out, "wb") as f:
+        f.setnchannels(PCM_NUM_CHANNELS)
+        f.setsampwidth(2)
+        f.setframerate(PCM_SAMPLE_RATE)
+        f.writeframes(pcm)
+    return out.getvalue()
+
+
+def _encode_av(pcm: bytes, container_format: str, codec: str, rate: int) -> bytes:
+    import av
+
+    out = io.BytesIO()
+    with av.open(out, "w", format=container_format) as container:
+        stream = container.add_stream(codec, rate=rate)
+        stream.layout = "mono"
+        frame = av.AudioFrame.from_ndarray(
+            np.frombuffer(pcm, dtype=np.int16).reshape(1, -1), format="s16", layout="mono"
+        )
+        frame.sample_rate = PCM_SAMPLE_RATE
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return out.getvalue()
+
+
+def _encode_mp3(pcm: bytes) -> bytes:
+    try:
+        return _encode_av(pcm, "mp3", "mp3", PCM_SAMPLE_RATE)
+    except ImportError:
+        from pydub import AudioSegment
+
+        out = io.BytesIO()
+        AudioSegment(pcm, sample_width=2, frame_rate=PCM_SAMPLE_RATE, channels=PCM_NUM_CHANNELS).export(
+            out, format="mp3"
+        )
+        return out.getvalue()
+
+
+def _decoder_path(response_format: str, chunk_size: int) -> Decode:
+    def decode(data: bytes) -> int:
+        decoder = create_decoder(response_format)
+        audio = bytearray()
+        view = memoryview(data)
+        for offset in range(0, len(view), chunk_size):
+            audio += memoryview(decoder.decode(bytes(view[offset:offset + chunk_size])))
+        audio += memoryview(decoder.flush())
+        return len(audio) // 2
+
+    return decode
+
+
+def _pydub_path(data: bytes) -> int:
+    # the decoding `TTS.synthesize` used to do
+    from pydub import AudioSegment
+
+    return len(AudioSegment.from_mp3(io.BytesIO(data)).set_sample_width(2).raw_data) // 2
+
+
+def _cpu_time() -> float:
+    usage = [resource.getrusage(who) for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+    return sum(u.ru_utime + u.ru_stime for u in usage)
+
+
+def _run(decode: Decode, data: bytes, args: argparse.Namespace) -> Dict[str, Any]:
+    latencies = []
+
+    def timed(_) -> int:
+        started_at = time.perf_counter()
+        samples = decode(data)
+        latencies.append(time.perf_counter() - started_at)
+        return samples
+
+    # the first decode pays for imports and codec setup
+    samples = decode(data)
+    if args.trace_memory:
+        tracemalloc.start()
+    cpu_before = _cpu_time()
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(timed, range(args.utterances)))
+    wall_time = time.perf_counter() - started_at
+    cpu_time = _cpu_time() - cpu_before
+    traced_peak = None
+    if args.trace_memory:
+        traced_peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+    audio_seconds = args.utterances * args.seconds
+    return {
+        "decoded_seconds": round(samples / PCM_SAMPLE_RATE, 3),
+        "latency": percentiles(latencies),
+        "utterances_per_second": round(args.utterances / wall_time, 1),
+        # CPU seconds, subprocesses included, per second of audio
+        "cpu_per_audio_second": round(cpu_time / audio_seconds, 6),
+        "traced_peak_mb": round(traced_peak, 1) if traced_peak is not None else None,
+    }
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bench.decode", description=__doc__)
+    parser.add_argument("--utterances", type=int, default=100, help="decodes per path")
+    parser.add_argument("--concurrency", type=int, default=8, help="decodes running at once, like rooms")
+    parser.add_argument("--seconds", type=float, default=4.0, help="length of the utterance")
+    parser.add_argument("--chunk-size", type=int, default=4800, help="bytes per response chunk")
+    parser.add_argument("--mp3", help="MP3 file to decode instead of the synthetic utterance")
+    parser.add_argument("--trace-memory", action="store_true", help="also report the tracemalloc peak")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = _parse_args()
+    pcm = _utterance(args.seconds)
+
+    inputs: Dict[str, Optional[bytes]] = {"pcm": pcm, "wav": _wav(pcm)}
+    skipped: Dict[str, str] = {}
+    if args.mp3:
+        with open(args.mp3, "rb") as f:
+            inputs["mp3"] = f.read()
+    else:
+        try:
+            inputs["mp3"] = _encode_mp3(pcm)
+        except Exception as e:
+            skipped["mp3"] = f"cannot encode the MP3 input: {e!r}"
+    try:
+        inputs["opus"] = _encode_av(pcm, "ogg", "libopus", 48000)
+    except Exception as e:
+        skipped["opus"] = f"cannot encode the Opus input: {e!r}"
+
+    paths: Dict[str, Any] = {}
+    for name, response_format in (("pcm", "pcm"), ("wav", "wav"), ("mp3", "mp3"), ("opus", "opus"), ("pydub", "mp3")):
+        data = inputs.get(response_format)
+        if data is None:
+            skipped.setdefault(name, skipped.get(response_format, "no input"))
+            continue
+        decode = _pydub_path if name == "pydub" else _decoder_path(response_format, args.chunk_size)
+        try:
+            paths[name] = _run(decode, data, args)
+        except Exception as e:
+            skipped[name] = repr(e)
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "paths": paths,
+        "skipped": skipped,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,796 @@
+"""
+In-process stand-ins for LiveKit, the OpenAI LLM and TTS APIs, a streaming STT and PostgREST.
+
+They implement the parts of the real interfaces the agent uses, with configurable latencies, so whole
+rooms can run without network access or accounts.
+"""
+import asyncio
+import itertools
+import json
+import random
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+import numpy as np
+import openai
+from camel.models import BaseModelBackend
+from camel.types import ModelType
+from camel.utils import BaseTokenCounter
+from livekit import rtc
+from livekit.agents import stt
+from openai.types.chat import ChatCompletion, ChatCompletionChunk, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+from openai.types.chat.chat_completion_chunk import Choice as ChunkChoice, ChoiceDelta
+
+from core import EventEmitter
+
+_sids = itertools.count(1)
+
+_WORDS = (
+    "sure", "the", "weather", "looks", "fine", "today", "and", "I", "can", "help", "you", "plan", "a", "walk",
+    "in", "park", "later", "with", "some", "music", "or", "tea", "if", "that", "sounds", "good",
+)
+
+
+def _sid(prefix: str) -> str:
+    return f"{prefix}_{next(_sids)}"
+
+
+# LiveKit
+
+
+class FakeRemoteParticipant:
+    def __init__(self, identity: str, name: str = "") -> None:
+        self.sid = _sid("PA")
+        self.identity = identity
+        self.name = name or identity
+        self.metadata = ""
+        self.tracks: Dict[str, "FakeRemoteTrackPublication"] = {}
+
+
+class FakeRemoteAudioTrack:
+    """Microphone of a remote participant, the frames pushed to it are read through `FakeAudioStream`."""
+
+    def __init__(self) -> None:
+        self.sid = _sid("TR")
+        self.kind = rtc.TrackKind.KIND_AUDIO
+        self._streams: List["asyncio.Queue[Optional[rtc.AudioFrame]]"] = []
+
+    def push(self, frame: rtc.AudioFrame) -> None:
+        for queue in self._streams:
+            queue.put_nowait(frame)
+
+    def close(self) -> None:
+        for queue in self._streams:
+            queue.put_nowait(None)
+
+
+class FakeAudioStream:
+    """`rtc.AudioStream` of a `FakeRemoteAudioTrack`."""
+
+    def __init__(self, track: FakeRemoteAudioTrack, **kwargs) -> None:
+        self._track = track
+        self._queue: "asyncio.Queue[Optional[rtc.AudioFrame]]" = asyncio.Queue()
+        track._streams.append(self._queue)
+
+    async def aclose(self) -> None:
+        if self._queue in self._track._streams:
+            self._track._streams.remove(self._queue)
+
+    def __aiter__(self) -> "FakeAudioStream":
+        return self
+
+    async def __anext__(self) -> rtc.AudioFrameEvent:
+        frame = await self._queue.get()
+        if frame is None:
+            raise StopAsyncIteration
+        return rtc.AudioFrameEvent(frame)
+
+
+@dataclass
+class FakeRemoteTrackPublication:
+    sid: str
+    # only with a microphone, other publications only signal that the user finished connecting
+    track: Optional[FakeRemoteAudioTrack] = None
+
+
+@dataclass
+class SentPacket:
+    payload: bytes
+    topic: Optional[str]
+    destination_sids: List[str]
+    sent_at: float
+
+
+class FakeLocalParticipant:
+    def __init__(self, room: "FakeRoom", identity: str, name: str) -> None:
+        self._room = room
+        self.sid = _sid("PA")
+        self.identity = identity
+        self.name = name
+        self.metadata = ""
+        self.metadata_updates = 0
+        self.tracks: Dict[str, Any] = {}
+
+    async def publish_data(
+        self,
+        payload,
+        kind=rtc.DataPacketKind.KIND_RELIABLE,
+        destination_sids: Optional[List[str]] = None,
+        topic: Optional[str] = None,
+    ) -> None:
+        if isinstance(payload, str):
+            payload = payload.encode()
+        await asyncio.sleep(0)
+        self._room.deliver_to_users(SentPacket(payload, topic, list(destination_sids or []), time.monotonic()))
+
+    async def publish_track(self, track: "FakeLocalAudioTrack", options=None) -> "FakeLocalAudioTrack":
+        await asyncio.sleep(0)
+        self.tracks[track.sid] = track
+        return track
+
+    async def update_metadata(self, metadata: str) -> None:
+        await asyncio.sleep(0)
+        self.metadata = metadata
+        self.metadata_updates += 1
+
+
+class FakeRoom(EventEmitter):
+    """
+    Room as seen by the agent: its local participant, the remote participants and the room events.
+
+    Data packets published by the agent are handed to the callbacks registered with `on_user_data`,
+    which play the remote participants.
+    """
+
+    def __init__(self, name: str, identity: str, agent_name: str) -> None:
+        super().__init__()
+        self.name = name
+        self.sid = _sid("RM")
+        self.metadata = ""
+        self.participants: Dict[str, FakeRemoteParticipant] = {}
+        self.local_participant = FakeLocalParticipant(self, identity, agent_name)
+        self._user_data_callbacks: List[Callable[[SentPacket], None]] = []
+
+    def on_user_data(self, callback: Callable[[SentPacket], None]) -> None:
+        self._user_data_callbacks.append(callback)
+
+    def deliver_to_users(self, packet: SentPacket) -> None:
+        for callback in self._user_data_callbacks:
+            callback(packet)
+
+    def join(
+        self, participant: FakeRemoteParticipant, publish_track: bool = True, microphone: bool = False
+    ) -> Optional[FakeRemoteAudioTrack]:
+        """Add `participant`, publishing a track, or a microphone the agent can subscribe to with `subscribe`."""
+        self.participants[participant.sid] = participant
+        self.emit("participant_connected", participant)
+        if not publish_track and not microphone:
+            return None
+
+        track = FakeRemoteAudioTrack() if microphone else None
+        publication = FakeRemoteTrackPublication(track.sid if track else _sid("TR"), track)
+        participant.tracks[publication.sid] = publication
+        self.emit("track_published", publication, participant)
+        return track
+
+    def subscribe(self) -> None:
+        """Subscribe the agent to the microphones of the participants, like `AutoSubscribe.AUDIO_ONLY`."""
+        for participant in list(self.participants.values()):
+            for publication in participant.tracks.values():
+                if publication.track is not None:
+                    self.emit("track_subscribed", publication.track, publication, participant)
+
+    def leave(self, participant: FakeRemoteParticipant) -> None:
+        self.participants.pop(participant.sid, None)
+        for publication in participant.tracks.values():
+            if publication.track is not None:
+                publication.track.close()
+        self.emit("participant_disconnected", participant)
+
+    def send_data(self, participant: FakeRemoteParticipant, payload: bytes, topic: str) -> None:
+        self.emit(
+            "data_received",
+            rtc.DataPacket(data=payload, kind=rtc.DataPacketKind.KIND_RELIABLE, participant=participant, topic=topic),
+        )
+
+
+class FakeJobContext:
+    """`agents.JobContext` of a fake room, tasks created through it are cancelled on `disconnect`."""
+
+    def __init__(self, room: FakeRoom) -> None:
+        self.id = _sid("AJ")
+        self.room = room
+        self._tasks = set()
+        self._closed = False
+
+    def create_task(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def disconnect(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self.room.emit("disconnected")
+
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
+
+
+class FakeAudioSource:
+    """
+    `rtc.AudioSource` playing frames in real time, `capture_frame` returns once the frame would have
+    been played.
+    """
+
+    def __init__(self, sample_rate: int, num_channels: int) -> None:
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+        self.frames = 0
+        self.first_frame_at: Optional[float] = None
+        self.last_frame_at: Optional[float] = None
+        self._clock: Optional[float] = None
+        self._frame_callbacks: List[Callable[[float], None]] = []
+
+    def on_frame(self, callback: Callable[[float], None]) -> None:
+        self._frame_callbacks.append(callback)
+
+    async def capture_frame(self, frame: rtc.AudioFrame) -> None:
+        now = time.monotonic()
+        # frames captured back to back are played one after the other, a gap restarts the clock
+        if self._clock is None or self._clock < now:
+            self._clock = now
+        self._clock += frame.samples_per_channel / frame.sample_rate
+
+        self.frames += 1
+        if self.first_frame_at is None:
+            self.first_frame_at = now
+        self.last_frame_at = now
+        for callback in self._frame_callbacks:
+            callback(now)
+
+        await asyncio.sleep(self._clock - now)
+
+
+class FakeLocalAudioTrack:
+    def __init__(self, name: str, source: FakeAudioSource) -> None:
+        self.sid = _sid("TR")
+        self.name = name
+        self.source = source
+
+    @classmethod
+    def create_audio_track(cls, name: str, source: FakeAudioSource) -> "FakeLocalAudioTrack":
+        return cls(name, source)
+
+
+# LLM
+
+
+@dataclass
+class LLMProfile:
+    # seconds until the first token, and between tokens
+    first_token_latency: float = 0.3
+    token_interval: float = 0.01
+    reply_words: int = 30
+    sentence_words: int = 8
+    # share of the requests whose first token takes `stall_latency` seconds instead
+    stall_rate: float = 0.0
+    stall_latency: float = 3.0
+    # share of the requests failing before the first token
+    error_rate: float = 0.0
+
+    def first_token(self, rng: random.Random) -> Optional[float]:
+        """Draw the first-token latency of a request, None if it fails."""
+        if not self.error_rate and not self.stall_rate:
+            return self.first_token_latency
+        draw = rng.random()
+        if draw < self.error_rate:
+            return None
+        if draw < self.error_rate + self.stall_rate:
+            return self.stall_latency
+        return self.first_token_latency
+
+    def reply(self, rng: random.Random) -> List[str]:
+        """Draw the deltas of a reply, words with a period ending every sentence."""
+        words = [rng.choice(_WORDS) for _ in range(self.reply_words)]
+        deltas = []
+        for i, word in enumerate(words):
+            end = (i + 1) % self.sentence_words == 0 or i == len(words) - 1
+            deltas.append(f"{word}{'.' if end else ''} ")
+        return deltas
+
+
+class _WordEncoding:
+    def encode(self, text: str, **kwargs) -> List[str]:
+        return text.split()
+
+    def decode(self, tokens: List[str]) -> str:
+        return " ".join(tokens)
+
+
+class FakeTokenCounter(BaseTokenCounter):
+    """Counts words as tokens, with the per-message overhead of the OpenAI chat format."""
+
+    def __init__(self) -> None:
+        self.encoding = _WordEncoding()
+
+    def count_tokens_from_messages(self, messages: List[Dict[str, Any]]) -> int:
+        tokens = 3
+        for message in messages:
+            tokens += 4 + len(str(message.get("content") or "").split())
+        return tokens
+
+
+class _FakeChunkStream:
+    def __init__(self, chunks: List[ChatCompletionChunk], profile: LLMProfile, first_token_latency: float) -> None:
+        self._chunks = chunks
+        self._profile = profile
+        self._first_token_latency = first_token_latency
+        self._closed = threading.Event()
+
+    def __iter__(self) -> Iterator[ChatCompletionChunk]:
+        # closing a stream waiting for its first token ends it at once, like closing its connection
+        self._closed.wait(self._first_token_latency)
+        for i, chunk in enumerate(self._chunks):
+            if self._closed.is_set():
+                return
+            if i:
+                time.sleep(self._profile.token_interval)
+            yield chunk
+
+    def close(self) -> None:
+        self._closed.set()
+
+
+class FakeModelBackend(BaseModelBackend):
+    """CAMEL model backend generating replies of `profile.reply_words` words at the profile's pace."""
+
+    def __init__(
+        self, model_type: ModelType, model_config_dict: Dict[str, Any], profile: LLMProfile, seed: int = 0
+    ) -> None:
+        super().__init__(model_type, model_config_dict)
+        self._profile = profile
+        self._token_counter = FakeTokenCounter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    @property
+    def token_counter(self) -> BaseTokenCounter:
+        return self._token_counter
+
+    @property
+    def stream(self) -> bool:
+        return self.model_config_dict.get("stream", False)
+
+    def check_model_config(self) -> None:
+        pass
+
+    def run(self, messages: List[Dict[str, Any]]):
+        with self._lock:
+            self.calls += 1
+            first_token_latency = self._profile.first_token(self._random)
+            deltas = self._profile.reply(self._random)
+
+        if first_token_latency is None:
+            time.sleep(self._profile.first_token_latency)
+            raise openai.APIConnectionError(request=httpx.Request("POST", "http://bench/v1/chat/completions"))
+
+        model = self.model_type.value
+        if not self.stream:
+            time.sleep(first_token_latency + self._profile.token_interval * len(deltas))
+            return ChatCompletion.model_construct(
+                id="bench",
+                created=0,
+                model=model,
+                object="chat.completion",
+                choices=[
+                    Choice.model_construct(
+                        index=0,
+                        finish_reason="stop",
+                        message=ChatCompletionMessage.model_construct(role="assistant", content="".join(deltas)),
+                    )
+                ],
+            )
+
+        chunks = [
+            ChatCompletionChunk.model_construct(
+                id="bench",
+                created=0,
+                model=model,
+                object="chat.completion.chunk",
+                choices=[
+                    ChunkChoice.model_construct(
+                        index=0,
+                        finish_reason="stop" if i == len(deltas) - 1 else None,
+                        delta=ChoiceDelta.model_construct(role="assistant", content=delta),
+                    )
+                ],
+            )
+            for i, delta in enumerate(deltas)
+        ]
+        return _FakeChunkStream(chunks, self._profile, first_token_latency)
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, bytes]]:
+    """Read the `(method, target, body)` of the next HTTP/1.1 request, None once the client closed."""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, target, _ = request_line.decode("latin-1").split(" ", 2)
+
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return method, target, body
+
+
+class OpenAIStub:
+    """
+    HTTP/1.1 server answering chat completions like the OpenAI API, streamed or not, with the replies
+    and latencies of an `LLMProfile`. It stands in for an OpenAI-compatible backend of `LLM_PLATFORMS`;
+    stalled and failed requests exercise the hedging and failover of the LLM router.
+    """
+
+    def __init__(self, profile: LLMProfile, host: str = "127.0.0.1", port: int = 0, seed: int = 0) -> None:
+        self.profile = profile
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of the API, as set in `LLM_PLATFORMS`."""
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/v1"
+
+    async def start(self) -> "OpenAIStub":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        return self
+
+    async def close(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def serve_forever(self) -> None:
+        await self._server.serve_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while (request := await _read_request(reader)) is not None:
+                method, target, body = request
+                self.requests += 1
+                if method != "POST" or urlsplit(target).path != "/v1/chat/completions":
+                    self._write_json(writer, 404, {"error": {"message": f"{method} {target} is not served"}})
+                    await writer.drain()
+                    continue
+
+                params = json.loads(body or b"{}")
+                first_token_latency = self.profile.first_token(self._random)
+                deltas = self.profile.reply(self._random)
+                if first_token_latency is None:
+                    await asyncio.sleep(self.profile.first_token_latency)
+                    self._write_json(writer, 500, {"error": {"message": "stub failure", "type": "server_error"}})
+                elif params.get("stream"):
+                    await self._stream(writer, params.get("model", ""), deltas, first_token_latency)
+                else:
+                    await asyncio.sleep(first_token_latency + self.profile.token_interval * len(deltas))
+                    self._write_json(writer, 200, {
+                        "id": "stub",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": params.get("model", ""),
+                        "choices": [{
+                            "index": 0,
+                            "finish_reason": "stop",
+                            "message": {"role": "assistant", "content": "".join(deltas)},
+                        }],
+                    })
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # hedged requests that lost are closed by the client
+            pass
+        finally:
+            writer.close()
+
+    async def _stream(
+        self, writer: asyncio.StreamWriter, model: str, deltas: List[str], first_token_latency: float
+    ) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n"
+        )
+        await asyncio.sleep(first_token_latency)
+        for i, delta in enumerate(deltas):
+            if i:
+                await asyncio.sleep(self.profile.token_interval)
+            chunk = {
+                "id": "stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop" if i == len(deltas) - 1 else None,
+                    "delta": {"role": "assistant", "content": delta},
+                }],
+            }
+            self._write_chunk(writer, f"data: {json.dumps(chunk)}\n\n".encode())
+            await writer.drain()
+        self._write_chunk(writer, b"data: [DONE]\n\n")
+        self._write_chunk(writer, b"")
+
+    @staticmethod
+    def _write_chunk(writer: asyncio.StreamWriter, data: bytes) -> None:
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    @staticmethod
+    def _write_json(writer: asyncio.StreamWriter, status: int, data: Any) -> None:
+        payload = json.dumps(data).encode()
+        writer.write(
+            f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+        )
+
+
+# TTS
+
+# a silent MPEG-1 layer III frame: 128 kbps, 48 kHz, mono, 1152 samples
+_MP3_FRAME = b"\xff\xfb\x94\xc0" + bytes(380)
+_MP3_FRAME_SECONDS = 1152 / 48000
+
+
+def _wav_header(sample_rate: int) -> bytes:
+    """Header of 16-bit mono WAV, with the unknown data size of a streamed response."""
+    fmt = struct.pack("<HHIIHH", 1, 1, sample_rate, 2 * sample_rate, 2, 16)
+    unknown = struct.pack("<I", 0xFFFFFFFF)
+    return b"RIFF" + unknown + b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt + b"data" + unknown
+
+
+@dataclass
+class TTSProfile:
+    # seconds until the first byte, and between chunks of the response
+    first_byte_latency: float = 0.15
+    chunk_interval: float = 0.005
+    chunk_size: int = 4800
+    # characters of text per second of synthesized audio
+    chars_per_second: float = 60.0
+    sample_rate: int = 24000
+
+
+class _FakeSpeechResponse:
+    def __init__(self, data: bytes, profile: TTSProfile) -> None:
+        self._data = data
+        self._profile = profile
+        self.closed = False
+
+    async def aread(self) -> bytes:
+        await asyncio.sleep(self._profile.first_byte_latency)
+        return self._data
+
+    async def aiter_bytes(self) -> AsyncIterator[bytes]:
+        # called as `await response.aiter_bytes()`, like the raw response of the OpenAI client
+        return self._iter_bytes()
+
+    async def _iter_bytes(self) -> AsyncIterator[bytes]:
+        await asyncio.sleep(self._profile.first_byte_latency)
+        size = self._profile.chunk_size
+        for offset in range(0, len(self._data), size):
+            if offset:
+                await asyncio.sleep(self._profile.chunk_interval)
+            yield self._data[offset:offset + size]
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+class _FakeSpeech:
+    def __init__(self, profile: TTSProfile) -> None:
+        self._profile = profile
+        self.requests = 0
+
+    async def create(self, model: str, voice: str, input: str, response_format: str = "mp3", **kwargs):
+        self.requests += 1
+        seconds = max(len(input), 1) / self._profile.chars_per_second
+        if response_format in ("pcm", "wav"):
+            samples = int(seconds * self._profile.sample_rate)
+            data = bytes(2 * samples)
+            if response_format == "wav":
+                data = _wav_header(self._profile.sample_rate) + data
+        else:
+            data = _MP3_FRAME * max(int(seconds / _MP3_FRAME_SECONDS), 1)
+        return _FakeSpeechResponse(data, self._profile)
+
+
+class _FakeAudio:
+    def __init__(self, profile: TTSProfile) -> None:
+        self.speech = _FakeSpeech(profile)
+
+
+class FakeOpenAIClient:
+    """The `audio.speech` API of `openai.AsyncOpenAI`, returning silent PCM, WAV or MP3."""
+
+    def __init__(self, profile: TTSProfile) -> None:
+        self.audio = _FakeAudio(profile)
+
+
+# STT
+
+
+def speech_pcm(seconds: float, sample_rate: int, level: float = 8000.0) -> np.ndarray:
+    """A voiced-like signal, harmonics of a gliding pitch, as 16-bit PCM."""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 2 * np.pi * np.cumsum(140 + 30 * np.sin(2 * np.pi * 0.7 * t)) / sample_rate
+    signal = sum(np.sin(k * pitch) / k for k in range(1, 6))
+    # syllables, so the level drops between them like it does in speech
+    envelope = 0.55 + 0.45 * np.sin(2 * np.pi * 4 * t)
+    return (signal * envelope / np.abs(signal).max() * level).astype(np.int16)
+
+
+@dataclass
+class STTProfile:
+    # seconds from the flush at the end of the speech to the final transcript
+    final_latency: float = 0.15
+
+
+class _FakeSpeechStream(stt.SpeechStream):
+    def __init__(self, owner: "FakeSTT") -> None:
+        self._owner = owner
+        self._seconds = 0.0
+        self._queue: "asyncio.Queue[Optional[stt.SpeechEvent]]" = asyncio.Queue()
+
+    def push_frame(self, frame: rtc.AudioFrame) -> None:
+        seconds = frame.samples_per_channel / frame.sample_rate
+        self._seconds += seconds
+        self._owner.seconds += seconds
+
+    async def flush(self) -> None:
+        await asyncio.sleep(self._owner.profile.final_latency)
+        text = f"voice message of {self._seconds:.1f} seconds"
+        self._queue.put_nowait(
+            stt.SpeechEvent(
+                is_final=True, alternatives=[stt.SpeechData(language="en", text=text)], end_of_speech=True
+            )
+        )
+
+    async def aclose(self) -> None:
+        self._queue.put_nowait(None)
+
+    async def __anext__(self) -> stt.SpeechEvent:
+        event = await self._queue.get()
+        if event is None:
+            self._queue.put_nowait(None)
+            raise StopAsyncIteration
+        return event
+
+
+class FakeSTT(stt.STT):
+    """Streaming STT transcribing every segment to its length, counting the seconds of audio it was sent."""
+
+    def __init__(self, profile: STTProfile) -> None:
+        super().__init__(streaming_supported=True)
+        self.profile = profile
+        self.seconds = 0.0
+        self.segments = 0
+
+    async def recognize(self, *, buffer, language: Optional[str] = None) -> stt.SpeechEvent:
+        raise NotImplementedError("FakeSTT only streams")
+
+    def stream(self, *, language: Optional[str] = None) -> _FakeSpeechStream:
+        self.segments += 1
+        return _FakeSpeechStream(self)
+
+
+# PostgREST
+
+
+def agent_row(agent_id: str, agent_name: str, **columns) -> Dict[str, Any]:
+    now = datetime.now().isoformat()
+    row = {
+        "agent_id": agent_id,
+        "agent_name": agent_name,
+        "system_message": f"You are {agent_name}, a helpful assistant.",
+        "system_message_limit": 4000,
+        "model_platform": "OpenAI",
+        "model_type": "gpt-3.5-turbo-1106",
+        "model_config": json.dumps({"temperature": 1, "max_tokens": 200, "top_p": 1}),
+        "memory": "",
+        "memory_limit": 5,
+        "created_at": now,
+        "updated_at": now,
+    }
+    row.update(columns)
+    return row
+
+
+class FakePostgrest:
+    """
+    HTTP/1.1 server answering the PostgREST requests of the agent from an in-memory `agent` table:
+    filtered selects and the `update_agent_config` function.
+
+    :param latency: Seconds added to every response.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]], latency: float = 0.002) -> None:
+        self.rows: Dict[str, Dict[str, Any]] = {row["agent_id"]: row for row in rows}
+        self.latency = latency
+        self.requests = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def start(self) -> "FakePostgrest":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def close(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while (request := await _read_request(reader)) is not None:
+                method, target, body = request
+                self.requests += 1
+                await asyncio.sleep(self.latency)
+                status, data = self._route(method, target, body)
+                payload = json.dumps(data).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _route(self, method: str, target: str, body: bytes) -> Tuple[int, Any]:
+        url = urlsplit(target)
+        if method == "GET" and url.path == "/agent":
+            rows = list(self.rows.values())
+            for column, values in parse_qs(url.query).items():
+                if column == "select":
+                    continue
+                op, _, value = values[0].partition(".")
+                if op == "eq":
+                    rows = [row for row in rows if str(row.get(column)) == value]
+            return 200, rows
+
+        if method == "POST" and url.path == "/rpc/update_agent_config":
+            return 200, self._update_agent_config(json.loads(body or b"{}"))
+
+        return 404, {"message": f"{method} {url.path} is not served"}
+
+    def _update_agent_config(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        row = self.rows.get(params.get("p_agent_id"))
+        expected = params.get("p_expected_updated_at")
+        if row is None or (expected and datetime.fromisoformat(expected) != datetime.fromisoformat(row["updated_at"])):
+            return []
+
+        for column, value in (params.get("p_changes") or {}).items():
+            if column == "model_config":
+                value = json.dumps({**json.loads(row.get("model_config") or "{}"), **value})
+            row[column] = value
+        row["updated_at"] = datetime.now().isoformat()
+        return [row]
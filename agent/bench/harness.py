@@ -0,0 +1,471 @@
+"""
+Load test of `WardaAgent` against the stand-ins of `bench.fakes`.
+
+Every simulated room goes through the life of a real one: the user joins with a published track, the
+agent greets them, the user chats for a number of turns, updates the agent config once and leaves. With
+`voice` the user speaks the turns into a microphone instead, which captures background noise between them.
+"""
+import asyncio
+import contextlib
+import itertools
+import json
+import random
+import resource
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from unittest import mock
+
+import numpy as np
+from camel.models import ModelFactory
+from livekit import rtc
+
+import main
+from config import settings
+from core import LoopMonitor, get_task_tracker, room_scope
+from plugins.camel.router import get_router_stats
+from plugins.openai import TTS, TTSCache, get_scheduler
+from plugins.postgrest import close_postgrest_client, open_postgrest_client
+from services.agent_config.database import get_agent_config
+from services.service import ServiceMessage
+from services.wire import Encoding, encode
+from .fakes import (
+    FakeAudioSource,
+    FakeAudioStream,
+    FakeJobContext,
+    FakeLocalAudioTrack,
+    FakeModelBackend,
+    FakeOpenAIClient,
+    FakePostgrest,
+    FakeRemoteAudioTrack,
+    FakeRemoteParticipant,
+    FakeRoom,
+    FakeSTT,
+    LLMProfile,
+    SentPacket,
+    STTProfile,
+    TTSProfile,
+    agent_row,
+    speech_pcm,
+)
+
+_CHAT_TOPIC = "lk-chat-topic"
+_CONFIG_TOPIC = "agent-config-topic"
+
+# format of the user's microphone, as WebRTC delivers it
+_MIC_SAMPLE_RATE = 48000
+_MIC_FRAME_MS = 10
+
+# smallest increases reported as regressions, below them differences are noise
+_MIN_DELTAS = {
+    "latency": 0.005, "loop_lag": 0.002, "memory": 16.0, "tasks": 0, "turns": 0, "rooms": 0, "signaling": 0.5
+}
+
+
+@dataclass
+class BenchConfig:
+    rooms: int = 20
+    # agents of the `agent` table, rooms are assigned to them in turn
+    agents: int = 2
+    turns: int = 5
+    # seconds the user waits after the agent finished talking, jittered by +-50%
+    think_time: float = 0.2
+    # seconds over which the rooms are started
+    ramp: float = 1.0
+    # turn after which the user updates the agent config, -1 to never update it
+    config_update_turn: int = 2
+    tts_streaming: bool = True
+    # response format of the TTS, decoded by `plugins.openai.tts_codecs`
+    tts_format: str = "pcm"
+    postgrest_latency: float = 0.002
+    llm: LLMProfile = field(default_factory=LLMProfile)
+    # fake LLM backends the replies are routed over, and seconds without a first token before hedging
+    llm_backends: int = 1
+    hedge_delay: float = 2.0
+    tts: TTSProfile = field(default_factory=TTSProfile)
+    # speak every turn for `speech_seconds` instead of chatting, transcribed by a fake streaming STT
+    voice: bool = False
+    speech_seconds: float = 1.5
+    stt: STTProfile = field(default_factory=STTProfile)
+    lag_interval: float = 0.01
+    turn_timeout: float = 30.0
+    trace_memory: bool = False
+    seed: int = 0
+
+
+@dataclass
+class RoomResult:
+    greeting: List[float] = field(default_factory=list)
+    first_audio: List[float] = field(default_factory=list)
+    reply: List[float] = field(default_factory=list)
+    turn: List[float] = field(default_factory=list)
+    config_update: List[float] = field(default_factory=list)
+    completed: int = 0
+    failed: int = 0
+    metadata_updates: int = 0
+
+
+class LoopLagSampler:
+    """Measures how late the event loop wakes up a sleeping task, and the peak number of tasks."""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.samples: List[float] = []
+        self.peak_tasks = 0
+
+    async def run(self) -> None:
+        while True:
+            started_at = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(time.monotonic() - started_at - self.interval, 0.0))
+            self.peak_tasks = max(self.peak_tasks, len(asyncio.all_tasks()))
+
+
+def percentiles(samples: List[float]) -> Dict[str, Any]:
+    """Nearest-rank percentiles of `samples`."""
+    if not samples:
+        return {"count": 0}
+
+    ordered = sorted(samples)
+
+    def rank(p: float) -> float:
+        return round(ordered[min(int(p * len(ordered)), len(ordered) - 1)], 6)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 6),
+        "p50": rank(0.50),
+        "p90": rank(0.90),
+        "p99": rank(0.99),
+        "max": round(ordered[-1], 6),
+    }
+
+
+async def _until(predicate: Callable[[], bool], timeout: float, interval: float = 0.005) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise asyncio.TimeoutError()
+        await asyncio.sleep(interval)
+
+
+class _SimulatedUser:
+    def __init__(self, index: int, room: FakeRoom, config: BenchConfig) -> None:
+        self.participant = FakeRemoteParticipant(f"bench-user-{index}")
+        self.room = room
+        self.config = config
+        self.random = random.Random(config.seed + index)
+        self.inbox: Dict[str, "asyncio.Queue[SentPacket]"] = {}
+        self.turn_started_at = 0.0
+        self.first_frame_at: Optional[float] = None
+        self.mic_seconds = 0.0
+        self._rng = np.random.default_rng(config.seed + index)
+        # speech waiting to be captured, and the future of the time its last frame was
+        self._speech: Optional[np.ndarray] = None
+        self._spoken: Optional[asyncio.Future] = None
+        room.on_user_data(self._on_data)
+
+    def _on_data(self, packet: SentPacket) -> None:
+        if packet.destination_sids and self.participant.sid not in packet.destination_sids:
+            return
+        self.topic(packet.topic).put_nowait(packet)
+
+    def on_frame(self, now: float) -> None:
+        if self.first_frame_at is None and now >= self.turn_started_at:
+            self.first_frame_at = now
+
+    def topic(self, topic: str) -> "asyncio.Queue[SentPacket]":
+        return self.inbox.setdefault(topic, asyncio.Queue())
+
+    def drain(self, topic: str) -> None:
+        queue = self.topic(topic)
+        while not queue.empty():
+            queue.get_nowait()
+
+    def start_turn(self) -> float:
+        self.turn_started_at = time.monotonic()
+        self.first_frame_at = None
+        return self.turn_started_at
+
+    def chat(self, text: str) -> None:
+        payload = json.dumps(rtc.ChatMessage(message=text).asjsondict()).encode()
+        self.room.send_data(self.participant, payload, _CHAT_TOPIC)
+
+    async def say(self, seconds: float) -> float:
+        """Speak into the microphone for `seconds`, returns when the speech ended."""
+        self._spoken = asyncio.get_running_loop().create_future()
+        self._speech = speech_pcm(seconds, _MIC_SAMPLE_RATE)
+        return await self._spoken
+
+    async def microphone(self, track: FakeRemoteAudioTrack) -> None:
+        """Capture frames in real time: the speech of `say`, and faint noise the rest of the time."""
+        size = _MIC_SAMPLE_RATE * _MIC_FRAME_MS // 1000
+        noise = self._rng.normal(0, 30, _MIC_SAMPLE_RATE).astype(np.int16)
+        noise_at = 0
+        speech_at = 0
+        clock = time.monotonic()
+        while True:
+            if self._speech is not None:
+                samples = self._speech[speech_at:speech_at + size]
+                speech_at += size
+                if speech_at >= len(self._speech):
+                    samples = np.concatenate((samples, noise[:size - len(samples)]))
+                    self._speech = None
+                    speech_at = 0
+                    self._spoken.set_result(time.monotonic())
+            else:
+                samples = noise[noise_at:noise_at + size]
+                noise_at = (noise_at + size) % (len(noise) - size)
+
+            track.push(
+                rtc.AudioFrame(
+                    data=samples.tobytes(), sample_rate=_MIC_SAMPLE_RATE, num_channels=1, samples_per_channel=size
+                )
+            )
+            self.mic_seconds += _MIC_FRAME_MS / 1000
+            # frames fall behind while the loop lags and catch up after, like a jitter buffer
+            clock += _MIC_FRAME_MS / 1000
+            await asyncio.sleep(max(clock - time.monotonic(), 0.0))
+
+    def update_config(self, changes: Dict[str, Any]) -> None:
+        msg = ServiceMessage(payload=changes)
+        self.room.send_data(self.participant, encode([msg.aswiredict()], Encoding.JSON), _CONFIG_TOPIC)
+
+
+async def _run_room(
+    index: int, agent_id: str, config: BenchConfig, result: RoomResult, users: List[_SimulatedUser]
+) -> None:
+    await asyncio.sleep(config.ramp * index / max(config.rooms, 1))
+
+    agent_config = await get_agent_config(agent_id=agent_id)
+    room = FakeRoom(f"bench-room-{index}", agent_config.agent_id, agent_config.agent_name)
+    ctx = FakeJobContext(room)
+    user = _SimulatedUser(index, room, config)
+    users.append(user)
+    timeout = config.turn_timeout
+
+    track = room.join(user.participant, microphone=config.voice)
+    started_at = user.start_turn()
+    get_task_tracker().open_room(room.name)
+    # like the job entry of the worker, the tasks of the agent are accounted to its room
+    with room_scope(room.name):
+        agent = main.WardaAgent(ctx, agent_config)
+        microphone = None
+        if track is not None:
+            room.subscribe()
+            microphone = asyncio.create_task(user.microphone(track))
+        try:
+            await agent.start()
+            source: FakeAudioSource = agent.line_out
+            source.on_frame(user.on_frame)
+
+            def idle() -> bool:
+                return not agent.speech.speaking and not agent.prompts.qsize()
+
+            await _until(lambda: user.first_frame_at is not None, timeout)
+            result.greeting.append(user.first_frame_at - started_at)
+            await _until(idle, timeout)
+            user.drain(_CHAT_TOPIC)
+
+            for turn in range(config.turns):
+                await asyncio.sleep(config.think_time * user.random.uniform(0.5, 1.5))
+
+                if config.voice:
+                    # the turn starts when the user stops speaking
+                    await user.say(config.speech_seconds)
+                    sent_at = user.start_turn()
+                else:
+                    sent_at = user.start_turn()
+                    user.chat(f"question {turn} of room {index}")
+                try:
+                    reply = await asyncio.wait_for(user.topic(_CHAT_TOPIC).get(), timeout)
+                    await _until(idle, timeout)
+                except asyncio.TimeoutError:
+                    result.failed += 1
+                    continue
+
+                result.completed += 1
+                result.reply.append(reply.sent_at - sent_at)
+                if user.first_frame_at is not None:
+                    result.first_audio.append(user.first_frame_at - sent_at)
+                    result.turn.append(source.last_frame_at - sent_at)
+
+                if turn == config.config_update_turn:
+                    user.drain(_CONFIG_TOPIC)
+                    sent_at = time.monotonic()
+                    user.update_config(
+                        {"agentId": agent_config.agent_id, "temperature": user.random.uniform(0.2, 1.0)}
+                    )
+                    with contextlib.suppress(asyncio.TimeoutError):
+                        update = await asyncio.wait_for(user.topic(_CONFIG_TOPIC).get(), timeout)
+                        result.config_update.append(update.sent_at - sent_at)
+        finally:
+            if microphone is not None:
+                microphone.cancel()
+            result.metadata_updates = room.local_participant.metadata_updates
+            room.leave(user.participant)
+            await ctx.disconnect()
+
+
+@contextlib.contextmanager
+def _patched(config: BenchConfig, postgrest: FakePostgrest, tts: TTS, stt: FakeSTT):
+    seeds = itertools.count(config.seed)
+
+    def create_backend(model_type, model_config_dict):
+        # backends stall independently of each other
+        return FakeModelBackend(model_type, model_config_dict, config.llm, seed=next(seeds))
+
+    platforms = {"OpenAI": [f"http://bench-llm-{i}/v1" for i in range(config.llm_backends)]}
+
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(mock.patch.object(rtc, "AudioSource", FakeAudioSource))
+        stack.enter_context(mock.patch.object(rtc, "LocalAudioTrack", FakeLocalAudioTrack))
+        stack.enter_context(mock.patch.object(rtc, "AudioStream", FakeAudioStream))
+        stack.enter_context(mock.patch.object(ModelFactory, "create", create_backend))
+        stack.enter_context(mock.patch.object(main, "get_tts", lambda: tts))
+        stack.enter_context(mock.patch.object(main, "get_stt", lambda: stt))
+        stack.enter_context(mock.patch.object(settings, "POSTGREST_URL", postgrest.url))
+        stack.enter_context(mock.patch.object(settings, "TTS_STREAMING", config.tts_streaming))
+        stack.enter_context(mock.patch.object(settings, "VOICE_INPUT_ENABLED", config.voice))
+        stack.enter_context(mock.patch.object(settings, "LLM_PLATFORMS", platforms))
+        stack.enter_context(mock.patch.object(settings, "LLM_HEDGE_DELAY", config.hedge_delay))
+        yield
+
+
+async def run_bench(config: BenchConfig) -> Dict[str, Any]:
+    """Run `config.rooms` simulated rooms concurrently and return the report."""
+    rows = [agent_row(f"bench-agent-{i}", f"Bench{i}") for i in range(config.agents)]
+    postgrest = await FakePostgrest(rows, latency=config.postgrest_latency).start()
+    tts = TTS(
+        client=FakeOpenAIClient(config.tts),
+        response_format=config.tts_format,
+        cache=TTSCache(memory_limit=settings.TTS_CACHE_MEMORY_BYTES),
+    )
+    stt = FakeSTT(config.stt)
+    users: List[_SimulatedUser] = []
+    sampler = LoopLagSampler(config.lag_interval)
+    tracker = get_task_tracker()
+    monitor = LoopMonitor(interval=config.lag_interval, stall_threshold=settings.LOOP_STALL_THRESHOLD, tracker=tracker)
+    results = [RoomResult() for _ in range(config.rooms)]
+
+    if config.trace_memory:
+        tracemalloc.start()
+
+    scheduler = get_scheduler()
+    scheduler_before = asdict(scheduler.stats)
+    router_before = asdict(get_router_stats())
+
+    with _patched(config, postgrest, tts, stt):
+        scheduler.attach()
+        await open_postgrest_client()
+        tracker.install()
+        leaked_before = tracker.stats.leaked
+        tasks_before = len(asyncio.all_tasks())
+        sampler_task = asyncio.create_task(sampler.run())
+        monitor.start()
+        started_at = time.monotonic()
+        try:
+            outcomes = await asyncio.gather(
+                *(
+                    _run_room(i, rows[i % len(rows)]["agent_id"], config, results[i], users)
+                    for i in range(config.rooms)
+                ),
+                return_exceptions=True,
+            )
+            wall_time = time.monotonic() - started_at
+        finally:
+            sampler_task.cancel()
+            await monitor.stop()
+            await close_postgrest_client()
+            await postgrest.close()
+
+        # give cancelled tasks a chance to finish before counting the ones left behind
+        await asyncio.sleep(0.1)
+        leaked = len(asyncio.all_tasks()) - tasks_before
+        tracker.uninstall()
+
+    traced_peak = None
+    if config.trace_memory:
+        traced_peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+    errors = [repr(outcome) for outcome in outcomes if isinstance(outcome, BaseException)]
+
+    def collect(name: str) -> List[float]:
+        return [sample for result in results for sample in getattr(result, name)]
+
+    completed = sum(result.completed for result in results)
+    mic_seconds = sum(user.mic_seconds for user in users)
+    return {
+        "config": asdict(config),
+        "rooms": {"count": config.rooms, "errors": len(errors)},
+        "turns": {"completed": completed, "failed": sum(result.failed for result in results)},
+        "latency": {
+            name: percentiles(collect(name)) for name in ("greeting", "first_audio", "reply", "turn", "config_update")
+        },
+        "loop_lag": {**percentiles(sampler.samples), "stalls": monitor.stats.stalls},
+        "tasks": {
+            "peak": sampler.peak_tasks,
+            "leaked": leaked,
+            # created after their room closed or still running after `ROOM_CLOSE_TIMEOUT`
+            "outlived_room": tracker.stats.leaked - leaked_before,
+        },
+        "signaling": {
+            # agent state updates of the participant metadata, the greeting included
+            "metadata_updates_per_turn": round(
+                sum(result.metadata_updates for result in results) / max(completed + config.rooms, 1), 2
+            ),
+        },
+        # held back by the request scheduler, the fake clients are never rate limited
+        "openai": {
+            name: round(value - scheduler_before[name], 3) for name, value in asdict(scheduler.stats).items()
+        },
+        "llm": {name: value - router_before[name] for name, value in asdict(get_router_stats()).items()},
+        # seconds of microphone audio, and of it sent to the STT by the VAD
+        "voice": {
+            "mic_seconds": round(mic_seconds, 1),
+            "stt_seconds": round(stt.seconds, 1),
+            "stt_share": round(stt.seconds / mic_seconds, 3) if mic_seconds else 0.0,
+            "segments": stt.segments,
+        },
+        "memory": {
+            # kilobytes on Linux
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "traced_peak_mb": round(traced_peak, 1) if traced_peak is not None else None,
+        },
+        "wall_time": round(wall_time, 3),
+        "turns_per_second": round(completed / wall_time, 3) if wall_time else 0.0,
+        "errors": errors[:10],
+    }
+
+
+def _flatten(report: Dict[str, Any]) -> Dict[Tuple[str, str], float]:
+    metrics = {}
+    for section in _MIN_DELTAS:
+        values = report.get(section) or {}
+        for name, value in values.items():
+            if isinstance(value, dict):
+                for stat in ("p50", "p99"):
+                    if isinstance(value.get(stat), (int, float)):
+                        metrics[(section, f"{section}.{name}.{stat}")] = value[stat]
+            elif isinstance(value, (int, float)) and name not in ("completed", "count", "mean", "max"):
+                metrics[(section, f"{section}.{name}")] = value
+    return metrics
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Tuple[str, float, float]]:
+    """
+    Return the metrics of `report` worse than in `baseline` by more than `tolerance`, as
+    `(metric, baseline value, value)`. Every compared metric is better when lower.
+    """
+    current = _flatten(report)
+    regressions = []
+    for key, base in _flatten(baseline).items():
+        value = current.get(key)
+        if value is None:
+            continue
+        section, name = key
+        if value > base * (1 + tolerance) and value - base > _MIN_DELTAS[section]:
+            regressions.append((name, base, value))
+    return regressions
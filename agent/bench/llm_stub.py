@@ -0,0 +1,61 @@
+"""
+OpenAI-compatible chat completions server, standing in for an LLM backend of the agent:
+
+    python -m bench.llm_stub --port 8001 --stall-rate 0.05
+    python -m bench.llm_stub --port 8002 --error-rate 0.1
+    LLM_PLATFORMS='{"OpenAI": ["http://127.0.0.1:8001/v1", "http://127.0.0.1:8002/v1"]}' python main.py dev
+
+Replies are random words at the pace of the LLM profile. A share of the requests stalls before the
+first token or fails with a 500, to watch the hedging and failover of the LLM router.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+from .fakes import LLMProfile, OpenAIStub
+
+
+def _parse_args() -> argparse.Namespace:
+    llm = LLMProfile()
+    parser = argparse.ArgumentParser(prog="python -m bench.llm_stub", description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--first-token", type=float, default=llm.first_token_latency)
+    parser.add_argument("--token-interval", type=float, default=llm.token_interval)
+    parser.add_argument("--reply-words", type=int, default=llm.reply_words)
+    parser.add_argument("--stall-rate", type=float, default=llm.stall_rate)
+    parser.add_argument("--stall-latency", type=float, default=llm.stall_latency)
+    parser.add_argument("--error-rate", type=float, default=llm.error_rate)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    profile = LLMProfile(
+        first_token_latency=args.first_token,
+        token_interval=args.token_interval,
+        reply_words=args.reply_words,
+        stall_rate=args.stall_rate,
+        stall_latency=args.stall_latency,
+        error_rate=args.error_rate,
+    )
+    stub = await OpenAIStub(profile, host=args.host, port=args.port, seed=args.seed).start()
+    logging.info("serving chat completions at %s", stub.url)
+    try:
+        await stub.serve_forever()
+    finally:
+        await stub.close()
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_serve(_parse_args()))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,14 @@
+from typing import Dict, List, Literal, Tuple
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
+    # agent serving the rooms whose metadata names none, other agents are looked up per job
     AGENT_ID: str
     AGENT_NAME: str
+    # rooms one agent may serve at a time in this process, 0 for no limit
+    AGENT_MAX_ROOMS: int = 10
 
     LIVEKIT_URL: str
     LIVEKIT_API_KEY: str
@@ -11,6 +16,113 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str
 
     POSTGREST_URL: str = "http://localhost:3030"
+    # pooled PostgREST HTTP client, timeouts in seconds, only idempotent reads are retried
+    POSTGREST_CONNECT_TIMEOUT: float = 2.0
+    POSTGREST_READ_TIMEOUT: float = 5.0
+    POSTGREST_MAX_CONNECTIONS: int = 20
+    POSTGREST_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    POSTGREST_KEEPALIVE_EXPIRY: float = 30.0
+    # requires the `h2` package
+    POSTGREST_HTTP2: bool = False
+    POSTGREST_READ_RETRIES: int = 2
+    POSTGREST_RETRY_BACKOFF: float = 0.1
+    # seconds an agent config fetched from PostgREST is reused before it is queried again
+    AGENT_CONFIG_CACHE_TTL: float = 30.0
+
+    # per-room chat prompt queue, overflow is one of "coalesce", "drop_oldest" or "reject"
+    PROMPT_QUEUE_MAXSIZE: int = 8
+    PROMPT_QUEUE_OVERFLOW: Literal["coalesce", "drop_oldest", "reject"] = "coalesce"
+
+    # blocking LLM calls run on a bounded thread pool, timeout is per call in seconds
+    LLM_MAX_CONCURRENCY: int = 16
+    LLM_TIMEOUT: float = 60.0
+    # OpenAI rate limits of the account per model, as requests and tokens per minute, 0 for no limit, e.g.
+    # '{"gpt-3.5-turbo": [3500, 60000], "tts-1": [50, 0]}'; requests are held back to stay within them and retried on
+    # 429 and 5xx responses, over one pool of OPENAI_MAX_CONNECTIONS. Models without limits only back off on 429
+    OPENAI_RATE_LIMITS: Dict[str, Tuple[int, int]] = {}
+    OPENAI_MAX_RETRIES: int = 4
+    OPENAI_MAX_CONNECTIONS: int = 100
+    # LLM backends of each `model_platform` of the agent configs, as OpenAI-compatible base URLs, "" for the OpenAI API,
+    # e.g. '{"OpenAI": ["", "http://127.0.0.1:8001/v1"]}'. Streamed replies without a first token after
+    # LLM_HEDGE_DELAY seconds are also requested from the next backend, 0 disables it; backends that failed are
+    # tried last for LLM_BACKEND_COOLDOWN seconds
+    LLM_PLATFORMS: Dict[str, List[str]] = {"OpenAI": [""]}
+    LLM_HEDGE_DELAY: float = 2.0
+    LLM_BACKEND_COOLDOWN: float = 30.0
+    # fold evicted dialog rounds into a rolling summary stored in the agent's `memory` column
+    MEMORY_SUMMARY_ENABLED: bool = False
+    MEMORY_SUMMARY_MAX_TOKENS: int = 256
+
+    # stream replies sentence by sentence as raw PCM instead of synthesizing the whole reply as mp3
+    TTS_STREAMING: bool = True
+    TTS_FRAME_MS: int = 20
+    TTS_MAX_CONCURRENCY: int = 3
+    # format requested from the TTS API and decoded in process: "pcm" or "wav" need no decoding, "mp3" and "opus"
+    # require PyAV
+    TTS_RESPONSE_FORMAT: str = "pcm"
+
+    # content-addressed cache of synthesized PCM, an empty TTS_CACHE_DIR disables the disk tier
+    TTS_CACHE_ENABLED: bool = True
+    TTS_CACHE_MEMORY_BYTES: int = 32 * 1024 * 1024
+    TTS_CACHE_DIR: str = ".cache/tts"
+    TTS_CACHE_DISK_BYTES: int = 512 * 1024 * 1024
+
+    # transcribe the microphone of the participants, off by default as it subscribes to their audio and sends
+    # their speech to the paid STT API: speech is detected on the energy of VAD_FRAME_MS frames, at least
+    # VAD_THRESHOLD_DB above the noise floor, and only the speech segments are sent to the STT; durations in
+    # seconds, a segment ends after VAD_MIN_SILENCE of silence or VAD_MAX_SPEECH of speech
+    VOICE_INPUT_ENABLED: bool = False
+    VAD_FRAME_MS: int = 20
+    VAD_THRESHOLD_DB: float = 12.0
+    VAD_MIN_SPEECH: float = 0.1
+    VAD_MIN_SILENCE: float = 0.5
+    VAD_PADDING: float = 0.2
+    VAD_MAX_SPEECH: float = 30.0
+    # an empty STT_LANGUAGE lets the model detect it, the final transcript is awaited STT_FINAL_TIMEOUT seconds
+    STT_MODEL: str = "whisper-1"
+    STT_LANGUAGE: str = ""
+    STT_FINAL_TIMEOUT: float = 10.0
+
+    # seconds to wait for the user's tracks before greeting anyway, e.g. for chat-only users
+    GREETING_WAIT_TIMEOUT: float = 1.0
+
+    # cancel the reply being spoken when a new chat message arrives
+    BARGE_IN: bool = True
+
+    # service messages sent within the flush interval (seconds) are published as one data packet
+    SERVICE_FLUSH_INTERVAL: float = 0.01
+    SERVICE_MAX_BATCH: int = 32
+
+    # agent state changes within the window (seconds) are published as one metadata update of the latest state,
+    # at most once per AGENT_STATE_MIN_INTERVAL
+    AGENT_STATE_WINDOW: float = 0.05
+    AGENT_STATE_MIN_INTERVAL: float = 0.1
+
+    # jobs are rejected, and left to other workers, once a component of the load reaches its limit, 0 disables a
+    # limit; the load is reported to LiveKit every LOAD_REPORT_INTERVAL seconds
+    LOAD_MAX_ROOMS: int = 50
+    LOAD_MAX_LOOP_LAG: float = 0.1
+    LOAD_MAX_LLM_PENDING: int = 32
+    LOAD_MAX_TTS_PENDING: int = 64
+    LOAD_MAX_RSS_MB: int = 0
+    LOAD_REPORT_INTERVAL: float = 5.0
+    # on SIGTERM stop taking jobs and shut down once the rooms ended, or DRAIN_TIMEOUT seconds later
+    DRAIN_ON_SIGTERM: bool = True
+    DRAIN_TIMEOUT: float = 600.0
+
+    # event loop lag sampling in seconds, the loop thread's stack is logged when it is blocked for longer than
+    # LOOP_STALL_THRESHOLD, running tasks are reported by room every TASK_REPORT_INTERVAL
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_LAG_INTERVAL: float = 0.1
+    LOOP_STALL_THRESHOLD: float = 0.25
+    TASK_REPORT_INTERVAL: float = 60.0
+    # seconds the tasks of a closed room get to finish before they are reported as leaked
+    ROOM_CLOSE_TIMEOUT: float = 5.0
+
+    # latency histograms of the voice pipeline, served for Prometheus on http://METRICS_HOST:METRICS_PORT/metrics
+    METRICS_ENABLED: bool = False
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: int = 9464
 
     model_config = SettingsConfigDict(
         # `.env.prod` takes priority over `.env`
@@ -1,5 +1,50 @@
-from .event_emitter import EventEmitter
+from .audio_output import AudioOutput, AudioOutputStats, Resampler
+from .event_emitter import EventEmitter, EventEmitterStats
+from .load import LoadController, LoadStats
+from .loop_monitor import LoopMonitor, LoopMonitorStats
+from .metrics import MetricsRegistry, Stage, TurnTrace, get_registry, mark, start_turn, use_trace
+from .prompt_queue import PromptQueue, PromptQueueFull, PromptQueueStats, OverflowPolicy
+from .room_registry import RoomRegistry, RoomRegistryStats
+from .speech import SpeechController, SpeechStats
+from .state_publisher import StatePublisher, StatePublisherStats
+from .tasks import TaskTracker, TaskTrackerStats, get_task_tracker, room_scope
+from .vad import EnergyVAD, VADStats
+from .voice_input import SegmentStream, VoiceInput, VoiceInputStats
 
 __all__ = [
-    "EventEmitter"
+    "AudioOutput",
+    "AudioOutputStats",
+    "Resampler",
+    "EventEmitter",
+    "EventEmitterStats",
+    "LoadController",
+    "LoadStats",
+    "LoopMonitor",
+    "LoopMonitorStats",
+    "MetricsRegistry",
+    "Stage",
+    "TurnTrace",
+    "get_registry",
+    "mark",
+    "start_turn",
+    "use_trace",
+    "PromptQueue",
+    "PromptQueueFull",
+    "PromptQueueStats",
+    "OverflowPolicy",
+    "RoomRegistry",
+    "RoomRegistryStats",
+    "SpeechController",
+    "SpeechStats",
+    "StatePublisher",
+    "StatePublisherStats",
+    "TaskTracker",
+    "TaskTrackerStats",
+    "get_task_tracker",
+    "room_scope",
+    "EnergyVAD",
+    "VADStats",
+    "SegmentStream",
+    "VoiceInput",
+    "VoiceInputStats",
 ]
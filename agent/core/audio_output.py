@@ -0,0 +1,172 @@
+import asyncio
+import math
+from dataclasses import dataclass
+from typing import Optional, Tuple, Union
+
+import numpy as np
+from livekit import rtc
+
+from .metrics import Stage, mark
+
+AudioBuffer = Union[bytes, bytearray, memoryview]
+
+
+class Resampler:
+    """
+    Streaming linear-interpolation resampler and downmixer for interleaved 16-bit PCM.
+
+    State is carried between `push` calls so chunk boundaries do not produce clicks. When the input
+    already matches the output format the input is returned as a view without copying.
+    """
+
+    def __init__(self, in_rate: int, in_channels: int, out_rate: int, out_channels: int = 1) -> None:
+        if out_channels != 1 and out_channels != in_channels:
+            raise ValueError("only downmixing to mono or keeping the channel count is supported")
+
+        self.in_rate = in_rate
+        self.in_channels = in_channels
+        self.out_rate = out_rate
+        self.out_channels = out_channels
+        self._ratio = in_rate / out_rate
+        # position of the next output sample, in input samples relative to `_tail`
+        self._pos = 0.0
+        # last input sample of the previous chunk, shape (out_channels,)
+        self._tail: Optional[np.ndarray] = None
+
+    @property
+    def passthrough(self) -> bool:
+        return self.in_rate == self.out_rate and self.in_channels == self.out_channels
+
+    def push(self, data: AudioBuffer) -> np.ndarray:
+        """Convert a chunk of input PCM, returns interleaved int16 samples in the output format."""
+        samples = np.frombuffer(data, dtype=np.int16)
+        samples = samples[:len(samples) - len(samples) % self.in_channels]
+        if self.passthrough:
+            return samples
+
+        x = samples.reshape(-1, self.in_channels).astype(np.float32)
+        if self.out_channels == 1 and self.in_channels > 1:
+            x = x.mean(axis=1, keepdims=True)
+
+        if self.in_rate == self.out_rate:
+            return _to_int16(x)
+
+        if self._tail is not None:
+            x = np.concatenate((self._tail[np.newaxis, :], x))
+        if len(x) == 0:
+            return np.empty(0, dtype=np.int16)
+
+        last = len(x) - 1
+        count = math.floor((last - self._pos) / self._ratio) + 1 if last >= self._pos else 0
+        positions = self._pos + self._ratio * np.arange(count)
+        grid = np.arange(len(x))
+        out = np.empty((count, self.out_channels), dtype=np.float32)
+        for ch in range(self.out_channels):
+            out[:, ch] = np.interp(positions, grid, x[:, ch])
+
+        self._pos = self._pos + self._ratio * count - last
+        self._tail = x[-1]
+        return _to_int16(out)
+
+    def reset(self) -> None:
+        self._pos = 0.0
+        self._tail = None
+
+
+def _to_int16(x: np.ndarray) -> np.ndarray:
+    return np.clip(np.rint(x), -32768, 32767).astype(np.int16).reshape(-1)
+
+
+@dataclass
+class AudioOutputStats:
+    frames: int = 0
+    samples: int = 0
+
+
+class AudioOutput:
+    """
+    Frame pump feeding an `rtc.AudioSource`.
+
+    Accepts PCM in any sample rate and channel count, converts it to the track format and captures
+    it in fixed `frame_ms` frames. Frames are sliced from the converted buffer with memoryviews rather
+    than copied out of it, each slice is copied once, into the `rtc.AudioFrame` carrying it. Every frame
+    is awaited on the source, so producers are paced by playback instead of queueing whole utterances.
+    """
+
+    def __init__(self, source: rtc.AudioSource, sample_rate: int, num_channels: int = 1, frame_ms: int = 20) -> None:
+        self._source = source
+        self._sample_rate = sample_rate
+        self._num_channels = num_channels
+        self._samples_per_frame = sample_rate * frame_ms // 1000
+        self._frame_size = self._samples_per_frame * num_channels * 2
+        # less than a frame of converted audio left over from the previous push
+        self._carry = bytearray()
+        self._resampler: Optional[Resampler] = None
+        self._lock = asyncio.Lock()
+        self.stats = AudioOutputStats()
+
+    @property
+    def format(self) -> Tuple[int, int]:
+        return self._sample_rate, self._num_channels
+
+    async def push(self, data: AudioBuffer, sample_rate: int, num_channels: int) -> None:
+        async with self._lock:
+            resampler = self._resampler
+            if resampler is None or (resampler.in_rate, resampler.in_channels) != (sample_rate, num_channels):
+                resampler = self._resampler = Resampler(
+                    sample_rate, num_channels, self._sample_rate, self._num_channels
+                )
+
+            pcm = resampler.push(data)
+            await self._capture(memoryview(pcm).cast("B"))
+
+    async def push_frame(self, frame: rtc.AudioFrame) -> None:
+        await self.push(frame.data, frame.sample_rate, frame.num_channels)
+
+    async def flush(self) -> None:
+        """Capture the buffered partial frame and reset the resampler, call at the end of an utterance."""
+        async with self._lock:
+            if self._carry:
+                data, self._carry = self._carry, bytearray()
+                await self._capture_frame(memoryview(data))
+            if self._resampler:
+                self._resampler.reset()
+
+    def clear(self) -> None:
+        """Drop buffered audio without capturing it."""
+        self._carry = bytearray()
+        if self._resampler:
+            self._resampler.reset()
+
+    async def _capture(self, view: memoryview) -> None:
+        offset = 0
+        if self._carry:
+            offset = min(self._frame_size - len(self._carry), len(view))
+            self._carry += view[:offset]
+            if len(self._carry) < self._frame_size:
+                return
+            data, self._carry = self._carry, bytearray()
+            await self._capture_frame(memoryview(data))
+
+        end = offset + (len(view) - offset) // self._frame_size * self._frame_size
+        for start in range(offset, end, self._frame_size):
+            await self._capture_frame(view[start:start + self._frame_size])
+
+        self._carry += view[end:]
+
+    async def _capture_frame(self, data: memoryview) -> None:
+        samples_per_channel = len(data) // (2 * self._num_channels)
+        if not samples_per_channel:
+            return
+
+        frame = rtc.AudioFrame(
+            data=data,
+            sample_rate=self._sample_rate,
+            num_channels=self._num_channels,
+            samples_per_channel=samples_per_channel,
+        )
+        await self._source.capture_frame(frame)
+        mark(Stage.FIRST_FRAME)
+        mark(Stage.LAST_FRAME)
+        self.stats.frames += 1
+        self.stats.samples += samples_per_channel
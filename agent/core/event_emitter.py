@@ -1,23 +1,77 @@
-from typing import Callable, Dict, Set, Optional, Generic, TypeVar
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Generic, List, Optional, Set, Tuple, TypeVar
 
 T = TypeVar("T")
 
 
+@dataclass
+class EventEmitterStats:
+    emitted: int = 0
+    handler_errors: int = 0
+    tasks_started: int = 0
+    tasks_running: int = 0
+
+
 class EventEmitter(Generic[T]):
-    def __init__(self) -> None:
-        self._events: Dict[T, Set[Callable]] = dict()
+    """
+    Event emitter calling handlers in the order they were registered.
+
+    `emit` dispatches over a snapshot of the handlers, so handlers may register or remove handlers
+    (`once` does) while an event is being delivered. Handlers returning a coroutine are scheduled as
+    tasks tracked by the emitter, at most `max_concurrency` of them run at a time, in the order they
+    were emitted. An exception raised by a handler is logged and does not stop the delivery to the
+    other handlers.
+
+    :param max_concurrency: Maximum number of coroutine handlers running at the same time, `None`
+        for no limit.
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None) -> None:
+        # dicts keep insertion order, values are unused
+        self._events: Dict[T, Dict[Callable, None]] = dict()
+        # event -> handlers as of the last change, rebuilt lazily
+        self._snapshots: Dict[T, Tuple[Callable, ...]] = dict()
+        self._waiters: Dict[T, List[asyncio.Future]] = dict()
+        self._tasks: Set[asyncio.Task] = set()
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self.stats = EventEmitterStats()
 
     def emit(self, event: T, *args, **kwargs) -> None:
-        if event in self._events:
-            for callback in self._events[event]:
-                callback(*args, **kwargs)
+        self.stats.emitted += 1
+
+        waiters = self._waiters.pop(event, None)
+        if waiters:
+            result = args[0] if len(args) == 1 else (args or None)
+            for fut in waiters:
+                if not fut.done():
+                    fut.set_result(result)
+
+        handlers = self._snapshots.get(event)
+        if handlers is None:
+            callbacks = self._events.get(event)
+            if not callbacks:
+                return
+            handlers = self._snapshots[event] = tuple(callbacks)
+
+        for callback in handlers:
+            try:
+                result = callback(*args, **kwargs)
+            except Exception as e:
+                self.stats.handler_errors += 1
+                logging.error("handler %r of event %r failed: %s", callback, event, e, exc_info=e)
+                continue
+
+            if asyncio.iscoroutine(result):
+                self._schedule(event, callback, result)
 
     def once(self, event: T, callback: Optional[Callable] = None) -> Callable:
         if callback is not None:
 
             def once_callback(*args, **kwargs):
                 self.off(event, once_callback)
-                callback(*args, **kwargs)
+                return callback(*args, **kwargs)
 
             return self.on(event, once_callback)
         else:
@@ -31,8 +85,9 @@ class EventEmitter(Generic[T]):
     def on(self, event: T, callback: Optional[Callable] = None) -> Callable:
         if callback is not None:
             if event not in self._events:
-                self._events[event] = set()
-            self._events[event].add(callback)
+                self._events[event] = dict()
+            self._events[event][callback] = None
+            self._snapshots.pop(event, None)
             return callback
         else:
 
@@ -44,4 +99,60 @@ class EventEmitter(Generic[T]):
 
     def off(self, event: T, callback: Callable) -> None:
         if event in self._events:
-            self._events[event].remove(callback)
+            self._events[event].pop(callback, None)
+            self._snapshots.pop(event, None)
+
+    async def wait_for(self, event: T, timeout: Optional[float] = None) -> Any:
+        """
+        Wait for the next emission of `event`.
+
+        :return: The single argument of the emission, a tuple of its arguments if there are several,
+            or None if there are none.
+        :raises asyncio.TimeoutError: If `event` was not emitted within `timeout` seconds.
+        """
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(event, []).append(fut)
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        finally:
+            waiters = self._waiters.get(event)
+            if waiters and fut in waiters:
+                waiters.remove(fut)
+                if not waiters:
+                    del self._waiters[event]
+
+    def cancel_tasks(self) -> None:
+        """Cancel the coroutine handlers still pending or running."""
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def drain(self) -> None:
+        """Wait until every coroutine handler scheduled so far has finished."""
+        if self._tasks:
+            await asyncio.wait(list(self._tasks))
+
+    def _schedule(self, event: T, callback: Callable, coro: Awaitable) -> None:
+        task = asyncio.ensure_future(self._run_handler(event, callback, coro))
+        self._tasks.add(task)
+        self.stats.tasks_started += 1
+        self.stats.tasks_running = len(self._tasks)
+
+        def on_done(t: asyncio.Task) -> None:
+            self._tasks.discard(t)
+            self.stats.tasks_running = len(self._tasks)
+            if t.cancelled() and asyncio.iscoroutine(coro):
+                # the handler may have been cancelled before it started
+                coro.close()
+
+        task.add_done_callback(on_done)
+
+    async def _run_handler(self, event: T, callback: Callable, coro: Awaitable) -> None:
+        try:
+            if self._semaphore:
+                async with self._semaphore:
+                    await coro
+            else:
+                await coro
+        except Exception as e:
+            self.stats.handler_errors += 1
+            logging.error("handler %r of event %r failed: %s", callback, event, e, exc_info=e)
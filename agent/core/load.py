@@ -0,0 +1,98 @@
+import os
+import resource
+import sys
+from dataclasses import dataclass
+from typing import Callable, Dict, Mapping, Optional
+
+from .metrics import get_registry, metrics_enabled
+
+Probe = Callable[[], float]
+
+
+def rss_mb() -> float:
+    """Resident memory of the process in megabytes, its peak where the current value is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        # kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+@dataclass
+class LoadStats:
+    admitted: int = 0
+    rejected: int = 0
+    # largest ratio of a component to its limit, as of the last sample
+    score: float = 0.0
+    draining: bool = False
+
+
+class LoadController:
+    """
+    Load of the worker process, and admission of new jobs against it.
+
+    Every component of the load is read from a probe, e.g. the active rooms, the event loop lag or the
+    pending LLM calls, and divided by its limit. The score is the largest of these ratios, so it reaches
+    1.0 as soon as one component reaches its limit. Components without a limit, or with a limit of 0,
+    are sampled and reported but do not count.
+
+    `admit` takes a job while the score is below 1.0, until `drain` stops taking jobs for good. An
+    admitted job holds a reservation until `release`, counted in the `reserve` component, so the jobs
+    admitted while others are still being set up cannot overshoot its limit.
+
+    :param probes: Name of a component -> callable returning its current value.
+    :param limits: Name of a component -> value at which the worker is full.
+    :param reserve: Component the jobs count in once they are set up, e.g. the rooms.
+    """
+
+    def __init__(
+        self, probes: Mapping[str, Probe], limits: Mapping[str, float], reserve: Optional[str] = None
+    ) -> None:
+        self._probes = dict(probes)
+        self._limits = {name: limit for name, limit in limits.items() if limit > 0}
+        self._reserve = reserve
+        self._reserved = 0
+        self.stats = LoadStats()
+
+    @property
+    def draining(self) -> bool:
+        return self.stats.draining
+
+    def sample(self) -> Dict[str, float]:
+        """Read every component, return them with the resulting `score`."""
+        values = {name: float(probe()) for name, probe in self._probes.items()}
+        if self._reserve in values:
+            values[self._reserve] += self._reserved
+        score = max((values[name] / limit for name, limit in self._limits.items() if name in values), default=0.0)
+        self.stats.score = score
+
+        if metrics_enabled():
+            registry = get_registry()
+            gauge = registry.gauge("warda_load", "Components of the worker load", ("component",))
+            for name, value in values.items():
+                gauge.set(value, name)
+            registry.gauge("warda_load_score", "Largest ratio of a load component to its limit").set(score)
+
+        return {**values, "score": score}
+
+    def admit(self) -> bool:
+        """Return True if the worker can take one more job, and reserve it until `release`."""
+        if not self.stats.draining and self.sample()["score"] < 1.0:
+            self._reserved += 1
+            return True
+        self.stats.rejected += 1
+        return False
+
+    def release(self, accepted: bool) -> None:
+        """End the reservation of an admitted job, once it was accepted or rejected after all."""
+        self._reserved -= 1
+        if accepted:
+            self.stats.admitted += 1
+        else:
+            self.stats.rejected += 1
+
+    def drain(self) -> None:
+        """Stop taking jobs, the rooms already served are not affected."""
+        self.stats.draining = True
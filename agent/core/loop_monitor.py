@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Optional
+
+from .metrics import get_registry, metrics_enabled
+from .tasks import TaskTracker
+
+# seconds, from scheduling jitter to a loop blocked by a synchronous call
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# weight of a new sample in `LoopMonitorStats.recent_lag`
+_RECENT_WEIGHT = 0.1
+
+
+@dataclass
+class LoopMonitorStats:
+    samples: int = 0
+    last_lag: float = 0.0
+    max_lag: float = 0.0
+    total_lag: float = 0.0
+    # exponentially weighted over the last seconds of samples, the lag the process runs with right now
+    recent_lag: float = 0.0
+    stalls: int = 0
+
+    @property
+    def avg_lag(self) -> float:
+        return self.total_lag / self.samples if self.samples else 0.0
+
+
+class LoopMonitor:
+    """
+    Health of the event loop shared by every room of the process.
+
+    A task sleeping `interval` seconds measures how late the loop wakes it up, the lag. A watchdog
+    thread checks that the task keeps waking up; when the loop has been blocked for `stall_threshold`
+    seconds it logs the stack of the loop thread, which is the stack of the slow callback while it is
+    still running. Every `report_interval` seconds the running tasks of `tracker` are reported by room
+    and origin.
+
+    Lags are observed in the `warda_loop_lag_seconds` histogram and task counts exported as gauges when
+    metrics are enabled.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        stall_threshold: float = 0.25,
+        tracker: Optional[TaskTracker] = None,
+        report_interval: float = 60.0,
+    ) -> None:
+        self._interval = interval
+        self._stall_threshold = stall_threshold
+        self._tracker = tracker
+        self._report_interval = report_interval
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        # monotonic time the sampling task went to sleep, written by the loop and read by the watchdog
+        self._heartbeat = 0.0
+        self.stats = LoopMonitorStats()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.wait([self._task])
+            self._task = None
+        self._watchdog = None
+
+    def report(self) -> None:
+        if self._tracker is None:
+            return
+
+        counts = self._tracker.counts()
+        total = sum(sum(by_origin.values()) for by_origin in counts.values())
+        rooms = sum(1 for room in counts if room is not None)
+        logging.debug("%d tasks running in %d rooms: %s", total, rooms, counts)
+
+        if metrics_enabled():
+            registry = get_registry()
+            by_origin = {}
+            for room_counts in counts.values():
+                for origin, count in room_counts.items():
+                    by_origin[origin] = by_origin.get(origin, 0) + count
+            gauge = registry.gauge("warda_tasks", "Running tasks by origin", ("origin",))
+            gauge.clear()
+            for origin, count in by_origin.items():
+                gauge.set(count, origin)
+            registry.gauge("warda_tasks_leaked", "Tasks that outlived their room").set(self._tracker.stats.leaked)
+
+    async def _sample(self) -> None:
+        next_report = time.monotonic() + self._report_interval
+        while True:
+            started_at = time.monotonic()
+            self._heartbeat = started_at
+            await asyncio.sleep(self._interval)
+            now = time.monotonic()
+            lag = max(now - started_at - self._interval, 0.0)
+
+            self.stats.samples += 1
+            self.stats.last_lag = lag
+            self.stats.max_lag = max(self.stats.max_lag, lag)
+            self.stats.total_lag += lag
+            self.stats.recent_lag += _RECENT_WEIGHT * (lag - self.stats.recent_lag)
+            if lag >= self._stall_threshold:
+                self.stats.stalls += 1
+
+            if metrics_enabled():
+                registry = get_registry()
+                registry.histogram(
+                    "warda_loop_lag_seconds", "Delay of the event loop in waking up a task", buckets=LAG_BUCKETS
+                ).observe(lag)
+                if lag >= self._stall_threshold:
+                    registry.counter("warda_loop_stalls", "Times the event loop was blocked").inc()
+
+            if now >= next_report:
+                next_report = now + self._report_interval
+                try:
+                    self.report()
+                except Exception as e:
+                    logging.error("failed to report tasks: %s", e, exc_info=e)
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stopped.wait(self._stall_threshold / 2):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - self._interval
+            # one stack per stall, the heartbeat moves on when the loop runs again
+            if blocked < self._stall_threshold or reported == heartbeat:
+                continue
+            reported = heartbeat
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "(unavailable)\n"
+            logging.warning("event loop blocked for %.3fs, it is running:\n%s", blocked, stack)
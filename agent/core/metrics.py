@@ -0,0 +1,274 @@
+import asyncio
+import bisect
+import contextlib
+import logging
+import time
+from contextvars import ContextVar
+from enum import Enum
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# seconds, tuned for voice turns: tens of milliseconds up to slow LLM replies
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+
+
+class Counter:
+    def __init__(self, name: str, help_: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self._values.items():
+            yield f"{self.name}_total{_format_labels(self.labelnames, labels)} {value}"
+
+
+class Gauge:
+    def __init__(self, name: str, help_: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def clear(self) -> None:
+        """Drop every series, for gauges whose label values come and go."""
+        self._values = {}
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    def __init__(
+        self, name: str, help_: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        self.name = name
+        self.help = help_
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (per-bucket counts, the last one being +Inf, [sum])
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = series
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{_format_labels(self.labelnames + ('le',), labels + (le,))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total[0]}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+def _format_labels(names: Tuple[str, ...], values: Labels) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(n, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for n, v in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, help_: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = Counter(name, help_, labelnames)
+        return metric
+
+    def gauge(self, name: str, help_: str, labelnames: Sequence[str] = ()) -> Gauge:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = Gauge(name, help_, labelnames)
+        return metric
+
+    def histogram(
+        self, name: str, help_: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = Histogram(name, help_, labelnames, buckets)
+        return metric
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+_registry = MetricsRegistry()
+_enabled = False
+
+
+def get_registry() -> MetricsRegistry:
+    return _registry
+
+
+def metrics_enabled() -> bool:
+    return _enabled
+
+
+def enable_metrics(enabled: bool = True) -> None:
+    global _enabled
+    _enabled = enabled
+
+
+class Stage(Enum):
+    CHAT_RECEIVED = "chat_received"
+    # voice turns start when the user stops speaking
+    TRANSCRIBED = "transcribed"
+    QUEUED = "queued"
+    DEQUEUED = "dequeued"
+    LLM_START = "llm_start"
+    LLM_FIRST_TOKEN = "llm_first_token"
+    LLM_END = "llm_end"
+    TTS_REQUEST = "tts_request"
+    TTS_FIRST_BYTE = "tts_first_byte"
+    TTS_DECODE_END = "tts_decode_end"
+    FIRST_FRAME = "first_frame"
+    LAST_FRAME = "last_frame"
+
+
+# stages hit repeatedly in a turn (once per sentence or frame) where the last occurrence matters
+_LAST_OCCURRENCE = frozenset({Stage.LLM_END, Stage.TTS_DECODE_END, Stage.LAST_FRAME})
+
+
+class TurnTrace:
+    """
+    Monotonic timestamps of the stages of a single turn, from the chat message, or the end of the user's
+    speech, to the last played frame.
+
+    On `finish` the offset of every recorded stage from the start of the turn is observed in the
+    `warda_turn_stage_seconds` histogram, labelled by stage.
+    """
+
+    def __init__(self, registry: MetricsRegistry) -> None:
+        self._registry = registry
+        self._start = time.monotonic()
+        self._marks: Dict[Stage, float] = {}
+
+    def mark(self, stage: Stage) -> None:
+        if stage in _LAST_OCCURRENCE or stage not in self._marks:
+            self._marks[stage] = time.monotonic()
+
+    def elapsed(self, stage: Stage) -> Optional[float]:
+        t = self._marks.get(stage)
+        return None if t is None else t - self._start
+
+    def finish(self, outcome: str = "completed") -> None:
+        self._registry.counter("warda_turns", "Number of turns by outcome", ("outcome",)).inc(outcome)
+        if outcome != "completed":
+            # interrupted and failed turns would skew the stage latencies
+            return
+
+        histogram = self._registry.histogram(
+            "warda_turn_stage_seconds",
+            "Time from the chat message or the end of the speech to each stage of a turn",
+            ("stage",),
+        )
+        for stage, t in self._marks.items():
+            histogram.observe(t - self._start, stage.value)
+
+
+class _NoopTrace(TurnTrace):
+    def __init__(self) -> None:
+        pass
+
+    def mark(self, stage: Stage) -> None:
+        pass
+
+    def elapsed(self, stage: Stage) -> Optional[float]:
+        return None
+
+    def finish(self, outcome: str = "completed") -> None:
+        pass
+
+
+NOOP_TRACE: TurnTrace = _NoopTrace()
+
+_current_trace: ContextVar[TurnTrace] = ContextVar("current_trace", default=NOOP_TRACE)
+
+
+def start_turn() -> TurnTrace:
+    """Start tracing a turn, returns a no-op trace when metrics are disabled."""
+    return TurnTrace(_registry) if _enabled else NOOP_TRACE
+
+
+def current_trace() -> TurnTrace:
+    return _current_trace.get()
+
+
+def mark(stage: Stage) -> None:
+    """Record `stage` on the trace of the current context, tasks inherit the trace of their creator."""
+    _current_trace.get().mark(stage)
+
+
+@contextlib.contextmanager
+def use_trace(trace: TurnTrace) -> Iterator[TurnTrace]:
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+async def _handle_scrape(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # drain the headers, they are not needed
+        while (line := await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass
+
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/", "/metrics"):
+            status, body = "200 OK", _registry.render().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError) as e:
+        logging.debug("metrics scrape failed: %s", e)
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host: str, port: int) -> asyncio.AbstractServer:
+    """Serve the registry on `http://host:port/metrics` for Prometheus to scrape."""
+    server = await asyncio.start_server(_handle_scrape, host, port)
+    logging.info("serving metrics on http://%s:%d/metrics", host, port)
+    return server
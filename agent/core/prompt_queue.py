@@ -0,0 +1,138 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Deque, Optional, Tuple
+
+from .metrics import NOOP_TRACE, TurnTrace
+
+
+class OverflowPolicy(Enum):
+    # merge the new prompt into the newest queued one
+    COALESCE = "coalesce"
+    # discard the oldest queued prompt to make room
+    DROP_OLDEST = "drop_oldest"
+    # refuse the new prompt with PromptQueueFull
+    REJECT = "reject"
+
+
+class PromptQueueFull(Exception):
+    pass
+
+
+@dataclass
+class PromptQueueStats:
+    enqueued: int = 0
+    dequeued: int = 0
+    coalesced: int = 0
+    dropped: int = 0
+    rejected: int = 0
+    depth: int = 0
+    max_depth: int = 0
+    last_wait: float = 0.0
+    max_wait: float = 0.0
+    total_wait: float = 0.0
+
+    @property
+    def avg_wait(self) -> float:
+        return self.total_wait / self.dequeued if self.dequeued else 0.0
+
+
+class PromptQueue:
+    """Bounded, awaitable queue of user prompts for a single room.
+
+    Producers are synchronous event callbacks (e.g. `rtc.ChatManager` "message_received"), so
+    `put_nowait` never blocks; when the queue is full the configured `OverflowPolicy` decides
+    what happens to the new prompt. Consumers simply `await get()` and cost nothing while idle.
+
+    Turns that will not be answered on their own are finished here: a dropped prompt's trace as
+    "dropped", a coalesced prompt's trace as "coalesced".
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 8,
+        overflow: OverflowPolicy = OverflowPolicy.COALESCE,
+        separator: str = "\n",
+    ) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+
+        self._maxsize = maxsize
+        self._overflow = overflow
+        self._separator = separator
+        # (prompt, monotonic enqueue time, trace of the turn)
+        self._items: Deque[Tuple[str, float, TurnTrace]] = deque()
+        self._not_empty = asyncio.Event()
+        self.stats = PromptQueueStats()
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    @property
+    def overflow(self) -> OverflowPolicy:
+        return self._overflow
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def empty(self) -> bool:
+        return not self._items
+
+    def full(self) -> bool:
+        return len(self._items) >= self._maxsize
+
+    def put_nowait(self, prompt: str, trace: Optional[TurnTrace] = None) -> None:
+        now = time.monotonic()
+
+        if self.full():
+            if self._overflow == OverflowPolicy.REJECT:
+                self.stats.rejected += 1
+                raise PromptQueueFull(f"prompt queue is full ({self._maxsize})")
+            elif self._overflow == OverflowPolicy.DROP_OLDEST:
+                _, _, dropped_trace = self._items.popleft()
+                dropped_trace.finish("dropped")
+                self.stats.dropped += 1
+            else:
+                # keep the enqueue time and trace of the oldest part so wait time is not under-reported
+                last_prompt, enqueued_at, last_trace = self._items.pop()
+                self._items.append((last_prompt + self._separator + prompt, enqueued_at, last_trace))
+                # the new prompt is answered in the turn of the one it joined
+                (trace or NOOP_TRACE).finish("coalesced")
+                self.stats.enqueued += 1
+                self.stats.coalesced += 1
+                return
+
+        self._items.append((prompt, now, trace or NOOP_TRACE))
+        self.stats.enqueued += 1
+        self.stats.depth = len(self._items)
+        self.stats.max_depth = max(self.stats.max_depth, self.stats.depth)
+        self._not_empty.set()
+
+    async def get(self) -> str:
+        prompt, _ = await self.get_traced()
+        return prompt
+
+    async def get_traced(self) -> Tuple[str, TurnTrace]:
+        """Like `get`, also returns the trace the prompt was queued with."""
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        prompt, enqueued_at, trace = self._items.popleft()
+        wait = time.monotonic() - enqueued_at
+
+        self.stats.dequeued += 1
+        self.stats.depth = len(self._items)
+        self.stats.last_wait = wait
+        self.stats.max_wait = max(self.stats.max_wait, wait)
+        self.stats.total_wait += wait
+        return prompt, trace
+
+    def clear(self) -> None:
+        for _, _, trace in self._items:
+            trace.finish("dropped")
+        self._items.clear()
+        self.stats.depth = 0
@@ -0,0 +1,65 @@
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+
+
+@dataclass
+class RoomRegistryStats:
+    accepted: int = 0
+    rejected: int = 0
+    active: int = 0
+
+
+class RoomRegistry:
+    """
+    Rooms served by the worker, per agent.
+
+    Every agent hosted by the process may serve at most `max_rooms_per_agent` rooms at a time, so one busy
+    persona cannot take all the capacity of the process. A room is held from `try_acquire` until `release`.
+
+    :param max_rooms_per_agent: Maximum rooms per agent, 0 for no limit.
+    """
+
+    def __init__(self, max_rooms_per_agent: int = 0) -> None:
+        self._max_rooms_per_agent = max_rooms_per_agent
+        self._rooms: Dict[str, Set[str]] = dict()
+        self.stats = RoomRegistryStats()
+
+    def try_acquire(self, agent_id: str, room: str) -> bool:
+        """
+        Hold `room` for `agent_id`, return False if the agent has no room left in its quota or already
+        holds the room, e.g. for a duplicate dispatch, so only the caller that acquired it releases it.
+        """
+        rooms = self._rooms.setdefault(agent_id, set())
+        if room in rooms or (self._max_rooms_per_agent and len(rooms) >= self._max_rooms_per_agent):
+            self.stats.rejected += 1
+            if not rooms:
+                del self._rooms[agent_id]
+            return False
+
+        rooms.add(room)
+        self.stats.accepted += 1
+        self.stats.active += 1
+        return True
+
+    def release(self, agent_id: str, room: str) -> None:
+        """Free `room`, releasing a room that is not held does nothing."""
+        rooms = self._rooms.get(agent_id)
+        if not rooms or room not in rooms:
+            return
+
+        rooms.remove(room)
+        self.stats.active -= 1
+        if not rooms:
+            del self._rooms[agent_id]
+
+    def holds(self, agent_id: str, room: str) -> bool:
+        return room in self._rooms.get(agent_id, ())
+
+    def active(self, agent_id: Optional[str] = None) -> int:
+        """Rooms currently held by `agent_id`, or by every agent if it is None."""
+        if agent_id is None:
+            return self.stats.active
+        return len(self._rooms.get(agent_id, ()))
+
+    def agents(self) -> Set[str]:
+        return set(self._rooms)
@@ -0,0 +1,86 @@
+import asyncio
+import re
+from typing import List, Optional, Tuple
+
+from livekit.agents import tokenize
+
+# end of sentence punctuation optionally followed by closing quotes/brackets and whitespace, CJK
+# punctuation does not need trailing whitespace, line breaks also end a sentence
+_SENTENCE_END = re.compile(r"[.!?…]+[\"'”’)\]]*\s+|[。！？；]+[\"'”’)\]」』]*|\n+")
+
+
+def _split(text: str, min_length: int) -> Tuple[List[str], str]:
+    """Split `text` into complete sentences and the trailing incomplete remainder."""
+    sentences = []
+    start = 0
+    for m in _SENTENCE_END.finditer(text):
+        if m.end() - start < min_length:
+            continue
+
+        sentence = text[start:m.end()].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = m.end()
+
+    return sentences, text[start:]
+
+
+class SentenceTokenizer(tokenize.SentenceTokenizer):
+    """
+    Punctuation based sentence tokenizer, suitable for splitting streamed LLM output.
+
+    :param min_length: Sentences shorter than this are merged with the following one, which avoids
+        issuing a TTS request for every "Hi!" or "OK.".
+    """
+
+    def __init__(self, min_length: int = 20) -> None:
+        self._min_length = min_length
+
+    def tokenize(self, *, text: str, language: Optional[str] = None) -> List[tokenize.SegmentedSentence]:
+        sentences, rest = _split(text, self._min_length)
+        if rest.strip():
+            sentences.append(rest.strip())
+        return [tokenize.SegmentedSentence(text=s) for s in sentences]
+
+    def stream(self, *, language: Optional[str] = None) -> "SentenceStream":
+        return SentenceStream(self._min_length)
+
+
+class SentenceStream(tokenize.SentenceStream):
+    def __init__(self, min_length: int) -> None:
+        self._min_length = min_length
+        self._buffer = ""
+        self._closed = False
+        self._queue: asyncio.Queue[Optional[tokenize.SegmentedSentence]] = asyncio.Queue()
+
+    def push_text(self, text: str) -> None:
+        if self._closed:
+            raise RuntimeError("cannot push text to a closed SentenceStream")
+
+        self._buffer += text
+        sentences, self._buffer = _split(self._buffer, self._min_length)
+        for sentence in sentences:
+            self._queue.put_nowait(tokenize.SegmentedSentence(text=sentence))
+
+    async def flush(self) -> None:
+        """Emit the buffered text as a sentence even if it is not terminated yet."""
+        rest, self._buffer = self._buffer.strip(), ""
+        if rest:
+            self._queue.put_nowait(tokenize.SegmentedSentence(text=rest))
+
+    async def aclose(self) -> None:
+        """Flush the remaining text and end the iteration once all sentences have been consumed."""
+        if self._closed:
+            return
+
+        await self.flush()
+        self._closed = True
+        self._queue.put_nowait(None)
+
+    async def __anext__(self) -> tokenize.SegmentedSentence:
+        sentence = await self._queue.get()
+        if sentence is None:
+            # keep the sentinel for any other waiter
+            self._queue.put_nowait(None)
+            raise StopAsyncIteration
+        return sentence
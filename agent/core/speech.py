@@ -0,0 +1,95 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Coroutine, Optional
+
+
+@dataclass
+class SpeechStats:
+    started: int = 0
+    completed: int = 0
+    interrupted: int = 0
+    # speeches that raised, e.g. a failed or timed out LLM call
+    failed: int = 0
+    last_cancel_latency: float = 0.0
+    max_cancel_latency: float = 0.0
+    total_cancel_latency: float = 0.0
+
+    @property
+    def avg_cancel_latency(self) -> float:
+        return self.total_cancel_latency / self.interrupted if self.interrupted else 0.0
+
+
+class SpeechController:
+    """
+    Owns the speech (LLM reply, synthesis and playback) currently in flight in a room.
+
+    Only one speech runs at a time. `interrupt` cancels it, which aborts the pending LLM and TTS
+    requests and the frames not played yet; the time until the speech has actually stopped is
+    recorded as the cancellation latency.
+    """
+
+    def __init__(self) -> None:
+        self._task: Optional[asyncio.Task] = None
+        self._interrupted: Optional[asyncio.Task] = None
+        self.stats = SpeechStats()
+
+    @property
+    def speaking(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def run(self, coro: Coroutine) -> bool:
+        """
+        Run `coro` as the current speech and wait for it, any previous speech is interrupted first.
+
+        :return: False if the speech was interrupted.
+        """
+        previous = self._task
+        if previous is not None:
+            self.interrupt()
+            # make sure the previous speech released the audio output before starting to talk again
+            await asyncio.wait([previous])
+
+        task = asyncio.ensure_future(coro)
+        self._task = task
+        self.stats.started += 1
+        try:
+            # wait() does not propagate the cancellation of `task` to the caller
+            await asyncio.wait([task])
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            if self._task is task:
+                self._task = None
+
+        if task.cancelled():
+            return False
+
+        if task.exception() is not None:
+            self.stats.failed += 1
+            # surface errors of the speech to the caller
+            task.result()
+        self.stats.completed += 1
+        return True
+
+    def interrupt(self) -> bool:
+        """Cancel the current speech, returns False if nothing was speaking."""
+        task = self._task
+        if task is None or task.done() or task is self._interrupted:
+            return False
+
+        self._interrupted = task
+
+        requested_at = time.monotonic()
+
+        def on_done(_: asyncio.Task) -> None:
+            latency = time.monotonic() - requested_at
+            self.stats.interrupted += 1
+            self.stats.last_cancel_latency = latency
+            self.stats.max_cancel_latency = max(self.stats.max_cancel_latency, latency)
+            self.stats.total_cancel_latency += latency
+
+        task.add_done_callback(on_done)
+        task.cancel()
+        return True
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class StatePublisherStats:
+    requested: int = 0
+    published: int = 0
+    # transitions to the state already desired or published
+    skipped: int = 0
+    # desired states replaced by a newer one before they were published
+    coalesced: int = 0
+    failed: int = 0
+
+
+class StatePublisher(Generic[T]):
+    """
+    Publishes the state of a room, keeping only the latest desired one.
+
+    `set` records the desired state and returns immediately. A single task publishes it `window` seconds
+    later, so a burst of transitions becomes one update of the last state, and updates are sent one
+    after the other, in order, at most once every `min_interval` seconds. A state equal to the last
+    published one is not sent again.
+
+    :param publish: Coroutine function sending a state, e.g. updating the participant metadata.
+    :param create_task: Used to start the publishing task, e.g. `JobContext.create_task`.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[T], Awaitable[None]],
+        window: float = 0.05,
+        min_interval: float = 0.1,
+        create_task: Callable[[Awaitable], asyncio.Task] = asyncio.ensure_future,
+    ) -> None:
+        self._publish = publish
+        self._window = window
+        self._min_interval = min_interval
+        self._create_task = create_task
+        self._desired: Optional[T] = None
+        self._published: Optional[T] = None
+        self._published_at = float("-inf")
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self.stats = StatePublisherStats()
+
+    @property
+    def state(self) -> Optional[T]:
+        """The latest desired state, published or not."""
+        return self._desired
+
+    @property
+    def published(self) -> Optional[T]:
+        return self._published
+
+    def set(self, state: T) -> None:
+        self.stats.requested += 1
+        if self._closed:
+            return
+
+        if state == self._desired and (self._task is not None or state == self._published):
+            self.stats.skipped += 1
+            return
+
+        if self._task is not None and self._desired != self._published:
+            self.stats.coalesced += 1
+        self._desired = state
+        if self._task is None:
+            self._task = self._create_task(self._run())
+
+    def close(self) -> None:
+        """Stop publishing, states set afterwards are ignored."""
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        try:
+            while not self._closed and self._desired != self._published:
+                await asyncio.sleep(max(self._window, self._published_at + self._min_interval - time.monotonic()))
+
+                state = self._desired
+                if state == self._published:
+                    # flapped back to the published state within the window
+                    self.stats.skipped += 1
+                    break
+
+                try:
+                    await self._publish(state)
+                except Exception as e:
+                    # the next `set` retries
+                    self.stats.failed += 1
+                    logging.warning("failed to publish state %s: %s", state, e, exc_info=e)
+                    break
+
+                self._published = state
+                self._published_at = time.monotonic()
+                self.stats.published += 1
+        finally:
+            if self._task is asyncio.current_task():
+                self._task = None
@@ -0,0 +1,176 @@
+import asyncio
+import contextlib
+import contextvars
+import io
+import logging
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+_current_room: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_room", default=None)
+
+# closed rooms remembered to flag tasks created in them afterwards
+_MAX_CLOSED_ROOMS = 1024
+
+
+@contextlib.contextmanager
+def room_scope(room: Optional[str]) -> Iterator[None]:
+    """Attribute the tasks created in this block, and the tasks they create, to `room`."""
+    token = _current_room.set(room)
+    try:
+        yield
+    finally:
+        _current_room.reset(token)
+
+
+def current_room() -> Optional[str]:
+    return _current_room.get()
+
+
+@dataclass
+class TaskTrackerStats:
+    created: int = 0
+    running: int = 0
+    cancelled_on_close: int = 0
+    # tasks that outlived their room
+    leaked: int = 0
+
+
+class TaskTracker:
+    """
+    Accounts for the tasks of an event loop by room and origin.
+
+    Installed as the task factory of the loop, it attributes every task to the room of the context it
+    is created in, see `room_scope`, and to its origin, the qualified name of its coroutine. Tasks
+    created outside of a room belong to the room None.
+
+    `close_room` cancels the tasks of a room and waits for them. Tasks still running `close_timeout`
+    seconds later, and tasks created in a room after it was closed, outlived their room: they are logged
+    with their stack and counted as leaked.
+    """
+
+    def __init__(self, close_timeout: float = 5.0) -> None:
+        self.close_timeout = close_timeout
+        # room -> running task -> origin
+        self._rooms: Dict[Optional[str], Dict[asyncio.Task, str]] = {}
+        self._closed: "OrderedDict[str, None]" = OrderedDict()
+        self._leaked: "weakref.WeakSet[asyncio.Task]" = weakref.WeakSet()
+        self._previous_factory = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = TaskTrackerStats()
+
+    def install(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        loop = loop or asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._previous_factory = loop.get_task_factory()
+        loop.set_task_factory(self._create_task)
+        self._loop = loop
+
+    def uninstall(self) -> None:
+        if self._loop is not None:
+            self._loop.set_task_factory(self._previous_factory)
+            self._loop = None
+            self._previous_factory = None
+
+    def open_room(self, room: str) -> None:
+        """Start accounting for `room`, which may reuse the name of a closed room."""
+        self._closed.pop(room, None)
+
+    def close_room(self, room: str) -> asyncio.Task:
+        """
+        Cancel the tasks of `room`, the calling task excepted.
+
+        :return: A task waiting for them, done once they finished or were flagged as leaked.
+        """
+        self._closed[room] = None
+        self._closed.move_to_end(room)
+        while len(self._closed) > _MAX_CLOSED_ROOMS:
+            self._closed.popitem(last=False)
+
+        current = asyncio.current_task()
+        tasks = [task for task in self._rooms.get(room, ()) if task is not current and not task.done()]
+        for task in tasks:
+            task.cancel()
+        self.stats.cancelled_on_close += len(tasks)
+
+        def start() -> asyncio.Task:
+            # the waiting task must not belong to the room it waits for
+            _current_room.set(None)
+            return asyncio.ensure_future(self._wait_closed(room, tasks))
+
+        return contextvars.copy_context().run(start)
+
+    def counts(self) -> Dict[Optional[str], Dict[str, int]]:
+        """Running tasks per room and origin."""
+        counts = {}
+        for room, tasks in self._rooms.items():
+            by_origin = counts[room] = {}
+            for origin in tasks.values():
+                by_origin[origin] = by_origin.get(origin, 0) + 1
+        return counts
+
+    def leaked(self) -> List[asyncio.Task]:
+        return [task for task in self._leaked if not task.done()]
+
+    def _create_task(self, loop: asyncio.AbstractEventLoop, coro, **kwargs) -> asyncio.Task:
+        if self._previous_factory is not None:
+            task = self._previous_factory(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+
+        context = kwargs.get("context")
+        room = context.get(_current_room) if context is not None else _current_room.get()
+        origin = getattr(coro, "__qualname__", None) or type(coro).__name__
+        self._track(task, room, origin)
+        return task
+
+    def _track(self, task: asyncio.Task, room: Optional[str], origin: str) -> None:
+        tasks = self._rooms.get(room)
+        if tasks is None:
+            tasks = self._rooms[room] = {}
+        tasks[task] = origin
+        self.stats.created += 1
+        self.stats.running += 1
+
+        def on_done(t: asyncio.Task) -> None:
+            self.stats.running -= 1
+            room_tasks = self._rooms.get(room)
+            if room_tasks is not None:
+                room_tasks.pop(t, None)
+                if not room_tasks:
+                    del self._rooms[room]
+
+        task.add_done_callback(on_done)
+
+        if room is not None and room in self._closed:
+            self._flag(task, room, "was created after its room closed")
+
+    async def _wait_closed(self, room: str, tasks: List[asyncio.Task]) -> None:
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=self.close_timeout)
+        for task in pending:
+            self._flag(task, room, f"is still running {self.close_timeout:.1f}s after its room closed")
+
+    def _flag(self, task: asyncio.Task, room: str, reason: str) -> None:
+        if task in self._leaked:
+            return
+        self._leaked.add(task)
+        self.stats.leaked += 1
+
+        stack = io.StringIO()
+        task.print_stack(limit=8, file=stack)
+        logging.warning("task %s of room %s %s\n%s", task.get_name(), room, reason, stack.getvalue())
+
+
+_tracker: Optional[TaskTracker] = None
+
+
+def get_task_tracker() -> TaskTracker:
+    """Return the process-wide task tracker, `install` it on the loop to account for tasks."""
+    global _tracker
+    if _tracker is None:
+        _tracker = TaskTracker()
+    return _tracker
@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass
+class TTLCacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    loads: int = 0
+    invalidations: int = 0
+
+
+class AsyncTTLCache(Generic[K, V]):
+    """
+    Time-to-live cache for values loaded by coroutines, with single-flight loading.
+
+    Concurrent `get_or_load` calls for the same missing key share one call of the loader, so a burst
+    of callers costs a single backend query. `invalidate` drops the cached value and makes loads that
+    are still in flight for that key discard their (possibly stale) result.
+
+    Cached values are shared by every event loop of the process, loads in flight are not: futures
+    belong to the loop that created them, so each loop has loads of its own.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024) -> None:
+        self._ttl = ttl
+        self._maxsize = maxsize
+        # key -> (expires_at, value)
+        self._entries: Dict[K, Tuple[float, V]] = {}
+        # event loop -> key -> load in flight on that loop
+        self._inflight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[K, asyncio.Future]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._versions: Dict[K, int] = {}
+        # loops may run in different threads
+        self._lock = threading.Lock()
+        self.stats = TTLCacheStats()
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key: K, value: V) -> None:
+        with self._lock:
+            self._set(key, value)
+
+    def _set(self, key: K, value: V) -> None:
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic() + self._ttl, value)
+        while len(self._entries) > self._maxsize:
+            # dicts keep insertion order, drop the oldest entry
+            del self._entries[next(iter(self._entries))]
+
+    def invalidate(self, key: K) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            for inflight in list(self._inflight.values()):
+                inflight.pop(key, None)
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self.stats.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            keys = set(self._entries)
+            for inflight in list(self._inflight.values()):
+                keys.update(inflight)
+        for key in keys:
+            self.invalidate(key)
+
+    async def get_or_load(self, key: K, loader: Callable[[], Awaitable[V]]) -> V:
+        value = self.get(key)
+        if value is not None:
+            self.stats.hits += 1
+            return value
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            inflight = self._inflight.setdefault(loop, {})
+            fut = inflight.get(key)
+        if fut is not None:
+            self.stats.coalesced += 1
+            try:
+                # a cancelled waiter must not cancel the shared load
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if not fut.cancelled():
+                    raise
+                # the caller running the load was cancelled, not this one, so load again
+                return await self.get_or_load(key, loader)
+
+        fut = loop.create_future()
+        # waiters may all be gone, avoid "exception was never retrieved" warnings
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        with self._lock:
+            self.stats.misses += 1
+            self.stats.loads += 1
+            version = self._versions.get(key, 0)
+            inflight[key] = fut
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                if inflight.get(key) is fut:
+                    del inflight[key]
+
+        with self._lock:
+            if self._versions.get(key, 0) == version:
+                self._set(key, value)
+        fut.set_result(value)
+        return value
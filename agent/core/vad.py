@@ -0,0 +1,242 @@
+import asyncio
+import collections
+import math
+from dataclasses import dataclass
+from typing import Deque, List, Optional, Tuple
+
+import numpy as np
+from livekit import rtc
+from livekit.agents import vad
+
+from .audio_output import Resampler
+
+# 16-bit full scale, levels are in dB relative to it
+_FULL_SCALE = 32768.0 ** 2
+
+
+@dataclass
+class VADStats:
+    frames: int = 0
+    speech_frames: int = 0
+    segments: int = 0
+
+    @property
+    def speech_ratio(self) -> float:
+        """Share of the audio inside speech segments, the share a gated STT is sent."""
+        return self.speech_frames / self.frames if self.frames else 0.0
+
+
+class FrameDetector:
+    """
+    Segments 16-bit mono PCM into speech and silence, on the energy of fixed frames.
+
+    A frame is voiced when its level is `threshold_db` above the noise floor, and above `min_level_db`.
+    The floor follows the level of the frames, quickly down and slowly up, so steady background noise
+    does not count as speech. Speech starts after `min_speech` seconds of voiced frames, and ends
+    after `min_silence` seconds without any, or after `max_speech` seconds.
+
+    `process` returns `(type, samples)` events: START_SPEAKING with the `padding` seconds before the
+    speech and its first frames, SPEAKING with the following frames, and END_SPEAKING without samples.
+    Trailing silence is part of the segment, it is the padding after the speech.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 20,
+        threshold_db: float = 12.0,
+        min_level_db: float = -50.0,
+        min_speech: float = 0.1,
+        min_silence: float = 0.5,
+        padding: float = 0.2,
+        max_speech: float = 30.0,
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.frame_size = sample_rate * frame_ms // 1000
+        self._threshold_db = threshold_db
+        self._min_level_db = min_level_db
+        frame_seconds = frame_ms / 1000
+        self._min_speech = max(math.ceil(min_speech / frame_seconds), 1)
+        self._min_silence = max(math.ceil(min_silence / frame_seconds), 1)
+        self._max_speech = math.ceil(max_speech / frame_seconds)
+        # frames kept before the speech starts: the padding and the voiced frames confirming it
+        self._pending: Deque[np.ndarray] = collections.deque(
+            maxlen=math.ceil(padding / frame_seconds) + self._min_speech
+        )
+        self._partial = np.empty(0, dtype=np.int16)
+        self._noise_db: Optional[float] = None
+        self._speaking = False
+        self._voiced = 0
+        self._silent = 0
+        self._segment_frames = 0
+        self.stats = VADStats()
+
+    @property
+    def speaking(self) -> bool:
+        return self._speaking
+
+    def process(self, samples: np.ndarray) -> List[Tuple[vad.VADEventType, np.ndarray]]:
+        if len(self._partial):
+            samples = np.concatenate((self._partial, samples))
+        count = len(samples) // self.frame_size
+        self._partial = samples[count * self.frame_size:].copy()
+        if not count:
+            return []
+
+        frames = samples[:count * self.frame_size].reshape(count, self.frame_size)
+        # one vectorized pass for the levels, the state machine below only compares numbers
+        energy = np.square(frames, dtype=np.float32).mean(axis=1)
+        levels = 10 * np.log10(energy / _FULL_SCALE + 1e-10)
+
+        events: List[Tuple[vad.VADEventType, np.ndarray]] = []
+        speech_start = None
+        for i, level in enumerate(levels.tolist()):
+            self.stats.frames += 1
+            voiced = self._is_voiced(level)
+
+            if not self._speaking:
+                self._pending.append(frames[i])
+                self._voiced = self._voiced + 1 if voiced else 0
+                if self._voiced >= self._min_speech:
+                    self._speaking = True
+                    self._silent = 0
+                    self._segment_frames = len(self._pending)
+                    self.stats.segments += 1
+                    self.stats.speech_frames += len(self._pending)
+                    events.append((vad.VADEventType.START_SPEAKING, np.concatenate(self._pending)))
+                    self._pending.clear()
+                    speech_start = i + 1
+                continue
+
+            if speech_start is None:
+                speech_start = i
+            self.stats.speech_frames += 1
+            self._segment_frames += 1
+            self._silent = 0 if voiced else self._silent + 1
+            if self._silent >= self._min_silence or self._segment_frames >= self._max_speech:
+                events.append((vad.VADEventType.SPEAKING, frames[speech_start:i + 1].reshape(-1)))
+                events.append((vad.VADEventType.END_SPEAKING, np.empty(0, dtype=np.int16)))
+                self._speaking = False
+                self._voiced = 0
+                speech_start = None
+
+        if self._speaking and speech_start is not None and speech_start < count:
+            events.append((vad.VADEventType.SPEAKING, frames[speech_start:].reshape(-1)))
+        return events
+
+    def _is_voiced(self, level: float) -> bool:
+        if self._noise_db is None:
+            self._noise_db = level
+        voiced = level > max(self._noise_db + self._threshold_db, self._min_level_db)
+        # follow a quieter room at once and a louder one slowly, and creep up even on voiced frames, so a
+        # noise louder than the threshold ends as speech after a few seconds; the pauses between words
+        # bring the floor back down
+        if level < self._noise_db:
+            weight = 0.5
+        else:
+            weight = 0.005 if voiced else 0.02
+        self._noise_db += weight * (level - self._noise_db)
+        return voiced
+
+
+class EnergyVAD(vad.VAD):
+    """
+    Voice activity detection on the energy of `frame_ms` frames, computed with NumPy, cheap enough to
+    run on the event loop for every track. See `FrameDetector`.
+    """
+
+    def __init__(self, frame_ms: int = 20, threshold_db: float = 12.0, min_level_db: float = -50.0) -> None:
+        super().__init__()
+        self._frame_ms = frame_ms
+        self._threshold_db = threshold_db
+        self._min_level_db = min_level_db
+
+    def stream(
+        self,
+        *,
+        min_speaking_duration: float = 0.1,
+        min_silence_duration: float = 0.5,
+        padding_duration: float = 0.2,
+        sample_rate: int = 16000,
+        max_buffered_speech: float = 30.0,
+    ) -> "EnergyVADStream":
+        return EnergyVADStream(
+            FrameDetector(
+                sample_rate=sample_rate,
+                frame_ms=self._frame_ms,
+                threshold_db=self._threshold_db,
+                min_level_db=self._min_level_db,
+                min_speech=min_speaking_duration,
+                min_silence=min_silence_duration,
+                padding=padding_duration,
+                max_speech=max_buffered_speech,
+            )
+        )
+
+
+class EnergyVADStream(vad.VADStream):
+    """
+    Frames of any format are resampled to mono at the sample rate of the detector. Speech is streamed as
+    it is detected, START_SPEAKING and SPEAKING events carry the new frames of the segment, so streaming
+    STTs get them at once. END_SPEAKING carries every frame of the segment and its duration, for STTs
+    that recognize whole segments, e.g. through `livekit.agents.stt.StreamAdapter`.
+    """
+
+    def __init__(self, detector: FrameDetector) -> None:
+        super().__init__()
+        self._detector = detector
+        self._resampler: Optional[Resampler] = None
+        self._samples_index = 0
+        self._segment: List[rtc.AudioFrame] = []
+        self._closed = False
+        self._queue: asyncio.Queue[Optional[vad.VADEvent]] = asyncio.Queue()
+
+    @property
+    def stats(self) -> VADStats:
+        return self._detector.stats
+
+    def push_frame(self, frame: rtc.AudioFrame) -> None:
+        if self._closed:
+            raise RuntimeError("cannot push frames to a closed EnergyVADStream")
+
+        resampler = self._resampler
+        if resampler is None or (resampler.in_rate, resampler.in_channels) != (frame.sample_rate, frame.num_channels):
+            resampler = self._resampler = Resampler(frame.sample_rate, frame.num_channels, self._detector.sample_rate)
+        samples = resampler.push(frame.data)
+        self._samples_index += len(samples)
+
+        sample_rate = self._detector.sample_rate
+        for event_type, speech in self._detector.process(samples):
+            event = vad.VADEvent(type=event_type, samples_index=self._samples_index)
+            if event_type == vad.VADEventType.END_SPEAKING:
+                event.speech, self._segment = self._segment, []
+                event.duration = sum(frame.samples_per_channel for frame in event.speech) / sample_rate
+            else:
+                event.speech = [
+                    rtc.AudioFrame(
+                        data=speech.tobytes(),
+                        sample_rate=sample_rate,
+                        num_channels=1,
+                        samples_per_channel=len(speech),
+                    )
+                ]
+                self._segment.extend(event.speech)
+            self._queue.put_nowait(event)
+
+    async def flush(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        """End the iteration once the events already detected have been consumed."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put_nowait(None)
+
+    async def __anext__(self) -> vad.VADEvent:
+        event = await self._queue.get()
+        if event is None:
+            # keep the sentinel for any other waiter
+            self._queue.put_nowait(None)
+            raise StopAsyncIteration
+        return event
@@ -0,0 +1,221 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import AsyncIterable, Callable, List, Optional, Set
+
+from livekit import rtc
+from livekit.agents import stt, vad
+
+from .metrics import Stage, TurnTrace, get_registry, metrics_enabled, start_turn
+
+# called with the final transcript of a segment and the trace of its turn
+TranscriptCallback = Callable[[str, TurnTrace], None]
+
+
+@dataclass
+class VoiceInputStats:
+    frames: int = 0
+    # seconds of audio received, and sent to the STT
+    audio_seconds: float = 0.0
+    speech_seconds: float = 0.0
+    segments: int = 0
+    transcripts: int = 0
+    # segments transcribed to nothing, e.g. a cough or a door
+    empty: int = 0
+    failed: int = 0
+
+
+class SegmentStream(stt.SpeechStream):
+    """
+    Speech stream of an STT recognizing whole buffers: the frames of a segment are kept until `flush`,
+    which recognizes them and emits the final transcript.
+    """
+
+    def __init__(self, recognizer: stt.STT, language: Optional[str] = None) -> None:
+        super().__init__()
+        self._stt = recognizer
+        self._language = language
+        self._frames: List[rtc.AudioFrame] = []
+        self._queue: asyncio.Queue[Optional[stt.SpeechEvent]] = asyncio.Queue()
+
+    def push_frame(self, frame: rtc.AudioFrame) -> None:
+        self._frames.append(frame)
+
+    async def flush(self) -> None:
+        if not self._frames:
+            return
+        frames, self._frames = self._frames, []
+        event = await self._stt.recognize(buffer=frames, language=self._language)
+        event.end_of_speech = True
+        self._queue.put_nowait(event)
+
+    async def aclose(self) -> None:
+        self._frames.clear()
+        self._queue.put_nowait(None)
+
+    async def __anext__(self) -> stt.SpeechEvent:
+        event = await self._queue.get()
+        if event is None:
+            self._queue.put_nowait(None)
+            raise StopAsyncIteration
+        return event
+
+
+@dataclass
+class _Segment:
+    stream: stt.SpeechStream
+    reader: Optional[asyncio.Task] = None
+    texts: List[str] = field(default_factory=list)
+
+
+class VoiceInput:
+    """
+    Transcribes the audio of a participant, only sending the speech found by `vad` to `stt`.
+
+    A speech stream is opened at the start of every segment and gets its frames as they are detected,
+    so a streaming STT transcribes while the user speaks. STTs that only recognize whole buffers get the
+    segment once it ends, see `SegmentStream`. When the segment ends its stream is flushed, and the final
+    transcript is passed to `on_transcript` with the trace of its turn, which starts at the end of the
+    speech. Transcripts are passed in the order of the segments, even when a later one is quicker.
+
+    :param final_timeout: Seconds to wait for the final transcript after the end of a segment.
+    """
+
+    def __init__(
+        self,
+        recognizer: stt.STT,
+        detector: vad.VAD,
+        on_transcript: TranscriptCallback,
+        *,
+        language: Optional[str] = None,
+        min_speech: float = 0.1,
+        min_silence: float = 0.5,
+        padding: float = 0.2,
+        max_speech: float = 30.0,
+        final_timeout: float = 10.0,
+    ) -> None:
+        self._stt = recognizer
+        self._vad = detector
+        self._on_transcript = on_transcript
+        self._language = language
+        self._vad_options = dict(
+            min_speaking_duration=min_speech,
+            min_silence_duration=min_silence,
+            padding_duration=padding,
+            max_buffered_speech=max_speech,
+        )
+        self._final_timeout = final_timeout
+        # segments ended and still being transcribed
+        self._finishing: Set[asyncio.Task] = set()
+        self.stats = VoiceInputStats()
+
+    async def run(self, frames: AsyncIterable[rtc.AudioFrame]) -> None:
+        """Transcribe `frames` until they end, then the segment in progress, or until cancelled."""
+        vad_stream = self._vad.stream(**self._vad_options)
+        segments = asyncio.ensure_future(self._segments(vad_stream))
+        try:
+            async for frame in frames:
+                self.stats.frames += 1
+                self.stats.audio_seconds += frame.samples_per_channel / frame.sample_rate
+                vad_stream.push_frame(frame)
+            await vad_stream.aclose()
+            await segments
+        finally:
+            segments.cancel()
+            for task in list(self._finishing):
+                task.cancel()
+            await vad_stream.aclose()
+
+    async def _segments(self, vad_stream: vad.VADStream) -> None:
+        segment: Optional[_Segment] = None
+        previous: Optional[asyncio.Task] = None
+        try:
+            async for event in vad_stream:
+                if event.type == vad.VADEventType.START_SPEAKING:
+                    segment = self._open()
+                if segment is None:
+                    continue
+
+                if event.type == vad.VADEventType.END_SPEAKING:
+                    previous = self._finish(segment, previous)
+                    segment = None
+                    continue
+
+                for frame in event.speech:
+                    self.stats.speech_seconds += frame.samples_per_channel / frame.sample_rate
+                    segment.stream.push_frame(frame)
+
+            if segment is not None:
+                # the track ended while the user was speaking
+                previous = self._finish(segment, previous)
+                segment = None
+            if previous is not None:
+                await asyncio.wait([previous])
+        finally:
+            if segment is not None:
+                await self._close(segment)
+
+    def _open(self) -> _Segment:
+        self.stats.segments += 1
+        if self._stt.streaming_supported:
+            stream = self._stt.stream(language=self._language)
+        else:
+            stream = SegmentStream(self._stt, self._language)
+        segment = _Segment(stream)
+        segment.reader = asyncio.ensure_future(self._read(segment))
+        return segment
+
+    async def _read(self, segment: _Segment) -> None:
+        async for event in segment.stream:
+            if event.is_final and event.alternatives:
+                segment.texts.append(event.alternatives[0].text)
+            if event.end_of_speech:
+                return
+
+    def _finish(self, segment: _Segment, previous: Optional[asyncio.Task]) -> asyncio.Task:
+        task = asyncio.ensure_future(self._transcribe(segment, previous, start_turn()))
+        self._finishing.add(task)
+        task.add_done_callback(self._finishing.discard)
+        return task
+
+    async def _transcribe(self, segment: _Segment, previous: Optional[asyncio.Task], trace: TurnTrace) -> None:
+        outcome = "transcribed"
+        try:
+            await asyncio.wait_for(self._complete(segment), self._final_timeout)
+        except asyncio.TimeoutError:
+            logging.warning("no final transcript %.1fs after the speech ended", self._final_timeout)
+        except Exception as e:
+            outcome = "failed"
+            logging.error("failed to transcribe speech: %s", e, exc_info=e)
+        finally:
+            await self._close(segment)
+
+        text = " ".join(t.strip() for t in segment.texts if t.strip())
+        if outcome == "failed":
+            self.stats.failed += 1
+        elif not text:
+            outcome = "empty"
+            self.stats.empty += 1
+        else:
+            self.stats.transcripts += 1
+        if metrics_enabled():
+            get_registry().counter("warda_voice_segments", "Speech segments by outcome", ("outcome",)).inc(outcome)
+
+        # the previous segment goes first, whatever happened to it
+        if previous is not None:
+            await asyncio.wait([previous])
+        if outcome == "transcribed":
+            trace.mark(Stage.TRANSCRIBED)
+            self._on_transcript(text, trace)
+
+    async def _complete(self, segment: _Segment) -> None:
+        await segment.stream.flush()
+        await segment.reader
+
+    async def _close(self, segment: _Segment) -> None:
+        if segment.reader is not None and not segment.reader.done():
+            segment.reader.cancel()
+        try:
+            await segment.stream.aclose()
+        except Exception as e:
+            logging.debug("failed to close the speech stream: %s", e)
@@ -1,106 +1,647 @@
 import asyncio
+import contextlib
 import json
 import logging
 import os
+import signal
+import time
 from enum import Enum
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
-from livekit import rtc, agents
+from livekit import rtc, agents, protocol
+from livekit.agents import tts
 
 from config import settings
+from core import (
+    AudioOutput,
+    EnergyVAD,
+    LoadController,
+    LoopMonitor,
+    PromptQueue,
+    PromptQueueFull,
+    OverflowPolicy,
+    RoomRegistry,
+    SpeechController,
+    Stage,
+    StatePublisher,
+    TurnTrace,
+    VoiceInput,
+    get_task_tracker,
+    room_scope,
+    start_turn,
+    use_trace,
+)
+from core.load import rss_mb
+from core.metrics import enable_metrics, start_metrics_server
 from plugins.camel import SimpleAgent
-from plugins.openai import TTS
+from plugins.camel.executor import pending_calls, run_blocking
+from plugins.openai import (
+    Priority,
+    SynthesizeStream,
+    get_scheduler,
+    get_stt,
+    get_tts,
+    get_tts_cache,
+    request_priority,
+)
+from plugins.postgrest import open_postgrest_client, close_postgrest_client
 from services import AgentService
-from services.agent_config.database import get_agent_config
+from services.agent_config.database import get_agent_config, update_agent_memory
 from services.agent_config.model import AgentConfigPayload
 from services.service import ServiceManager
 
-PROMPT = "You are a helpful assistant.Your name is Warda."
+PROMPT = "You are a helpful assistant.Your name is {name}."
+
+HELLO = "Hi! I am {name}~ I am here to assist you."
+
+# format of the published agent-mic track
+TRACK_SAMPLE_RATE = 24000
+TRACK_NUM_CHANNELS = 1
+
+
+def configure_chat_agent(chat_agent: SimpleAgent, agent_config: AgentConfigPayload):
+    chat_agent.configure(
+        system_message=agent_config.system_message,
+        model=agent_config.model,
+        platform=agent_config.platform,
+        temperature=agent_config.temperature,
+        max_tokens=agent_config.max_tokens,
+        top_p=agent_config.top_p,
+        memory_limit=agent_config.memory_limit,
+        system_message_limit=agent_config.system_message_limit,
+        summary=agent_config.memory,
+    )
+
+
+async def prewarm():
+    """
+    Load what rooms need before the worker accepts jobs: the config of the `AGENT_NAME` agent, the LLM
+    backend and its tokenizer, and its synthesized greeting. Failures are logged, they only cost the
+    first room its warm start.
+    """
+
+    async def warm_agent(agent_config: AgentConfigPayload):
+        # builds the shared model backend for the configured settings and loads the tokenizer
+        chat_agent = SimpleAgent(system_message=PROMPT.format(name=agent_config.agent_name))
+        await run_blocking(lambda: configure_chat_agent(chat_agent, agent_config))
+
+    async def warm_greeting(agent_config: AgentConfigPayload):
+        if get_tts_cache() is None:
+            return
+        # rooms greet with the name of their agent config, the cache is keyed by the text
+        hello = HELLO.format(name=agent_config.agent_name)
+        frames = get_tts().synthesize_stream(hello, frame_ms=settings.TTS_FRAME_MS)
+        async with contextlib.aclosing(frames):
+            async for _ in frames:
+                pass
+
+    # behind the requests of rooms already served, if the worker restarted under load
+    with request_priority(Priority.BACKGROUND):
+        try:
+            agent_config = await get_agent_config(agent_name=settings.AGENT_NAME)
+        except Exception as e:
+            logging.warning("prewarm failed to load the agent config: %s", e, exc_info=e)
+            return
+        if not agent_config:
+            return
+        results = await asyncio.gather(warm_agent(agent_config), warm_greeting(agent_config), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logging.warning("prewarm step failed: %s", result, exc_info=result)
+
+
+def dispatch_info(job_request: agents.JobRequest) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Return the `(agent_id, agent_name)` a job is dispatched to, read from the room metadata or else from
+    the metadata of the publisher the job was created for, a JSON object with `agent_id` or `agent_name`.
+    Both are None if neither names an agent.
+    """
+    publisher = job_request.publisher
+    for metadata in (job_request.room.metadata, publisher.metadata if publisher else ""):
+        if not metadata:
+            continue
+        try:
+            info = json.loads(metadata)
+        except ValueError:
+            continue
+        if isinstance(info, dict) and (info.get("agent_id") or info.get("agent_name")):
+            return info.get("agent_id"), info.get("agent_name")
+    return None, None
+
+
+class WardaWorker(agents.Worker):
+    """
+    Worker hosting every agent of the `agent` table from one process.
+
+    Each job is served by the agent named in its dispatch info, see `dispatch_info`, or by the agent of
+    `AGENT_NAME`. Agents share the process-wide clients, opened and prewarmed when the worker starts and
+    closed when it stops, and each serves at most `AGENT_MAX_ROOMS` rooms at a time.
+
+    Jobs are rejected while the load of the process is at one of the `LOAD_MAX_*` limits, and for good
+    once the worker drains, see `drain`.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, request_handler=self.handle_job_request, **kwargs)
+        self.rooms = RoomRegistry(max_rooms_per_agent=settings.AGENT_MAX_ROOMS)
+        self.load = LoadController(
+            probes={
+                "rooms": self.rooms.active,
+                "loop_lag": lambda: self._loop_monitor.stats.recent_lag if self._loop_monitor else 0.0,
+                "llm_pending": pending_calls,
+                "tts_pending": lambda: get_tts().pending,
+                "rss_mb": rss_mb,
+            },
+            limits={
+                "rooms": settings.LOAD_MAX_ROOMS,
+                "loop_lag": settings.LOAD_MAX_LOOP_LAG,
+                "llm_pending": settings.LOAD_MAX_LLM_PENDING,
+                "tts_pending": settings.LOAD_MAX_TTS_PENDING,
+                "rss_mb": settings.LOAD_MAX_RSS_MB,
+            },
+            reserve="rooms",
+        )
+        self._metrics_server: Optional[asyncio.AbstractServer] = None
+        self._loop_monitor: Optional[LoopMonitor] = None
+        self._load_reporter: Optional[asyncio.Task] = None
+        self._drain_task: Optional[asyncio.Task] = None
+
+    async def handle_job_request(self, job_request: agents.JobRequest) -> None:
+        if not self.load.admit():
+            if self.load.draining:
+                logging.info("rejected job %s, the worker is draining", job_request.id)
+            else:
+                logging.warning("rejected job %s, the worker is full: %s", job_request.id, self.load.sample())
+            await job_request.reject()
+            return
+
+        accepted = False
+        try:
+            accepted = await self._accept_job(job_request)
+        finally:
+            # an accepted room is counted by the registry from now on
+            self.load.release(accepted)
+
+    async def _accept_job(self, job_request: agents.JobRequest) -> bool:
+        """Accept the job for the agent of its room, or reject it, return True if it was accepted."""
+        agent_id, agent_name = dispatch_info(job_request)
+        if not agent_id and not agent_name:
+            agent_name = settings.AGENT_NAME
+
+        try:
+            agent_config = await get_agent_config(agent_id=agent_id, agent_name=agent_name)
+        except Exception as e:
+            logging.warning(
+                "rejected job %s, no agent config for %s: %s", job_request.id, agent_id or agent_name, e, exc_info=e
+            )
+            await job_request.reject()
+            return False
+
+        room = job_request.room.name
+        if not self.rooms.try_acquire(agent_config.agent_id, room):
+            if self.rooms.holds(agent_config.agent_id, room):
+                logging.warning(
+                    "rejected job %s, agent %s already serves room %s", job_request.id, agent_config.agent_name, room
+                )
+            else:
+                logging.warning(
+                    "rejected job %s, agent %s already serves %d rooms",
+                    job_request.id,
+                    agent_config.agent_name,
+                    self.rooms.active(agent_config.agent_id),
+                )
+            await job_request.reject()
+            return False
+
+        async def entry(ctx: agents.JobContext):
+            ctx.room.once("disconnected", lambda *_: self.rooms.release(agent_config.agent_id, room))
+            get_task_tracker().open_room(room)
+            # every task the room spawns is accounted to it, and cancelled when it disconnects
+            with room_scope(room):
+                await WardaAgent.create(ctx, agent_config)
+
+        auto_subscribe = agents.AutoSubscribe.SUBSCRIBE_NONE
+        if settings.VOICE_INPUT_ENABLED:
+            # the microphones of the participants, for voice input
+            auto_subscribe = agents.AutoSubscribe.AUDIO_ONLY
+
+        try:
+            await job_request.accept(
+                entry,
+                identity=agent_config.agent_id,
+                name=agent_config.agent_name,
+                # disconnect when the last participant leaves
+                auto_disconnect=agents.AutoDisconnect.DEFAULT,
+                auto_subscribe=auto_subscribe,
+            )
+        except Exception:
+            self.rooms.release(agent_config.agent_id, room)
+            raise
+        return True
+
+    async def start(self) -> None:
+        tracker = get_task_tracker()
+        tracker.close_timeout = settings.ROOM_CLOSE_TIMEOUT
+        tracker.install()
+        if settings.LOOP_MONITOR_ENABLED:
+            self._loop_monitor = LoopMonitor(
+                interval=settings.LOOP_LAG_INTERVAL,
+                stall_threshold=settings.LOOP_STALL_THRESHOLD,
+                tracker=tracker,
+                report_interval=settings.TASK_REPORT_INTERVAL,
+            )
+            self._loop_monitor.start()
+
+        get_scheduler().attach()
+        await open_postgrest_client()
+        await prewarm()
+        if settings.METRICS_ENABLED:
+            enable_metrics()
+            self._metrics_server = await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT)
+        await super().start()
+
+        self._load_reporter = asyncio.create_task(self._report_load())
+        if settings.DRAIN_ON_SIGTERM:
+            # replaces the immediate shutdown of `agents.run_app`, SIGINT still stops the worker at once
+            with contextlib.suppress(NotImplementedError):
+                asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, self.drain)
+
+    def drain(self) -> None:
+        """
+        Stop taking jobs and shut down once the rooms being served ended, or `DRAIN_TIMEOUT` seconds
+        later. Draining again shuts down at once.
+        """
+        if self._drain_task is not None:
+            logging.warning("drained again, shutting down with %d rooms", self.rooms.active())
+            self._stop()
+            return
+
+        self.load.drain()
+        self._drain_task = asyncio.create_task(self._drain())
+
+    async def _drain(self) -> None:
+        logging.info("draining, waiting for %d rooms to end", self.rooms.active())
+        # tell the dispatcher now rather than at the next report
+        await self._send_load()
+        deadline = time.monotonic() + settings.DRAIN_TIMEOUT
+        while self.rooms.active() and time.monotonic() < deadline:
+            await asyncio.sleep(1.0)
+
+        if self.rooms.active():
+            logging.warning("drain timed out, shutting down with %d rooms", self.rooms.active())
+        else:
+            logging.info("drained, shutting down")
+        self._stop()
+
+    def _stop(self) -> None:
+        # ends the run of the worker, which `agents.run_app` follows with `shutdown`
+        if self.running:
+            self._task.cancel()
 
-HELLO = "Hi! I am Warda~ I am here to assist you."
+    async def _report_load(self) -> None:
+        while True:
+            await asyncio.sleep(settings.LOAD_REPORT_INTERVAL)
+            try:
+                await self._send_load()
+            except Exception as e:
+                logging.error("failed to report the worker load: %s", e, exc_info=e)
+
+    async def _send_load(self) -> None:
+        load = self.load.sample()
+        logging.debug("worker load: %s", load)
+        full = self.load.draining or load["score"] >= 1.0
+
+        status = protocol.agent.WorkerStatus
+        msg = protocol.agent.WorkerMessage()
+        msg.update_worker.status = status.WS_FULL if full else status.WS_AVAILABLE
+        msg.update_worker.load = min(load["score"], 1.0)
+        msg.update_worker.job_count = self.rooms.active()
+        await self._send(msg)
+
+    async def shutdown(self) -> None:
+        for task in (self._load_reporter, self._drain_task):
+            if task is not None and task is not asyncio.current_task():
+                task.cancel()
+        try:
+            await super().shutdown()
+        finally:
+            if self._metrics_server:
+                self._metrics_server.close()
+                await self._metrics_server.wait_closed()
+            if self._loop_monitor:
+                await self._loop_monitor.stop()
+            get_task_tracker().uninstall()
+            await close_postgrest_client()
 
 
 class AgentState(Enum):
-    WAITING = "waiting"
+    LISTENING = "listening"
     THINKING = "thinking"
+    SPEAKING = "speaking"
+    # the user barged in, shown until the agent starts thinking about the new message
+    INTERRUPTED = "interrupted"
 
 
 class WardaAgent:
     @classmethod
-    async def create(cls, ctx: agents.JobContext):
-        agent = WardaAgent(ctx)
+    async def create(cls, ctx: agents.JobContext, agent_config: AgentConfigPayload):
+        agent = WardaAgent(ctx, agent_config)
         await agent.start()
 
-    def __init__(self, ctx: agents.JobContext):
-        # plugins
-        self.tts = TTS()
+    def __init__(self, ctx: agents.JobContext, agent_config: AgentConfigPayload):
+        # plugins, shared by the rooms of every agent
+        self.tts = get_tts()
 
         self.ctx = ctx
+        self.agent_config = agent_config
+        self.agent_id = agent_config.agent_id
         self.chat = rtc.ChatManager(ctx.room)
-        self.chat_agent = SimpleAgent(system_message=PROMPT)
+        self.chat_agent = SimpleAgent(system_message=PROMPT.format(name=agent_config.agent_name))
         self.service = ServiceManager(ctx, ctx.room, self.chat_agent)
-        self.prompt: Optional[str] = None
+        self.prompts = PromptQueue(
+            maxsize=settings.PROMPT_QUEUE_MAXSIZE,
+            overflow=OverflowPolicy(settings.PROMPT_QUEUE_OVERFLOW),
+        )
         self.line_out: Optional[rtc.AudioSource] = None
+        self.audio_out: Optional[AudioOutput] = None
+        self.speech = SpeechController()
+        self.state: StatePublisher[AgentState] = StatePublisher(
+            self.publish_agent_state,
+            window=settings.AGENT_STATE_WINDOW,
+            min_interval=settings.AGENT_STATE_MIN_INTERVAL,
+            create_task=ctx.create_task,
+        )
 
         def process_chat(msg: rtc.ChatMessage):
-            self.prompt = msg.message
             logging.info("received chat message: %s", msg.message)
+            if not msg.message:
+                return
+
+            trace = start_turn()
+            trace.mark(Stage.CHAT_RECEIVED)
+            self.submit_prompt(msg.message, trace)
 
         self.chat.on("message_received", process_chat)
 
+        self.voice_inputs: Dict[str, asyncio.Task] = {}
+        if settings.VOICE_INPUT_ENABLED:
+            self.stt = get_stt()
+            self.ctx.room.on("track_subscribed", self.on_track_subscribed)
+            self.ctx.room.on("track_unsubscribed", self.on_track_unsubscribed)
+
+        def on_disconnected(*_):
+            # stop the workers of the room's services, then whatever else the room still runs
+            self.service.close()
+            self.state.close()
+            for task in self.voice_inputs.values():
+                task.cancel()
+            get_task_tracker().close_room(self.ctx.room.name)
+
+        self.ctx.room.once("disconnected", on_disconnected)
+
     async def start(self):
-        # give a bit of time for the user to fully connect, so they don't miss
-        # the welcome message
-        await asyncio.sleep(1)
-
-        # confirm database connection
-        agent_config_payload: AgentConfigPayload = await get_agent_config(agent_name=settings.AGENT_NAME)
-        if not agent_config_payload:
-            raise Exception(f"Agent config not found for agent {settings.AGENT_NAME}")
-        else:
-            self.chat_agent.init_agent(agent_config_payload.system_message)
+        # the config was looked up when the job was accepted, building its backend blocks
+        await run_blocking(lambda: configure_chat_agent(self.chat_agent, self.agent_config))
+        self.state.set(AgentState.LISTENING)
 
-        agent_config_service: AgentService = self.service.fetch_service("agent-config-topic")
-        await agent_config_service.send_agent_config()
+        await asyncio.gather(self.publish_audio(), self.wait_for_user(settings.GREETING_WAIT_TIMEOUT))
 
-        self.ctx.create_task(self.chat_publish_worker())
-        await self.publish_audio()
+        hello = HELLO.format(name=self.agent_config.agent_name)
+        # the task inherits the priority, replies to rooms already talking go first
+        with request_priority(Priority.GREETING):
+            self.ctx.create_task(self.speak(self.send_audio_message(hello)))
+
+        self.ctx.create_task(self.chat.send_message(hello))
 
-        self.ctx.create_task(self.send_audio_message(HELLO))
+        agent_config_service: AgentService = self.service.fetch_service("agent-config-topic")
+        self.ctx.create_task(agent_config_service.send_agent_config(self.agent_config))
 
-        self.ctx.create_task(self.chat.send_message(HELLO))
+        self.ctx.create_task(self.chat_publish_worker())
 
-        self.update_agent_state(AgentState.WAITING.value)
+    def submit_prompt(self, text: str, trace: TurnTrace) -> None:
+        """Queue a chat message or a transcript for a reply, barging in on the current one."""
+        try:
+            self.prompts.put_nowait(text, trace)
+        except PromptQueueFull:
+            logging.warning("prompt queue is full, rejected prompt: %s", text)
+            trace.finish("rejected")
+            return
+        trace.mark(Stage.QUEUED)
+
+        # barge-in, stop talking about the previous message and answer the new one
+        if settings.BARGE_IN and self.speech.interrupt():
+            logging.info("interrupted current speech for a new prompt")
+
+    def on_track_subscribed(
+        self, track: rtc.Track, publication: rtc.RemoteTrackPublication, participant: rtc.RemoteParticipant
+    ):
+        if track.kind != rtc.TrackKind.KIND_AUDIO or publication.sid in self.voice_inputs:
+            return
+        logging.info("listening to %s of %s", publication.sid, participant.identity)
+        task = self.ctx.create_task(self.listen(track))
+        self.voice_inputs[publication.sid] = task
+
+        def on_done(_):
+            if self.voice_inputs.get(publication.sid) is task:
+                del self.voice_inputs[publication.sid]
+
+        task.add_done_callback(on_done)
+
+    def on_track_unsubscribed(self, track: rtc.Track, publication: rtc.RemoteTrackPublication, *_):
+        task = self.voice_inputs.pop(publication.sid, None)
+        if task is not None:
+            task.cancel()
+
+    async def listen(self, track: rtc.Track):
+        """Transcribe the speech of an audio track of the user, transcripts are answered like chat messages."""
+
+        def on_transcript(text: str, trace: TurnTrace):
+            logging.info("transcribed speech: %s", text)
+            self.submit_prompt(text, trace)
+
+        voice_input = VoiceInput(
+            self.stt,
+            EnergyVAD(frame_ms=settings.VAD_FRAME_MS, threshold_db=settings.VAD_THRESHOLD_DB),
+            on_transcript,
+            min_speech=settings.VAD_MIN_SPEECH,
+            min_silence=settings.VAD_MIN_SILENCE,
+            padding=settings.VAD_PADDING,
+            max_speech=settings.VAD_MAX_SPEECH,
+            final_timeout=settings.STT_FINAL_TIMEOUT,
+        )
 
-    def update_agent_state(self, state: str):
-        metadata = json.dumps({"agent_state": state})
-        self.ctx.create_task(self.ctx.room.local_participant.update_metadata(metadata))
+        stream = rtc.AudioStream(track)
+
+        async def frames():
+            async for event in stream:
+                yield event.frame
+
+        try:
+            await voice_input.run(frames())
+        except Exception as e:
+            logging.error("voice input failed: %s", e, exc_info=e)
+        finally:
+            await stream.aclose()
+
+    async def wait_for_user(self, timeout: float):
+        """
+        Wait until the user has published a track, which means their client finished connecting and
+        subscribes to the agent's track about now, so they hear the greeting from the start.
+        """
+        room = self.ctx.room
+        # audio is only subscribed with voice input, so publications are the signal rather than subscriptions
+        if any(p.tracks for p in room.participants.values()):
+            return
+
+        published = asyncio.Event()
+
+        def on_track_published(*_):
+            published.set()
+
+        room.on("track_published", on_track_published)
+        try:
+            await asyncio.wait_for(published.wait(), timeout)
+        except asyncio.TimeoutError:
+            logging.info("no track published after %.1fs, greeting anyway", timeout)
+        finally:
+            room.off("track_published", on_track_published)
+
+    async def publish_agent_state(self, state: AgentState):
+        metadata = json.dumps({"agent_state": state.value})
+        await self.ctx.room.local_participant.update_metadata(metadata)
+
+    async def speak(self, speech) -> bool:
+        """Run `speech` as the current speech of `self.speech`, the agent listens again once it ends."""
+        try:
+            completed = await self.speech.run(speech)
+        except Exception:
+            self.state.set(AgentState.LISTENING)
+            raise
+        self.state.set(AgentState.LISTENING if completed else AgentState.INTERRUPTED)
+        return completed
 
     async def publish_audio(self):
-        self.line_out = rtc.AudioSource(24000, 1)
+        self.line_out = rtc.AudioSource(TRACK_SAMPLE_RATE, TRACK_NUM_CHANNELS)
+        self.audio_out = AudioOutput(
+            self.line_out, TRACK_SAMPLE_RATE, TRACK_NUM_CHANNELS, frame_ms=settings.TTS_FRAME_MS
+        )
         track = rtc.LocalAudioTrack.create_audio_track("agent-mic", self.line_out)
         options = rtc.TrackPublishOptions()
         options.source = rtc.TrackSource.SOURCE_MICROPHONE
         await self.ctx.room.local_participant.publish_track(track, options)
 
     async def send_audio_message(self, message: str):
-        audio = await self.tts.synthesize(message)
-        await self.line_out.capture_frame(audio.data)
+        try:
+            if settings.TTS_STREAMING:
+                frames = self.tts.synthesize_stream(message, frame_ms=settings.TTS_FRAME_MS)
+                async with contextlib.aclosing(frames):
+                    async for frame in frames:
+                        self.state.set(AgentState.SPEAKING)
+                        await self.audio_out.push_frame(frame)
+            else:
+                audio = await self.tts.synthesize(message)
+                self.state.set(AgentState.SPEAKING)
+                await self.audio_out.push_frame(audio.data)
+            await self.audio_out.flush()
+        except asyncio.CancelledError:
+            self.audio_out.clear()
+            raise
+
+    async def send_audio_stream(self, stream: SynthesizeStream):
+        try:
+            async for event in stream:
+                if event.type == tts.SynthesisEventType.AUDIO:
+                    self.state.set(AgentState.SPEAKING)
+                    await self.audio_out.push_frame(event.audio.data)
+            await self.audio_out.flush()
+        except asyncio.CancelledError:
+            self.audio_out.clear()
+            raise
+
+    async def stream_text(self, prompt: str, stream: SynthesizeStream) -> str:
+        """Feed the reply into `stream` while the LLM is still generating it, returns the full reply."""
+        parts = []
+        deltas = self.chat_agent.astream(prompt)
+        async with contextlib.aclosing(deltas):
+            async for delta in deltas:
+                parts.append(delta)
+                stream.push_text(delta)
+        return "".join(parts)
+
+    async def reply(self, prompt: str):
+        """
+        Answer a single prompt, from the LLM call to the last played frame. Runs as the current speech
+        of `self.speech`, so all of it is cancelled when the user barges in with a new message.
+        """
+        stream: Optional[SynthesizeStream] = None
+        playback: Optional[asyncio.Task] = None
+        if settings.TTS_STREAMING:
+            stream = self.tts.stream(frame_ms=settings.TTS_FRAME_MS, max_concurrency=settings.TTS_MAX_CONCURRENCY)
+            playback = asyncio.create_task(self.send_audio_stream(stream))
+
+        try:
+            self.state.set(AgentState.THINKING)
+            try:
+                if stream:
+                    content = await self.stream_text(prompt, stream)
+                else:
+                    content = await self.chat_agent.astep(prompt)
+            except asyncio.TimeoutError:
+                # the turn ends as a timeout rather than a failure
+                logging.error("LLM call timed out for prompt: %s", prompt)
+                raise
+
+            self.ctx.create_task(self.chat.send_message(content))
+
+            if stream:
+                await stream.end_input()
+                await playback
+            else:
+                await self.send_audio_message(content)
+        finally:
+            if playback and not playback.done():
+                playback.cancel()
+            if stream:
+                await stream.aclose()
+
+    async def save_memory(self):
+        try:
+            with request_priority(Priority.BACKGROUND):
+                summary = await self.chat_agent.summarize_memory()
+            if summary is not None and self.agent_id:
+                await update_agent_memory(self.agent_id, summary)
+        except Exception as e:
+            logging.error("failed to save the conversation summary: %s", e, exc_info=e)
 
     async def chat_publish_worker(self):
         while True:
-            if self.prompt:
-                prompt, self.prompt = self.prompt, None
-
-                self.update_agent_state(AgentState.THINKING.value)
-                content = self.chat_agent.step(prompt)
-
-                self.ctx.create_task(self.send_audio_message(content))
-                self.ctx.create_task(self.chat.send_message(content))
-
-                self.update_agent_state(AgentState.WAITING.value)
-
-            await asyncio.sleep(0.05)
+            prompt, trace = await self.prompts.get_traced()
+            trace.mark(Stage.DEQUEUED)
+            logging.debug(
+                "dequeued prompt after %.3fs, %d still queued", self.prompts.stats.last_wait, self.prompts.qsize()
+            )
+
+            outcome = "completed"
+            try:
+                # the reply task and every task it creates record their stages on this trace
+                with use_trace(trace):
+                    completed = await self.speak(self.reply(prompt))
+                if not completed:
+                    outcome = "interrupted"
+                    logging.info(
+                        "reply interrupted, stopped after %.3fs", self.speech.stats.last_cancel_latency
+                    )
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+            except Exception as e:
+                outcome = "failed"
+                logging.error("failed to reply to prompt: %s", e, exc_info=e)
+            finally:
+                trace.finish(outcome)
+
+            if settings.MEMORY_SUMMARY_ENABLED:
+                # off the reply path, the next turn does not wait for the summary
+                self.ctx.create_task(self.save_memory())
 
 
 if __name__ == "__main__":
@@ -112,15 +653,6 @@ if __name__ == "__main__":
     os.environ["LIVEKIT_API_SECRET"] = settings.LIVEKIT_API_SECRET
     os.environ["OPENAI_API_KEY"] = settings.OPENAI_API_KEY
 
-    async def job_request_cb(job_request: agents.JobRequest):
-        await job_request.accept(
-            WardaAgent.create,
-            identity=settings.AGENT_ID,
-            name=settings.AGENT_NAME,
-            # disconnect when the last participant leaves
-            auto_disconnect=agents.AutoDisconnect.DEFAULT,
-        )
-
-    worker = agents.Worker(request_handler=job_request_cb)
+    worker = WardaWorker()
 
     agents.run_app(worker)
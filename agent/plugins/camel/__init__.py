@@ -1,5 +1,13 @@
 from .chat_agent import SimpleAgent
+from .memory import ConversationMemory, ConversationMemoryStats
+from .router import BackendHealth, RoutedBackend, RouterStats, get_router_stats
 
 __all__ = [
-    "SimpleAgent"
+    "SimpleAgent",
+    "ConversationMemory",
+    "ConversationMemoryStats",
+    "BackendHealth",
+    "RoutedBackend",
+    "RouterStats",
+    "get_router_stats",
 ]
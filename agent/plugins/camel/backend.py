@@ -0,0 +1,124 @@
+import logging
+import threading
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from camel.configs import ChatGPTConfig
+from camel.messages import OpenAIMessage
+from camel.models import BaseModelBackend, ModelFactory, OpenAIModel
+from camel.types import ModelType
+from camel.utils import BaseTokenCounter
+
+from config import settings
+from plugins.openai.client import get_sync_client
+from plugins.openai.scheduler import get_scheduler
+from .router import RoutedBackend
+
+DEFAULT_PLATFORM = "OpenAI"
+
+# tokens a completion is assumed to take when the config does not bound it
+_DEFAULT_COMPLETION_TOKENS = 256
+
+_backends: Dict[Tuple[ModelType, Hashable], BaseModelBackend] = {}
+_lock = threading.Lock()
+
+
+class ScheduledBackend(BaseModelBackend):
+    """
+    Model backend whose requests go through the process-wide request scheduler, everything else is
+    delegated to the wrapped backend.
+
+    :param key: Rate limits the requests are held to, by default those of the model.
+    :param max_retries: Retries of failed requests, by default those of the scheduler.
+    """
+
+    def __init__(self, backend: BaseModelBackend, key: Optional[str] = None, max_retries: Optional[int] = None) -> None:
+        self._backend = backend
+        super().__init__(backend.model_type, backend.model_config_dict)
+        self._key = key or backend.model_type.value
+        self._max_retries = max_retries
+        self._scheduler = get_scheduler()
+        max_tokens = backend.model_config_dict.get("max_tokens")
+        self._completion_tokens = max_tokens if isinstance(max_tokens, int) else _DEFAULT_COMPLETION_TOKENS
+
+    @property
+    def backend(self) -> BaseModelBackend:
+        return self._backend
+
+    @property
+    def token_counter(self) -> BaseTokenCounter:
+        return self._backend.token_counter
+
+    @property
+    def stream(self) -> bool:
+        return self._backend.stream
+
+    def check_model_config(self) -> None:
+        self._backend.check_model_config()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._backend, name)
+
+    def run(self, messages: List[OpenAIMessage]) -> Any:
+        tokens = 0
+        if self._scheduler.limits_tokens(self._key):
+            tokens = self._backend.count_tokens_from_messages(messages) + self._completion_tokens
+        return self._scheduler.run_sync(
+            self._key, lambda: self._backend.run(messages), tokens=tokens, max_retries=self._max_retries
+        )
+
+
+def platform_urls(platform: Optional[str]) -> List[str]:
+    """Base URLs of the backends of a model platform, see `LLM_PLATFORMS`."""
+    urls = settings.LLM_PLATFORMS.get(platform or DEFAULT_PLATFORM)
+    if not urls:
+        logging.warning("no LLM backends for model platform %r, using the OpenAI API", platform)
+        return [""]
+    return list(urls)
+
+
+def _create_backend(
+    model_type: ModelType, model_config: ChatGPTConfig, base_url: str, failover: bool
+) -> BaseModelBackend:
+    backend = ModelFactory.create(model_type, model_config.__dict__)
+    if isinstance(backend, OpenAIModel):
+        # one connection pool per server for every backend, without the client's own retries
+        backend._client = get_sync_client(base_url)
+    return ScheduledBackend(
+        backend,
+        # the OpenAI limits do not apply to other servers
+        key=f"{model_type.value}@{base_url}" if base_url else None,
+        # another backend answers sooner than a retry after a backoff
+        max_retries=0 if failover else None,
+    )
+
+
+def get_model_backend(
+    model_type: ModelType, model_config: ChatGPTConfig, platform: Optional[str] = None
+) -> BaseModelBackend:
+    """
+    Return the process-wide backend of a model, config and model platform.
+
+    Backends hold no conversation state, so rooms using the same settings share one, together with its
+    HTTP clients and token counter. Requests are routed over the backends of the platform, see
+    `router.RoutedBackend`, and scheduled, see `plugins.openai.scheduler`.
+    """
+    urls = platform_urls(platform)
+    # some config values (e.g. logit_bias) are dicts, compare their reprs
+    key = (model_type, tuple(urls), tuple(sorted((k, repr(v)) for k, v in model_config.__dict__.items())))
+    backend = _backends.get(key)
+    if backend is None:
+        with _lock:
+            backend = _backends.get(key)
+            if backend is None:
+                failover = len(urls) > 1
+                backends = [
+                    (f"{model_type.value}@{url or 'openai'}", _create_backend(model_type, model_config, url, failover))
+                    for url in urls
+                ]
+                if len(backends) == 1:
+                    # nothing to hedge or fail over to
+                    backend = backends[0][1]
+                else:
+                    backend = RoutedBackend(backends, hedge_delay=settings.LLM_HEDGE_DELAY)
+                _backends[key] = backend
+    return backend
@@ -1,24 +1,298 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from typing import AsyncIterator, Callable, List, Optional
+
 from camel.agents import ChatAgent
-from camel.messages import BaseMessage
+from camel.configs import ChatGPTConfig
+from camel.memories import MemoryRecord
+from camel.messages import BaseMessage, OpenAIMessage
 from camel.prompts import PromptTemplateGenerator
-from camel.types import TaskType
+from camel.types import ModelType, OpenAIBackendRole, TaskType
+
+from config import settings
+from core.metrics import Stage, mark
+from .backend import get_model_backend
+from .executor import run_blocking, submit
+from .memory import ConversationMemory
+
+_STREAM_END = object()
+
+_SUMMARY_PROMPT = (
+    "You maintain a short running summary of a conversation between a user and an assistant. "
+    "Update the summary with the new messages. Keep facts about the user, decisions and open questions, "
+    "drop small talk. Answer with the updated summary only."
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _role_prompt(key: str, num_roles: int) -> str:
+    prompt_template = PromptTemplateGenerator().get_prompt_from_key(TaskType.AI_SOCIETY, key)
+    return prompt_template.format(num_roles=num_roles)
 
 
 class SimpleAgent:
-    def __init__(self, key: str = 'generate_users', num_roles: int = 50, model=None, system_message: str = ""):
-        prompt_template = PromptTemplateGenerator().get_prompt_from_key(TaskType.AI_SOCIETY, key)
-        self.prompt = prompt_template.format(num_roles=num_roles)
+    def __init__(
+        self,
+        key: str = 'generate_users',
+        num_roles: int = 50,
+        model=None,
+        system_message: str = "",
+        platform: Optional[str] = None,
+    ):
+        self._prompt_key = key
+        self._num_roles = num_roles
 
         self.model = model
+        # model platform of the agent config, selects the LLM backends, see `LLM_PLATFORMS`
+        self.platform = platform
         self.agent = None
+        self.memory: Optional[ConversationMemory] = None
+        # CAMEL's ChatAgent is not thread-safe, serialize calls that touch its memory
+        self._lock = threading.Lock()
+        # configs received while a turn holds `_lock`, applied before the next one
+        self._pending: List[Callable[[], None]] = []
+        self._pending_lock = threading.Lock()
+        # summaries build on each other, fold evicted messages one batch at a time
+        self._summary_lock = asyncio.Lock()
 
         self.init_agent(system_message)
 
-    def init_agent(self, system_message: str):
+    @property
+    def prompt(self) -> str:
+        # only built when used, and once per process
+        return _role_prompt(self._prompt_key, self._num_roles)
+
+    def init_agent(
+        self,
+        system_message: str,
+        memory_limit: Optional[int] = None,
+        system_message_limit: Optional[int] = None,
+        summary: Optional[str] = None,
+    ):
+        """
+        (Re)create the chat agent.
+
+        :param memory_limit: Dialog rounds kept in the context, `None` for no limit.
+        :param system_message_limit: Maximum tokens of the system message, `None` for no limit.
+        :param summary: Summary of the earlier conversation, `None` keeps the current one.
+        """
         assistant_sys_msg = BaseMessage.make_assistant_message(role_name="Assistant", content=system_message)
-        self.agent = ChatAgent(assistant_sys_msg, model_type=self.model)
-        self.agent.reset()
+        # streaming lets `astream` forward tokens as they arrive, `step` aggregates the stream
+        agent = ChatAgent(assistant_sys_msg, model_type=self.model, model_config=ChatGPTConfig(stream=True))
+        agent.model_backend = get_model_backend(agent.model_type, agent.model_config, self.platform)
+
+        memory = ConversationMemory(
+            agent.model_backend.token_counter,
+            token_limit=agent.model_token_limit,
+            max_rounds=memory_limit,
+            system_token_limit=system_message_limit,
+            collect_evicted=settings.MEMORY_SUMMARY_ENABLED,
+        )
+        if summary is None and self.memory is not None:
+            summary = self.memory.summary
+        memory.summary = summary or ""
+        agent.memory = memory
+        agent.reset()
+
+        with self._lock:
+            self.agent = agent
+            self.memory = memory
+
+    def configure(
+        self,
+        system_message: Optional[str] = None,
+        model: Optional[str] = None,
+        platform: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        top_p: Optional[float] = None,
+        memory_limit: Optional[int] = None,
+        system_message_limit: Optional[int] = None,
+        summary: Optional[str] = None,
+    ):
+        """
+        Apply an agent config in place, the conversation history is kept.
+
+        The backend is built without holding the agent, the config is swapped in between turns: at once
+        when the agent is idle, otherwise before the next turn starts.
+
+        `None` keeps the current value, except for `memory_limit` and `system_message_limit` where it
+        means no limit, as in `init_agent`.
+        """
+        agent = self.agent
+        model_type = agent.model_type
+        if model:
+            try:
+                model_type = ModelType(model)
+            except ValueError:
+                logging.warning("unknown model type %r, keeping %s", model, model_type.value)
+
+        current = agent.model_config
+        model_config = ChatGPTConfig(
+            stream=True,
+            temperature=current.temperature if temperature is None else temperature,
+            top_p=current.top_p if top_p is None else top_p,
+            max_tokens=current.max_tokens if max_tokens is None else max_tokens,
+        )
+        platform = platform or self.platform
+        backend = get_model_backend(model_type, model_config, platform)
+
+        def apply() -> None:
+            agent = self.agent
+            agent.model_type = model_type
+            agent.model_config = model_config
+            agent.model_backend = backend
+            agent.model_token_limit = backend.token_limit
+            self.model = model_type
+            self.platform = platform
+
+            if system_message is not None and system_message != agent.orig_sys_message.content:
+                assistant_sys_msg = BaseMessage.make_assistant_message(role_name="Assistant", content=system_message)
+                agent.orig_sys_message = agent.system_message = assistant_sys_msg
+                # the memory replaces its system message, the dialog stays
+                agent.memory.write_record(MemoryRecord(assistant_sys_msg, OpenAIBackendRole.SYSTEM))
+
+            self.memory.set_limits(max_rounds=memory_limit, system_token_limit=system_message_limit)
+            self.memory.set_token_limit(backend.token_limit)
+            if summary is not None:
+                self.memory.summary = summary
+
+        with self._pending_lock:
+            self._pending.append(apply)
+        # never wait for a reply in progress, the next turn applies the config first
+        if self._lock.acquire(blocking=False):
+            try:
+                self._apply_pending()
+            finally:
+                self._lock.release()
+
+    def _apply_pending(self) -> None:
+        """Apply the configs received since the last turn, in order, with `_lock` held."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        for apply in pending:
+            apply()
 
     def step(self, content: str) -> str:
         user_msg = BaseMessage.make_user_message(role_name="User", content=content)
-        return self.agent.step(user_msg).msg.content
+        with self._lock:
+            self._apply_pending()
+            reply = self.agent.step(user_msg).msg
+            # ChatAgent does not keep its own replies, without them the model loses track of the dialog
+            self.agent.record_message(reply)
+            return reply.content
+
+    async def astep(self, content: str, timeout: Optional[float] = None) -> str:
+        """Run `step` on the LLM executor so the event loop keeps serving other rooms."""
+        timeout = settings.LLM_TIMEOUT if timeout is None else timeout
+        mark(Stage.LLM_START)
+        content = await run_blocking(self.step, content, timeout=timeout)
+        mark(Stage.LLM_END)
+        return content
+
+    async def astream(self, content: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Stream the reply to `content` as text deltas.
+
+        The request runs on the LLM executor; closing the iterator, cancelling the consuming task or
+        exceeding `timeout` stops reading from the model and closes the underlying HTTP stream.
+
+        :raises asyncio.TimeoutError: If the reply did not complete within `timeout` seconds.
+        """
+        timeout = settings.LLM_TIMEOUT if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def on_delta(delta) -> None:
+            loop.call_soon_threadsafe(queue.put_nowait, delta)
+
+        def run() -> None:
+            try:
+                self._stream(content, on_delta, cancelled)
+            except Exception as e:
+                on_delta(e)
+            finally:
+                on_delta(_STREAM_END)
+
+        mark(Stage.LLM_START)
+        fut = submit(run)
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                item = await asyncio.wait_for(queue.get(), max(deadline - time.monotonic(), 0))
+                if item is _STREAM_END:
+                    mark(Stage.LLM_END)
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                mark(Stage.LLM_FIRST_TOKEN)
+                yield item
+        finally:
+            cancelled.set()
+            if not fut.done():
+                # drop the call if it is still queued, a running one exits at its next chunk
+                fut.cancel()
+
+    def _stream(self, content: str, on_delta: Callable[[str], None], cancelled: threading.Event) -> str:
+        user_msg = BaseMessage.make_user_message(role_name="User", content=content)
+        with self._lock:
+            if cancelled.is_set():
+                return ""
+            self._apply_pending()
+
+            self.agent.update_memory(user_msg, OpenAIBackendRole.USER)
+            openai_messages, _ = self.agent.memory.get_context()
+            response = self.agent.model_backend.run(openai_messages)
+
+            reply = []
+            try:
+                for chunk in response:
+                    if cancelled.is_set():
+                        break
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        reply.append(delta)
+                        on_delta(delta)
+            finally:
+                response.close()
+
+            content = "".join(reply)
+            if content:
+                # keep what has been said even if it was interrupted
+                self.agent.record_message(BaseMessage.make_assistant_message(role_name="Assistant", content=content))
+            return content
+
+    async def summarize_memory(self) -> Optional[str]:
+        """
+        Fold the messages evicted from the memory into its rolling summary.
+
+        :return: The new summary, or None if nothing was evicted since the last call.
+        """
+        async with self._summary_lock:
+            memory = self.memory
+            evicted = memory.pop_evicted() if memory else []
+            if not evicted:
+                return None
+
+            summary = await run_blocking(self._summarize, memory.summary, evicted, timeout=settings.LLM_TIMEOUT)
+            memory.summary = summary
+            return summary
+
+    def _summarize(self, summary: str, messages: List[OpenAIMessage]) -> str:
+        transcript = "\n".join(f"{m['role']}: {m.get('content') or ''}" for m in messages)
+        backend = get_model_backend(
+            self.agent.model_type,
+            ChatGPTConfig(stream=False, temperature=0, max_tokens=settings.MEMORY_SUMMARY_MAX_TOKENS),
+            self.platform,
+        )
+        response = backend.run([
+            {"role": "system", "content": _SUMMARY_PROMPT},
+            {"role": "user", "content": f"Current summary:\n{summary or '(empty)'}\n\nNew messages:\n{transcript}"},
+        ])
+        return response.choices[0].message.content or summary
@@ -0,0 +1,75 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from config import settings
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+# calls submitted and not finished yet, queued or running
+_pending = 0
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Return the process-wide executor used for blocking LLM calls.
+
+    Its size bounds how many LLM requests run concurrently in this process; further calls wait in the
+    executor queue without blocking the event loop.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.LLM_MAX_CONCURRENCY, thread_name_prefix="camel-llm")
+        return _executor
+
+
+def submit(func: Callable[..., T], *args, **kwargs) -> "asyncio.Future[T]":
+    """
+    Run a blocking callable on the LLM executor, cancelling the returned future drops the call if it is
+    still queued. The callable runs in a copy of the caller's context, e.g. its request priority.
+    """
+    global _pending
+    with _executor_lock:
+        _pending += 1
+
+    def on_done(_) -> None:
+        global _pending
+        with _executor_lock:
+            _pending -= 1
+
+    context = contextvars.copy_context()
+    future = get_executor().submit(context.run, functools.partial(func, *args, **kwargs))
+    future.add_done_callback(on_done)
+    return asyncio.wrap_future(future)
+
+
+def pending_calls() -> int:
+    """LLM calls queued or running on the executor."""
+    return _pending
+
+
+def shutdown_executor(wait: bool = True) -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait, cancel_futures=True)
+            _executor = None
+
+
+async def run_blocking(func: Callable[..., T], *args, timeout: Optional[float] = None, **kwargs) -> T:
+    """
+    Run a blocking callable on the LLM executor and await its result.
+
+    If the call times out or the awaiting task is cancelled before a worker thread picked it up, it is
+    removed from the queue. A call that is already running cannot be interrupted and finishes in the
+    background.
+
+    :raises asyncio.TimeoutError: If the call did not finish within `timeout` seconds.
+    """
+    return await asyncio.wait_for(submit(func, *args, **kwargs), timeout)
@@ -0,0 +1,190 @@
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, List, Optional, Tuple
+
+from camel.memories import BaseMemory, MemoryRecord
+from camel.messages import OpenAIMessage
+from camel.types import OpenAIBackendRole
+from camel.utils import BaseTokenCounter
+
+# (record, message in OpenAI format, cached token count)
+_Entry = Tuple[MemoryRecord, OpenAIMessage, int]
+
+# every reply is primed with <|start|>assistant<|message|>
+_REPLY_PRIMING_TOKENS = 3
+
+
+@dataclass
+class ConversationMemoryStats:
+    rounds: int = 0
+    messages: int = 0
+    evicted: int = 0
+    context_tokens: int = 0
+
+
+class ConversationMemory(BaseMemory):
+    """
+    Bounded chat history for CAMEL's `ChatAgent`.
+
+    Keeps the system message and the last `max_rounds` dialog rounds, a round being a user message and
+    the replies to it, and evicts the oldest rounds until the context fits in `token_limit` tokens. The
+    system message is truncated to `system_token_limit` tokens. Token counts are computed once when a
+    message is written, so building the context does not tokenize the history again and its cost does
+    not grow with the length of the session.
+
+    A rolling `summary` of the evicted conversation, if set, is appended to the system message.
+
+    :param token_counter: Token counter of the model backend.
+    :param token_limit: Maximum tokens of the context sent to the model.
+    :param max_rounds: Maximum dialog rounds kept, `None` for no limit.
+    :param system_token_limit: Maximum tokens of the system message, `None` for no limit.
+    :param collect_evicted: Keep evicted messages until `pop_evicted`, to summarize them.
+    """
+
+    def __init__(
+        self,
+        token_counter: BaseTokenCounter,
+        token_limit: int,
+        max_rounds: Optional[int] = None,
+        system_token_limit: Optional[int] = None,
+        collect_evicted: bool = False,
+    ) -> None:
+        self._token_counter = token_counter
+        self._token_limit = token_limit
+        self._max_rounds = max_rounds
+        self._system_token_limit = system_token_limit
+        self._collect_evicted = collect_evicted
+        self._system: Optional[_Entry] = None
+        self._summary = ""
+        self._summary_tokens = 0
+        self._messages: Deque[_Entry] = deque()
+        self._tokens = 0
+        self._rounds = 0
+        self._evicted: List[OpenAIMessage] = []
+        # ChatAgent reads the context on the LLM executor while the loop may write the summary
+        self._lock = threading.Lock()
+        self.stats = ConversationMemoryStats()
+
+    @property
+    def summary(self) -> str:
+        return self._summary
+
+    @summary.setter
+    def summary(self, summary: str) -> None:
+        with self._lock:
+            self._summary = summary or ""
+            self._summary_tokens = len(self._encode(self._summary)) if self._summary else 0
+            self._evict()
+
+    def set_limits(self, max_rounds: Optional[int] = None, system_token_limit: Optional[int] = None) -> None:
+        with self._lock:
+            self._max_rounds = max_rounds
+            if system_token_limit != self._system_token_limit:
+                self._system_token_limit = system_token_limit
+                if self._system is not None:
+                    self._system = self._entry(self._system[0])
+            self._evict()
+
+    def set_token_limit(self, token_limit: int) -> None:
+        with self._lock:
+            self._token_limit = token_limit
+            self._evict()
+
+    def get_context(self) -> Tuple[List[OpenAIMessage], int]:
+        with self._lock:
+            if self._system is None and not self._messages:
+                raise ValueError("The `ConversationMemory` is empty.")
+
+            messages = []
+            tokens = self._tokens + _REPLY_PRIMING_TOKENS
+            if self._system is not None:
+                system_message = self._system[1]
+                if self._summary:
+                    system_message = dict(system_message)
+                    system_message["content"] += f"\n\nSummary of the earlier conversation:\n{self._summary}"
+                messages.append(system_message)
+                tokens += self._system[2] + self._summary_tokens
+            messages.extend(entry[1] for entry in self._messages)
+
+            self.stats.context_tokens = tokens
+            return messages, tokens
+
+    def write_records(self, records: List[MemoryRecord]) -> None:
+        with self._lock:
+            for record in records:
+                if record.role_at_backend == OpenAIBackendRole.SYSTEM:
+                    self._system = self._entry(record)
+                    continue
+
+                entry = self._entry(record)
+                self._messages.append(entry)
+                self._tokens += entry[2]
+                if record.role_at_backend == OpenAIBackendRole.USER:
+                    self._rounds += 1
+
+            self._evict()
+
+    def clear(self) -> None:
+        """Drop the system message and the history, the summary is kept."""
+        with self._lock:
+            self._system = None
+            self._messages.clear()
+            self._tokens = 0
+            self._rounds = 0
+            self._update_stats()
+
+    def pop_evicted(self) -> List[OpenAIMessage]:
+        """Return and forget the messages evicted since the last call."""
+        with self._lock:
+            evicted, self._evicted = self._evicted, []
+            return evicted
+
+    def _entry(self, record: MemoryRecord) -> _Entry:
+        message = record.to_openai_message()
+        if record.role_at_backend == OpenAIBackendRole.SYSTEM and self._system_token_limit:
+            content = message.get("content") or ""
+            tokens = self._encode(content)
+            if len(tokens) > self._system_token_limit and hasattr(self._token_counter.encoding, "decode"):
+                message = dict(message)
+                message["content"] = self._token_counter.encoding.decode(tokens[:self._system_token_limit])
+
+        tokens = self._token_counter.count_tokens_from_messages([message]) - _REPLY_PRIMING_TOKENS
+        return record, message, tokens
+
+    def _encode(self, text: str) -> list:
+        return self._token_counter.encoding.encode(text)
+
+    def _evict(self) -> None:
+        budget = self._token_limit - _REPLY_PRIMING_TOKENS - self._summary_tokens
+        if self._system is not None:
+            budget -= self._system[2]
+
+        # always keep the round being answered, even if it does not fit
+        while self._rounds > 1 and (
+            (self._max_rounds is not None and self._rounds > self._max_rounds) or self._tokens > budget
+        ):
+            self._evict_round()
+
+        self._update_stats()
+
+    def _evict_round(self) -> None:
+        # the first message may not be a user one after a reply was recorded without its prompt
+        first = True
+        while self._messages:
+            record, message, tokens = self._messages[0]
+            if record.role_at_backend == OpenAIBackendRole.USER:
+                if not first:
+                    break
+                self._rounds -= 1
+            first = False
+
+            self._messages.popleft()
+            self._tokens -= tokens
+            self.stats.evicted += 1
+            if self._collect_evicted:
+                self._evicted.append(message)
+
+    def _update_stats(self) -> None:
+        self.stats.rounds = self._rounds
+        self.stats.messages = len(self._messages)
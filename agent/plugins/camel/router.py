@@ -0,0 +1,314 @@
+import contextvars
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from camel.messages import OpenAIMessage
+from camel.models import BaseModelBackend
+from camel.utils import BaseTokenCounter
+
+from config import settings
+from core.metrics import get_registry, metrics_enabled
+
+# weight of the latest first-token latency in the average of a backend
+_LATENCY_WEIGHT = 0.2
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Threads waiting for the first chunk of a request, a primary and a hedge per running LLM call."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=2 * settings.LLM_MAX_CONCURRENCY, thread_name_prefix="camel-llm-route"
+            )
+        return _executor
+
+
+@dataclass
+class BackendHealth:
+    # moving average of the seconds until the first chunk, None until a streamed request answered
+    latency: Optional[float] = None
+    failures: int = 0
+    # the backend is only tried after the healthy ones before this time
+    failed_until: float = 0.0
+
+
+@dataclass
+class RouterStats:
+    requests: int = 0
+    # second requests sent because the first chunk of the first one was late
+    hedged: int = 0
+    # hedged requests that answered first
+    hedge_wins: int = 0
+    # requests sent to another backend after an error
+    failovers: int = 0
+    failed: int = 0
+
+
+_health: Dict[str, BackendHealth] = {}
+_health_lock = threading.Lock()
+_stats = RouterStats()
+# the routers of every room count into `_stats` from the LLM executor threads
+_stats_lock = threading.Lock()
+
+
+def get_health(name: str) -> BackendHealth:
+    """Return the health of a backend, shared by the routers of every model config using it."""
+    with _health_lock:
+        health = _health.get(name)
+        if health is None:
+            health = _health[name] = BackendHealth()
+        return health
+
+
+def get_router_stats() -> RouterStats:
+    """Return the stats of every router of the process."""
+    return _stats
+
+
+def _count(name: str, outcome: str) -> None:
+    if metrics_enabled():
+        get_registry().counter("warda_llm_requests", "LLM requests by backend and outcome", ("backend", "outcome")).inc(
+            name, outcome
+        )
+
+
+class _RoutedStream:
+    """Stream of the winning request, starting with the chunk already read from it."""
+
+    def __init__(self, first: Any, chunks: Iterator[Any], response: Any) -> None:
+        self._first = first
+        self._chunks = chunks
+        self._response = response
+
+    def __iter__(self) -> Iterator[Any]:
+        if self._first is not None:
+            yield self._first
+        yield from self._chunks
+
+    def close(self) -> None:
+        self._response.close()
+
+
+class _Attempt:
+    """A request to one backend, run on a router thread until its first chunk arrives."""
+
+    def __init__(
+        self, name: str, backend: BaseModelBackend, messages: List[OpenAIMessage], results: queue.Queue, hedge: bool
+    ) -> None:
+        self.name = name
+        self.hedge = hedge
+        self._backend = backend
+        self._messages = messages
+        self._results = results
+        self._lock = threading.Lock()
+        self._response = None
+        self._cancelled = False
+        # the first chunk arrived, or the request failed
+        self._done = False
+        self._started_at = time.monotonic()
+        self.failed = False
+
+    def run(self) -> None:
+        try:
+            response = self._backend.run(self._messages)
+            with self._lock:
+                self._response = response
+                cancelled = self._cancelled
+            if cancelled:
+                response.close()
+                return
+            chunks = iter(response)
+            first = next(chunks, None)
+        except Exception as e:
+            with self._lock:
+                if self._cancelled:
+                    # closed because the other request answered first
+                    return
+                self._done = self.failed = True
+            _record_failure(self.name, e)
+            self._results.put((self, None, e))
+            return
+
+        with self._lock:
+            self._done = True
+        _record_latency(self.name, time.monotonic() - self._started_at)
+        self._results.put((self, _RoutedStream(first, chunks, response), None))
+
+    def cancel(self) -> None:
+        """Close the request, now if it already has a response or else as soon as it gets one."""
+        with self._lock:
+            self._cancelled = True
+            response = self._response
+            done = self._done
+        if not done:
+            # it would have answered later still, without this the backend would look fast forever
+            _record_latency(self.name, time.monotonic() - self._started_at)
+        if response is not None:
+            try:
+                response.close()
+            except Exception as e:
+                logging.debug("failed to close the request to %s: %s", self.name, e)
+
+
+def _record_latency(name: str, latency: float) -> None:
+    health = get_health(name)
+    with _health_lock:
+        health.latency = latency if health.latency is None else health.latency + _LATENCY_WEIGHT * (
+            latency - health.latency
+        )
+        health.failed_until = 0.0
+
+
+def _record_failure(name: str, error: Exception) -> None:
+    health = get_health(name)
+    with _health_lock:
+        health.failures += 1
+        health.failed_until = time.monotonic() + settings.LLM_BACKEND_COOLDOWN
+    logging.warning("LLM backend %s failed: %s", name, error)
+    _count(name, "failed")
+
+
+class RoutedBackend(BaseModelBackend):
+    """
+    Model backend spreading the requests of a model over a pool of equivalent backends, e.g. the OpenAI
+    API and OpenAI-compatible servers.
+
+    Requests go to the healthy backend with the lowest average first-chunk latency, backends that never
+    answered yet first. If a streamed request has no first chunk after `hedge_delay` seconds, the same
+    request is also sent to the next healthy backend, if there is one it was not sent to yet, and the
+    request answering last is closed. A request failing before its first chunk is sent to a backend it
+    was not sent to yet, and the failed backend is only tried after the healthy ones for
+    `LLM_BACKEND_COOLDOWN` seconds.
+
+    :param backends: (name, backend) of the pool, names identify backends in the health and metrics.
+    :param hedge_delay: Seconds to wait for the first chunk before hedging, 0 to never hedge.
+    """
+
+    def __init__(self, backends: Sequence[Tuple[str, BaseModelBackend]], hedge_delay: float = 0.0) -> None:
+        if not backends:
+            raise ValueError("a routed backend needs at least one backend")
+        self._backends = list(backends)
+        self._hedge_delay = hedge_delay
+        self.stats = _stats
+        first = self._backends[0][1]
+        super().__init__(first.model_type, first.model_config_dict)
+
+    @property
+    def backends(self) -> List[Tuple[str, BaseModelBackend]]:
+        return list(self._backends)
+
+    @property
+    def token_counter(self) -> BaseTokenCounter:
+        return self._backends[0][1].token_counter
+
+    @property
+    def stream(self) -> bool:
+        return self.model_config_dict.get("stream", False)
+
+    def check_model_config(self) -> None:
+        # every backend checked the config when it was created
+        pass
+
+    def run(self, messages: List[OpenAIMessage]) -> Any:
+        with _stats_lock:
+            self.stats.requests += 1
+        if self.stream:
+            return self._run_stream(messages)
+        return self._run_once(messages)
+
+    def _ordered(self) -> List[Tuple[str, BaseModelBackend]]:
+        now = time.monotonic()
+
+        def key(item: Tuple[str, BaseModelBackend]) -> Tuple[bool, float]:
+            health = get_health(item[0])
+            if health.failed_until > now:
+                return True, health.failed_until
+            return False, health.latency or 0.0
+
+        return sorted(self._backends, key=key)
+
+    def _run_once(self, messages: List[OpenAIMessage]) -> Any:
+        """Send a request that is not streamed to each backend in turn until one answers."""
+        error: Optional[Exception] = None
+        for i, (name, backend) in enumerate(self._ordered()):
+            if i:
+                with _stats_lock:
+                    self.stats.failovers += 1
+            try:
+                response = backend.run(messages)
+            except Exception as e:
+                _record_failure(name, e)
+                error = e
+                continue
+            _count(name, "won")
+            return response
+
+        with _stats_lock:
+            self.stats.failed += 1
+        raise error
+
+    def _run_stream(self, messages: List[OpenAIMessage]) -> Any:
+        ordered = self._ordered()
+        # backends without a request yet, best first
+        untried = list(ordered)
+        results: queue.Queue = queue.Queue()
+        attempts: List[_Attempt] = []
+        # the caller's request priority applies to every attempt
+        context = contextvars.copy_context()
+
+        def launch(hedge: bool, healthy: bool = False) -> bool:
+            """Send the request to the next backend it was not sent to, with `healthy` only if it is not failing."""
+            if not untried or (healthy and get_health(untried[0][0]).failed_until > time.monotonic()):
+                return False
+            name, backend = untried.pop(0)
+            attempt = _Attempt(name, backend, messages, results, hedge)
+            attempts.append(attempt)
+            _get_executor().submit(context.copy().run, attempt.run)
+            return True
+
+        launch(hedge=False)
+        hedge_at = time.monotonic() + self._hedge_delay if self._hedge_delay > 0 else None
+        pending = 1
+        while True:
+            timeout = None if hedge_at is None else max(hedge_at - time.monotonic(), 0.0)
+            try:
+                attempt, stream, error = results.get(timeout=timeout)
+            except queue.Empty:
+                # the first chunk is late, ask another backend, never the ones already busy with the request
+                hedge_at = None
+                if launch(hedge=True, healthy=True):
+                    with _stats_lock:
+                        self.stats.hedged += 1
+                    pending += 1
+                continue
+
+            pending -= 1
+            if error is None:
+                break
+            if launch(hedge=attempt.hedge):
+                with _stats_lock:
+                    self.stats.failovers += 1
+                pending += 1
+            elif not pending:
+                with _stats_lock:
+                    self.stats.failed += 1
+                raise error
+
+        if attempt.hedge:
+            with _stats_lock:
+                self.stats.hedge_wins += 1
+        _count(attempt.name, "won")
+        for other in attempts:
+            if other is not attempt and not other.failed:
+                other.cancel()
+                _count(other.name, "lost")
+        return stream
@@ -1,5 +1,28 @@
-from .tts import TTS
+from .client import get_async_client, get_sync_client
+from .scheduler import Priority, RequestScheduler, SchedulerStats, get_scheduler, request_priority
+from .stt import STT, get_stt
+from .tts import TTS, get_tts
+from .tts_cache import TTSCache, TTSCacheStats, get_tts_cache
+from .tts_codecs import AudioDecoder, create_decoder, register_decoder
+from .tts_stream import SynthesizeStream
 
 __all__ = [
-    "TTS"
+    "get_async_client",
+    "get_sync_client",
+    "Priority",
+    "RequestScheduler",
+    "SchedulerStats",
+    "get_scheduler",
+    "request_priority",
+    "STT",
+    "get_stt",
+    "TTS",
+    "get_tts",
+    "TTSCache",
+    "TTSCacheStats",
+    "get_tts_cache",
+    "AudioDecoder",
+    "create_decoder",
+    "register_decoder",
+    "SynthesizeStream",
 ]
@@ -0,0 +1,57 @@
+import os
+import threading
+from typing import Dict, Optional
+
+import httpx
+import openai
+
+from config import settings
+
+_lock = threading.Lock()
+_async_client: Optional[openai.AsyncOpenAI] = None
+_sync_clients: Dict[str, openai.OpenAI] = {}
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENAI_MAX_CONNECTIONS,
+    )
+
+
+def get_async_client() -> openai.AsyncOpenAI:
+    """
+    Return the process-wide async OpenAI client, used for TTS.
+
+    Its connection pool is shared by every room, and it does not retry: retries go through the request
+    scheduler, see `scheduler.get_scheduler`.
+    """
+    global _async_client
+    with _lock:
+        if _async_client is None:
+            _async_client = openai.AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                timeout=settings.LLM_TIMEOUT,
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=_limits()),
+            )
+        return _async_client
+
+
+def get_sync_client(base_url: str = "") -> openai.OpenAI:
+    """
+    Return the process-wide blocking OpenAI client of `base_url`, used for the LLM calls on the executor
+    threads. An empty `base_url` is the OpenAI API, or `OPENAI_API_BASE_URL`, the variable camel's own
+    client reads.
+    """
+    with _lock:
+        client = _sync_clients.get(base_url)
+        if client is None:
+            client = _sync_clients[base_url] = openai.OpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                base_url=base_url or os.environ.get("OPENAI_API_BASE_URL"),
+                timeout=settings.LLM_TIMEOUT,
+                max_retries=0,
+                http_client=httpx.Client(limits=_limits()),
+            )
+        return client
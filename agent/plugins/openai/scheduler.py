@@ -0,0 +1,353 @@
+import asyncio
+import contextlib
+import contextvars
+import enum
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterator, List, Mapping, Optional, Tuple, TypeVar
+
+import openai
+
+from config import settings
+from core.metrics import get_registry, metrics_enabled
+
+T = TypeVar("T")
+
+# seconds, waited for a request slot or backing off before a retry
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Priority(enum.IntEnum):
+    """Order in which waiting requests are sent, lower first."""
+
+    REPLY = 0
+    GREETING = 1
+    BACKGROUND = 2
+
+
+_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar("request_priority", default=Priority.REPLY)
+
+
+@contextlib.contextmanager
+def request_priority(priority: Priority) -> Iterator[None]:
+    """Send the OpenAI requests made in this block, and in the tasks it creates, with `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> Priority:
+    return _priority.get()
+
+
+class TokenBucket:
+    """
+    Allowance refilled at `per_minute` per minute, holding at most `burst` seconds of it.
+
+    `scale` slows the refill below the configured rate while the API pushes back.
+    """
+
+    def __init__(self, per_minute: float, burst: float = 10.0) -> None:
+        self.rate = per_minute / 60
+        self.capacity = max(self.rate * burst, 1.0)
+        self.scale = 1.0
+        self._level = self.capacity
+        self._updated_at = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available, amounts above the capacity only wait for a full bucket."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return max(amount - self._level, 0.0) / (self.rate * self.scale)
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self._level -= min(amount, self.capacity)
+
+    def _refill(self, now: float) -> None:
+        self._level = min(self._level + (now - self._updated_at) * self.rate * self.scale, self.capacity)
+        self._updated_at = now
+
+
+@dataclass
+class _ModelQueue:
+    requests: Optional[TokenBucket]
+    tokens: Optional[TokenBucket]
+    # no request is sent before, set from 429 responses
+    blocked_until: float = 0.0
+    # (priority, arrival, tokens, future) of the waiting requests
+    waiters: List[Tuple[int, int, int, asyncio.Future]] = field(default_factory=list)
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+    pump: Optional[asyncio.Task] = None
+
+    def buckets(self) -> List[TokenBucket]:
+        return [bucket for bucket in (self.requests, self.tokens) if bucket is not None]
+
+    def wait_time(self, tokens: int, now: float) -> float:
+        wait = self.blocked_until - now
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(1, now))
+        if self.tokens is not None and tokens:
+            wait = max(wait, self.tokens.wait_time(tokens, now))
+        return max(wait, 0.0)
+
+    def take(self, tokens: int, now: float) -> None:
+        if self.requests is not None:
+            self.requests.take(1, now)
+        if self.tokens is not None and tokens:
+            self.tokens.take(tokens, now)
+
+
+@dataclass
+class SchedulerStats:
+    requests: int = 0
+    # requests that waited for the rate limits, a backoff or requests of a higher priority
+    waited: int = 0
+    wait_time: float = 0.0
+    rate_limited: int = 0
+    retries: int = 0
+    failed: int = 0
+
+
+class RequestScheduler:
+    """
+    Sends the OpenAI requests of the process within its rate limits.
+
+    Every request waits for one request, and its estimated tokens, from the buckets of its model, see
+    `limits`. While they are empty, waiting requests are sent by priority then in arrival order, see
+    `request_priority`, so replies go before greetings and greetings before background summaries.
+
+    A 429 response blocks every request of its model for its `retry-after`, or an exponential backoff,
+    and slows the refill of the buckets, which recovers as requests succeed again. Rate limited, timed
+    out and 5xx requests are retried by the scheduler up to `max_retries` times, the OpenAI clients must
+    not retry on their own or every room would retry independently.
+
+    The scheduler runs on the event loop; `run` is called from the loop and `run_sync` from the threads
+    of blocking clients.
+
+    :param limits: Model -> (requests per minute, tokens per minute), 0 for no limit. Models without
+        limits are only held back by 429 responses.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Mapping[str, Tuple[float, float]]] = None,
+        max_retries: int = 4,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ) -> None:
+        self._limits = dict(limits or {})
+        self._max_retries = max_retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._queues: Dict[str, _ModelQueue] = {}
+        self._arrivals = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = SchedulerStats()
+
+    def attach(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """Run on `loop`, by default the running loop. Until then `run_sync` sends requests unscheduled."""
+        loop = loop or asyncio.get_running_loop()
+        if loop is not self._loop:
+            # the waiters and events of the queues belong to the previous loop
+            self._queues.clear()
+            self._loop = loop
+
+    def limits_tokens(self, model: str) -> bool:
+        """Return True if requests of `model` need their estimated tokens, counting them is not free."""
+        return bool(self._limits.get(model, (0, 0))[1])
+
+    async def run(
+        self, model: str, call: Callable[[], Awaitable[T]], tokens: int = 0, max_retries: Optional[int] = None
+    ) -> T:
+        """
+        Await `call` once `model` has room for a request of `tokens` tokens, retrying it if needed.
+
+        :param max_retries: Overrides the retries of the scheduler, e.g. 0 when the caller fails over.
+        """
+        if self._loop is not asyncio.get_running_loop():
+            self.attach()
+        priority = current_priority()
+        for attempt in itertools.count():
+            await self._acquire(model, tokens, priority)
+            try:
+                result = await call()
+            except Exception as e:
+                delay, retry = self._on_error(model, e, attempt, max_retries)
+                if delay is not None:
+                    self._back_off(model, delay, e)
+                if not retry:
+                    raise
+                continue
+            self._on_success(model)
+            return result
+
+    def run_sync(self, model: str, call: Callable[[], T], tokens: int = 0, max_retries: Optional[int] = None) -> T:
+        """Like `run`, for a blocking `call` made from a thread other than the loop's."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return call()
+
+        priority = current_priority()
+        for attempt in itertools.count():
+            asyncio.run_coroutine_threadsafe(self._acquire(model, tokens, priority), loop).result()
+            try:
+                result = call()
+            except Exception as e:
+                delay, retry = self._on_error(model, e, attempt, max_retries)
+                if delay is not None:
+                    loop.call_soon_threadsafe(self._back_off, model, delay, e)
+                if not retry:
+                    raise
+                continue
+            loop.call_soon_threadsafe(self._on_success, model)
+            return result
+
+    def _queue(self, model: str) -> _ModelQueue:
+        queue = self._queues.get(model)
+        if queue is None:
+            rpm, tpm = self._limits.get(model, (0, 0))
+            queue = self._queues[model] = _ModelQueue(
+                requests=TokenBucket(rpm) if rpm else None,
+                tokens=TokenBucket(tpm) if tpm else None,
+            )
+        return queue
+
+    async def _acquire(self, model: str, tokens: int, priority: Priority) -> None:
+        self.stats.requests += 1
+        queue = self._queue(model)
+        started_at = time.monotonic()
+        if not queue.waiters and queue.wait_time(tokens, started_at) == 0:
+            queue.take(tokens, started_at)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(queue.waiters, (priority, next(self._arrivals), tokens, future))
+        # a request of a higher priority may now be first
+        queue.wakeup.set()
+        if queue.pump is None:
+            # shared by the rooms, it must not belong to the room of the request that started it
+            queue.pump = contextvars.Context().run(asyncio.ensure_future, self._pump(queue))
+
+        await future
+        waited = time.monotonic() - started_at
+        self.stats.waited += 1
+        self.stats.wait_time += waited
+        if metrics_enabled():
+            get_registry().histogram(
+                "warda_openai_wait_seconds",
+                "Time OpenAI requests waited to be sent",
+                ("priority",),
+                buckets=WAIT_BUCKETS,
+            ).observe(waited, priority.name.lower())
+
+    async def _pump(self, queue: _ModelQueue) -> None:
+        try:
+            while queue.waiters:
+                _, _, tokens, future = queue.waiters[0]
+                if future.done():
+                    # the waiting task was cancelled
+                    heapq.heappop(queue.waiters)
+                    continue
+
+                now = time.monotonic()
+                wait = queue.wait_time(tokens, now)
+                if wait > 0:
+                    queue.wakeup.clear()
+                    with contextlib.suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(queue.wakeup.wait(), wait)
+                    continue
+
+                queue.take(tokens, now)
+                heapq.heappop(queue.waiters)
+                future.set_result(None)
+        finally:
+            queue.pump = None
+
+    def _on_error(
+        self, model: str, error: Exception, attempt: int, max_retries: Optional[int] = None
+    ) -> Tuple[Optional[float], bool]:
+        """
+        Return the seconds the requests of `model` wait before they are sent again, None if they do not
+        wait, and whether the failed request is retried.
+        """
+        if isinstance(error, openai.RateLimitError):
+            # an exhausted quota does not come back by waiting
+            if error.code == "insufficient_quota":
+                self.stats.failed += 1
+                return None, False
+            self.stats.rate_limited += 1
+            if metrics_enabled():
+                get_registry().counter(
+                    "warda_openai_rate_limited", "Requests rejected with 429 by OpenAI", ("model",)
+                ).inc(model)
+        elif not isinstance(error, (openai.APIConnectionError, openai.InternalServerError, openai.ConflictError)):
+            return None, False
+
+        delay = _retry_after(error)
+        if delay is None:
+            # full jitter, so the rooms rate limited together do not retry together
+            delay = random.uniform(0, min(self._backoff * 2 ** attempt, self._max_backoff))
+        delay = min(delay, self._max_backoff)
+        if attempt >= (self._max_retries if max_retries is None else max_retries):
+            self.stats.failed += 1
+            # the next requests of the model still wait for the rate limit
+            return (delay if isinstance(error, openai.RateLimitError) else None), False
+
+        self.stats.retries += 1
+        return delay, True
+
+    def _back_off(self, model: str, delay: float, error: Exception) -> None:
+        queue = self._queue(model)
+        queue.blocked_until = max(queue.blocked_until, time.monotonic() + delay)
+        if isinstance(error, openai.RateLimitError):
+            # multiplicative decrease, the limits were optimistic or shared with other processes
+            for bucket in queue.buckets():
+                bucket.scale = max(bucket.scale * 0.7, 0.1)
+            logging.warning("%s rate limited, holding its requests for %.2fs", model, delay)
+        queue.wakeup.set()
+
+    def _on_success(self, model: str) -> None:
+        # additive increase back to the configured rate
+        for bucket in self._queue(model).buckets():
+            bucket.scale = min(bucket.scale + 0.02, 1.0)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    for name, unit in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return max(float(value) * unit, 0.0)
+        except ValueError:
+            # an HTTP date, fall back to the backoff
+            return None
+    return None
+
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RequestScheduler:
+    """Return the process-wide scheduler, every LLM and TTS request of the rooms goes through it."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler(
+                limits={model: tuple(limit) for model, limit in settings.OPENAI_RATE_LIMITS.items()},
+                max_retries=settings.OPENAI_MAX_RETRIES,
+            )
+        return _scheduler
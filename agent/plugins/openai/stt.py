@@ -0,0 +1,84 @@
+import io
+import os
+import wave
+from typing import Optional
+
+import openai
+from livekit.agents import stt, utils
+
+from config import settings
+from .client import get_async_client
+from .scheduler import RequestScheduler, get_scheduler
+
+
+def _wav(frame) -> bytes:
+    out = io.BytesIO()
+    with wave.open(out, "wb") as f:
+        f.setnchannels(frame.num_channels)
+        f.setsampwidth(2)
+        f.setframerate(frame.sample_rate)
+        f.writeframes(frame.data)
+    return out.getvalue()
+
+
+class STT(stt.STT):
+    """
+    OpenAI speech to text, it only recognizes whole buffers: voice input sends it a speech segment once
+    it ends, see `core.voice_input.SegmentStream`.
+
+    :param scheduler: Sends the requests within the rate limits, by default the process-wide scheduler.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        client: Optional[openai.AsyncOpenAI] = None,
+        model: str = "whisper-1",
+        language: Optional[str] = None,
+        scheduler: Optional[RequestScheduler] = None,
+    ) -> None:
+        super().__init__(streaming_supported=False)
+        if client is None:
+            api_key = api_key or os.environ.get("OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY must be set")
+            client = openai.AsyncOpenAI(api_key=api_key)
+
+        self._client = client
+        self._model = model
+        self._language = language
+        self._scheduler = scheduler or get_scheduler()
+
+    async def recognize(self, *, buffer: utils.AudioBuffer, language: Optional[str] = None) -> stt.SpeechEvent:
+        frame = utils.merge_frames(buffer)
+        language = language or self._language
+        # 16-bit PCM in a WAV container, the API needs a file format and the segments are short
+        data = _wav(frame)
+        kwargs = {"language": language} if language else {}
+        result = await self._scheduler.run(
+            self._model,
+            lambda: self._client.audio.transcriptions.create(
+                model=self._model, file=("speech.wav", data, "audio/wav"), **kwargs
+            ),
+        )
+        return stt.SpeechEvent(
+            is_final=True,
+            alternatives=[
+                stt.SpeechData(
+                    language=language or "",
+                    text=result.text,
+                    end_time=frame.samples_per_channel / frame.sample_rate,
+                )
+            ],
+        )
+
+
+_stt: Optional[STT] = None
+
+
+def get_stt() -> STT:
+    """Return the process-wide STT, rooms of every agent share its OpenAI client."""
+    global _stt
+    if _stt is None:
+        _stt = STT(client=get_async_client(), model=settings.STT_MODEL, language=settings.STT_LANGUAGE or None)
+    return _stt
@@ -12,49 +12,226 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextlib
 import os
-import io
 
-from typing import Optional
+from typing import AsyncIterator, Iterator, Literal, Optional
 
-from livekit import rtc, plugins as livekit_plugins
+import numpy as np
+from livekit import rtc
 import openai
 from livekit.agents import tts
-from livekit.plugins.openai import TTSModels, TTSVoices
-from pydub import AudioSegment
+from openai._constants import STREAMED_RAW_RESPONSE_HEADER
 
+from config import settings
+from core.metrics import Stage, mark
+from core.sentence_tokenizer import SentenceTokenizer
+from .tts_cache import AudioBuffer, TTSCache, get_tts_cache
+from .tts_codecs import PCM_NUM_CHANNELS, PCM_SAMPLE_RATE, create_decoder
+from .client import get_async_client
+from .scheduler import RequestScheduler, get_scheduler
+from .tts_stream import SynthesizeStream
 
-class TTS(livekit_plugins.openai.TTS):
-    def __init__(self, api_key: Optional[str] = None) -> None:
-        super().__init__(api_key)
-        api_key = api_key or os.environ.get("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY must be set")
+# same as `livekit.plugins.openai`, which imports torch and torchaudio and would add seconds to startup
+TTSModels = Literal["tts-1", "tts-1-hd"]
+TTSVoices = Literal["alloy", "echo", "fable", "onyx", "nova", "shimmer"]
 
-        self._client = openai.AsyncOpenAI(api_key=api_key)
+
+def _pcm_frames(data: AudioBuffer, frame_ms: int) -> Iterator[rtc.AudioFrame]:
+    view = memoryview(data)
+    frame_size = PCM_SAMPLE_RATE * frame_ms // 1000 * PCM_NUM_CHANNELS * 2
+    end = len(view) - len(view) % (2 * PCM_NUM_CHANNELS)
+    for offset in range(0, end, frame_size):
+        chunk = view[offset:min(offset + frame_size, end)]
+        yield rtc.AudioFrame(
+            data=chunk,
+            sample_rate=PCM_SAMPLE_RATE,
+            num_channels=PCM_NUM_CHANNELS,
+            samples_per_channel=len(chunk) // (2 * PCM_NUM_CHANNELS),
+        )
+
+
+class TTS(tts.TTS):
+    """
+    OpenAI TTS, decoded in process to 16-bit PCM.
+
+    :param response_format: Format requested from the API, decoded by `tts_codecs.create_decoder`. `pcm`
+        needs no decoding, compressed formats trade CPU for bandwidth.
+    :param scheduler: Sends the requests within the rate limits, by default the process-wide scheduler.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        cache: Optional[TTSCache] = None,
+        client: Optional[openai.AsyncOpenAI] = None,
+        response_format: str = "pcm",
+        scheduler: Optional[RequestScheduler] = None,
+    ) -> None:
+        super().__init__(streaming_supported=True)
+        if client is None:
+            api_key = api_key or os.environ.get("OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY must be set")
+            client = openai.AsyncOpenAI(api_key=api_key)
+
+        self._client = client
+        self._cache = cache or get_tts_cache()
+        # fail on a missing codec now rather than on the first reply
+        create_decoder(response_format)
+        self._response_format = response_format
+        self._scheduler = scheduler or get_scheduler()
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """Responses being downloaded and decoded."""
+        return self._pending
 
     async def synthesize(
         self, text: str, model: TTSModels = "tts-1", voice: TTSVoices = "shimmer"
     ) -> tts.SynthesizedAudio:
-        speech_res = await self._client.audio.speech.create(
+        key = TTSCache.key(text, model, voice, PCM_SAMPLE_RATE)
+        cached = self._cache.get(key) if self._cache else None
+        mark(Stage.TTS_REQUEST)
+        if cached is not None:
+            mark(Stage.TTS_FIRST_BYTE)
+            mark(Stage.TTS_DECODE_END)
+            # the frame copies the whole utterance, `synthesize_stream` serves hits as bounded frames
+            frame = rtc.AudioFrame(
+                data=cached,
+                sample_rate=PCM_SAMPLE_RATE,
+                num_channels=PCM_NUM_CHANNELS,
+                samples_per_channel=len(cached) // (2 * PCM_NUM_CHANNELS),
+            )
+            return tts.SynthesizedAudio(text=text, data=frame)
+
+        audio = bytearray()
+        pcm = self._synthesize_pcm(text, model, voice)
+        async with contextlib.aclosing(pcm):
+            async for samples in pcm:
+                audio += memoryview(samples)
+
+        frame = rtc.AudioFrame(
+            data=audio,
+            sample_rate=PCM_SAMPLE_RATE,
+            num_channels=PCM_NUM_CHANNELS,
+            samples_per_channel=len(audio) // (2 * PCM_NUM_CHANNELS),
+        )
+        if self._cache:
+            self._cache.put(key, bytes(audio))
+
+        return tts.SynthesizedAudio(text=text, data=frame)
+
+    async def synthesize_stream(
+        self, text: str, model: TTSModels = "tts-1", voice: TTSVoices = "shimmer", frame_ms: int = 20
+    ) -> AsyncIterator[rtc.AudioFrame]:
+        """
+        Synthesize `text` and yield fixed `frame_ms` frames of PCM while the response downloads and
+        decodes, without waiting for the whole utterance.
+
+        Cached utterances are served from the TTS cache without an API call.
+        """
+        key = TTSCache.key(text, model, voice, PCM_SAMPLE_RATE)
+        cached = self._cache.get(key) if self._cache else None
+        mark(Stage.TTS_REQUEST)
+        if cached is not None:
+            mark(Stage.TTS_FIRST_BYTE)
+            mark(Stage.TTS_DECODE_END)
+            for frame in _pcm_frames(cached, frame_ms):
+                yield frame
+            return
+
+        samples_per_frame = PCM_SAMPLE_RATE * frame_ms // 1000
+        frame_size = samples_per_frame * PCM_NUM_CHANNELS * 2
+        buffer = bytearray()
+        # the whole utterance, only kept when it is going to be cached
+        audio = bytearray()
+        pcm = self._synthesize_pcm(text, model, voice)
+        async with contextlib.aclosing(pcm):
+            async for samples in pcm:
+                buffer += memoryview(samples)
+                if self._cache:
+                    audio += memoryview(samples)
+                while len(buffer) >= frame_size:
+                    yield rtc.AudioFrame(
+                        data=buffer[:frame_size],
+                        sample_rate=PCM_SAMPLE_RATE,
+                        num_channels=PCM_NUM_CHANNELS,
+                        samples_per_channel=samples_per_frame,
+                    )
+                    del buffer[:frame_size]
+
+        samples_per_channel = len(buffer) // (2 * PCM_NUM_CHANNELS)
+        if samples_per_channel:
+            yield rtc.AudioFrame(
+                data=buffer,
+                sample_rate=PCM_SAMPLE_RATE,
+                num_channels=PCM_NUM_CHANNELS,
+                samples_per_channel=samples_per_channel,
+            )
+
+        # only complete utterances are cached, cancelled or failed downloads never reach this point
+        if self._cache:
+            self._cache.put(key, bytes(audio))
+
+    async def _synthesize_pcm(self, text: str, model: TTSModels, voice: TTSVoices) -> AsyncIterator[np.ndarray]:
+        """Request `text` in the response format and yield its samples as they are decoded."""
+        decoder = create_decoder(self._response_format)
+        self._pending += 1
+        try:
+            speech_res = await self._scheduler.run(
+                model,
+                lambda: self._client.audio.speech.create(
+                    model=model,
+                    voice=voice,
+                    response_format=decoder.response_format,
+                    input=text,
+                    # stream the body instead of buffering it in the client
+                    extra_headers={STREAMED_RAW_RESPONSE_HEADER: "true"},
+                ),
+            )
+            try:
+                async for chunk in await speech_res.aiter_bytes():
+                    mark(Stage.TTS_FIRST_BYTE)
+                    samples = decoder.decode(chunk)
+                    if len(samples):
+                        yield samples
+
+                samples = decoder.flush()
+                # decoding keeps up with the download, it ends with the body
+                mark(Stage.TTS_DECODE_END)
+                if len(samples):
+                    yield samples
+            finally:
+                await speech_res.aclose()
+        finally:
+            self._pending -= 1
+
+    def stream(
+        self,
+        model: TTSModels = "tts-1",
+        voice: TTSVoices = "shimmer",
+        frame_ms: int = 20,
+        max_concurrency: int = 3,
+        tokenizer: Optional[SentenceTokenizer] = None,
+    ) -> SynthesizeStream:
+        return SynthesizeStream(
+            self,
+            tokenizer or SentenceTokenizer(),
             model=model,
             voice=voice,
-            response_format="mp3",
-            input=text,
+            frame_ms=frame_ms,
+            max_concurrency=max_concurrency,
         )
 
-        data = await speech_res.aread()
-        tensor = AudioSegment.from_mp3(io.BytesIO(data))
 
-        sample_rate = tensor.frame_rate
-        num_channels = tensor.channels
-        samples_per_channel = len(tensor.raw_data) // 2
+_tts: Optional[TTS] = None
 
-        frame = rtc.AudioFrame(
-            data=tensor.raw_data,
-            sample_rate=sample_rate,
-            num_channels=num_channels,
-            samples_per_channel=samples_per_channel,
-        )
 
-        return tts.SynthesizedAudio(text=text, data=frame)
+def get_tts() -> TTS:
+    """Return the process-wide TTS, rooms of every agent share its OpenAI client and cache."""
+    global _tts
+    if _tts is None:
+        _tts = TTS(client=get_async_client(), response_format=settings.TTS_RESPONSE_FORMAT)
+    return _tts
@@ -0,0 +1,198 @@
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from config import settings
+
+AudioBuffer = Union[bytes, memoryview]
+
+
+@dataclass
+class TTSCacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    disk_evictions: int = 0
+    memory_bytes: int = 0
+    disk_bytes: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized 16-bit PCM.
+
+    Entries are kept in a size-bounded in-memory LRU and written through to `disk_dir` as raw PCM
+    files. Disk hits are memory-mapped rather than read. `TTS.synthesize_stream` serves a hit as
+    bounded frames, each `rtc.AudioFrame` copying only its own slice, so a cached utterance costs no
+    API call, no decode and no copy of the whole file. `TTS.synthesize` returns the utterance as one
+    frame, which copies all of it.
+
+    :param memory_limit: Maximum bytes of PCM kept in memory.
+    :param disk_dir: Directory of the on-disk tier, `None` disables it.
+    :param disk_limit: Maximum bytes of PCM kept on disk.
+    """
+
+    def __init__(self, memory_limit: int, disk_dir: Optional[str] = None, disk_limit: int = 0) -> None:
+        self._memory_limit = memory_limit
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._disk_dir = disk_dir
+        self._disk_limit = disk_limit
+        # digest -> file size, in least recently used order
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self.stats = TTSCacheStats()
+
+        if self._disk_dir:
+            self._load_disk_index()
+
+    @staticmethod
+    def key(text: str, model: str, voice: str, sample_rate: int) -> str:
+        h = hashlib.sha256()
+        for part in (text, model, voice, str(sample_rate)):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[AudioBuffer]:
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.stats.memory_hits += 1
+            return data
+
+        data = self._get_disk(key)
+        if data is not None:
+            self.stats.disk_hits += 1
+            return data
+
+        self.stats.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes) -> None:
+        if not data:
+            return
+
+        self._put_memory(key, data)
+        if self._disk_dir:
+            try:
+                self._put_disk(key, data)
+            except OSError as e:
+                logging.warning("failed to write tts cache entry %s: %s", key, e)
+
+    def clear(self) -> None:
+        self._memory.clear()
+        self.stats.memory_bytes = 0
+
+    def _put_memory(self, key: str, data: bytes) -> None:
+        if len(data) > self._memory_limit:
+            return
+
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self.stats.memory_bytes -= len(old)
+
+        self._memory[key] = data
+        self.stats.memory_bytes += len(data)
+
+        while self.stats.memory_bytes > self._memory_limit:
+            _, evicted = self._memory.popitem(last=False)
+            self.stats.memory_bytes -= len(evicted)
+            self.stats.evictions += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._disk_dir, f"{key}.pcm")
+
+    def _load_disk_index(self) -> None:
+        os.makedirs(self._disk_dir, exist_ok=True)
+
+        entries = []
+        for name in os.listdir(self._disk_dir):
+            if not name.endswith(".pcm"):
+                continue
+            st = os.stat(os.path.join(self._disk_dir, name))
+            entries.append((st.st_mtime, name[:-len(".pcm")], st.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self.stats.disk_bytes += size
+
+        self._evict_disk()
+
+    def _get_disk(self, key: str) -> Optional[memoryview]:
+        if key not in self._disk:
+            return None
+
+        try:
+            with open(self._path(key), "rb") as f:
+                # the mapping stays valid after the file is closed
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            logging.warning("failed to map tts cache entry %s: %s", key, e)
+            self.stats.disk_bytes -= self._disk.pop(key)
+            return None
+
+        self._disk.move_to_end(key)
+        return memoryview(mapped)
+
+    def _put_disk(self, key: str, data: bytes) -> None:
+        if len(data) > self._disk_limit:
+            return
+
+        # write to a temporary file first so readers, possibly in other worker processes, never map a
+        # partially written entry
+        fd, tmp_path = tempfile.mkstemp(dir=self._disk_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        self.stats.disk_bytes -= self._disk.pop(key, 0)
+        self._disk[key] = len(data)
+        self.stats.disk_bytes += len(data)
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        while self.stats.disk_bytes > self._disk_limit and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self.stats.disk_bytes -= size
+            self.stats.disk_evictions += 1
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+
+_cache: Optional[TTSCache] = None
+
+
+def get_tts_cache() -> Optional[TTSCache]:
+    """Return the process-wide TTS cache, or `None` if caching is disabled."""
+    global _cache
+    if not settings.TTS_CACHE_ENABLED:
+        return None
+
+    if _cache is None:
+        _cache = TTSCache(
+            memory_limit=settings.TTS_CACHE_MEMORY_BYTES,
+            disk_dir=settings.TTS_CACHE_DIR or None,
+            disk_limit=settings.TTS_CACHE_DISK_BYTES,
+        )
+    return _cache
@@ -0,0 +1,253 @@
+import struct
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from core.audio_output import Resampler
+
+# OpenAI `pcm` responses are raw 24kHz 16-bit signed little-endian mono, every decoder outputs this format
+PCM_SAMPLE_RATE = 24000
+PCM_NUM_CHANNELS = 1
+
+_EMPTY = np.empty(0, dtype=np.int16)
+
+
+class SampleBuffer:
+    """
+    Growable buffer of 16-bit samples, reused between `take` calls so decoding a chunk does not
+    allocate once the buffer is large enough.
+    """
+
+    def __init__(self, capacity: int = 4096) -> None:
+        self._data = np.empty(capacity, dtype=np.int16)
+        self._size = 0
+
+    def write(self, samples: np.ndarray) -> None:
+        end = self._size + len(samples)
+        if end > len(self._data):
+            data = np.empty(max(end, 2 * len(self._data)), dtype=np.int16)
+            data[:self._size] = self._data[:self._size]
+            self._data = data
+        self._data[self._size:end] = samples
+        self._size = end
+
+    def take(self) -> np.ndarray:
+        """Return the samples written so far and empty the buffer, the view is valid until the next `write`."""
+        samples = self._data[:self._size]
+        self._size = 0
+        return samples
+
+
+class AudioDecoder(ABC):
+    """
+    Incremental decoder of a TTS response body into 16-bit PCM at `PCM_SAMPLE_RATE` and `PCM_NUM_CHANNELS`.
+
+    `decode` is fed the body chunk by chunk while it downloads and returns the samples decoded so far,
+    possibly none. The returned array may be a view of a buffer reused by the next call. A decoder
+    decodes a single response.
+    """
+
+    # the `response_format` requested from the API
+    response_format: str
+
+    @abstractmethod
+    def decode(self, chunk: bytes) -> np.ndarray:
+        ...
+
+    def flush(self) -> np.ndarray:
+        """Return the samples still buffered once the body ended."""
+        return _EMPTY
+
+
+class PCMDecoder(AudioDecoder):
+    """Raw interleaved 16-bit PCM, returned without copying when it already is in the output format."""
+
+    response_format = "pcm"
+
+    def __init__(self, sample_rate: int = PCM_SAMPLE_RATE, num_channels: int = PCM_NUM_CHANNELS) -> None:
+        self._frame_size = 2 * num_channels
+        # bytes of a sample frame split between two chunks
+        self._partial = b""
+        self._resampler = Resampler(sample_rate, num_channels, PCM_SAMPLE_RATE, PCM_NUM_CHANNELS)
+
+    def decode(self, chunk: bytes) -> np.ndarray:
+        if self._partial:
+            chunk = self._partial + chunk
+        end = len(chunk) - len(chunk) % self._frame_size
+        self._partial = bytes(chunk[end:])
+        samples = np.frombuffer(chunk, dtype=np.int16, count=end // 2)
+        return samples if self._resampler.passthrough else self._resampler.push(samples)
+
+
+class WAVDecoder(AudioDecoder):
+    """16-bit PCM WAV, the header is parsed as it arrives and the data chunk decoded as raw PCM."""
+
+    response_format = "wav"
+
+    def __init__(self) -> None:
+        self._header = bytearray()
+        self._pcm: Optional[PCMDecoder] = None
+
+    def decode(self, chunk: bytes) -> np.ndarray:
+        if self._pcm is None:
+            self._header += chunk
+            data = self._parse_header()
+            if data is None:
+                return _EMPTY
+            chunk = data
+        return self._pcm.decode(chunk)
+
+    def _parse_header(self) -> Optional[bytes]:
+        """Return the bytes following the header once it is complete."""
+        header = self._header
+        if len(header) < 12:
+            return None
+        if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            raise ValueError("not a WAV stream")
+
+        fmt = None
+        offset = 12
+        while len(header) >= offset + 8:
+            chunk_id, size = struct.unpack_from("<4sI", header, offset)
+            if chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError("WAV data chunk before the fmt chunk")
+                # streamed responses do not know the size of the data chunk, it runs to the end of the body
+                data = bytes(header[offset + 8:])
+                self._pcm = PCMDecoder(*fmt)
+                self._header = bytearray()
+                return data
+
+            if chunk_id == b"fmt ":
+                if len(header) < offset + 24:
+                    return None
+                audio_format, num_channels, sample_rate, _, _, bits = struct.unpack_from("<HHIIHH", header, offset + 8)
+                # PCM or WAVE_FORMAT_EXTENSIBLE
+                if audio_format not in (1, 0xFFFE) or bits != 16:
+                    raise ValueError(f"unsupported WAV format {audio_format} with {bits} bits per sample")
+                fmt = (sample_rate, num_channels)
+            # chunks are padded to an even size
+            offset += 8 + size + size % 2
+        return None
+
+
+class PyAVDecoder(AudioDecoder):
+    """
+    Compressed audio decoded in process by the FFmpeg libraries bundled with PyAV, instead of an
+    ffmpeg subprocess per utterance. PyAV is optional, it is only needed for these formats.
+    """
+
+    def __init__(self, codec: str = "mp3") -> None:
+        try:
+            import av
+        except ImportError as e:
+            raise RuntimeError(f"decoding {codec} requires PyAV, install it with `pip install av`") from e
+
+        self.response_format = codec
+        self._av = av
+        self._codec = av.CodecContext.create(codec, "r")
+        self._resampler = av.AudioResampler(format="s16", layout="mono", rate=PCM_SAMPLE_RATE)
+        self._out = SampleBuffer()
+
+    def decode(self, chunk: bytes) -> np.ndarray:
+        for packet in self._codec.parse(chunk):
+            self._decode(packet)
+        return self._out.take()
+
+    def flush(self) -> np.ndarray:
+        for packet in self._codec.parse(None):
+            self._decode(packet)
+        self._decode(None)
+        self._resample(None)
+        return self._out.take()
+
+    def _decode(self, packet) -> None:
+        for frame in self._codec.decode(packet):
+            self._resample(frame)
+
+    def _resample(self, frame) -> None:
+        for out in self._resampler.resample(frame):
+            self._out.write(out.to_ndarray().reshape(-1))
+
+
+class OggPackets:
+    """Reassembles the packets of a single logical Ogg stream from its pages."""
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        # packet continued on the next page
+        self._packet = bytearray()
+
+    def push(self, chunk: bytes) -> List[bytes]:
+        self._buffer += chunk
+        packets = []
+        while len(self._buffer) >= 27:
+            if self._buffer[:4] != b"OggS":
+                raise ValueError("not an Ogg stream")
+            header_size = 27 + self._buffer[26]
+            if len(self._buffer) < header_size:
+                break
+            lacing = self._buffer[27:header_size]
+            page_size = header_size + sum(lacing)
+            if len(self._buffer) < page_size:
+                break
+
+            offset = header_size
+            for size in lacing:
+                self._packet += self._buffer[offset:offset + size]
+                offset += size
+                # a segment shorter than 255 bytes ends its packet
+                if size < 255:
+                    packets.append(bytes(self._packet))
+                    self._packet.clear()
+            del self._buffer[:page_size]
+        return packets
+
+
+class OpusDecoder(PyAVDecoder):
+    """Ogg Opus, the OpenAI `opus` format, demuxed here and decoded by PyAV."""
+
+    def __init__(self) -> None:
+        super().__init__("opus")
+        self._pages = OggPackets()
+        self._headers = 0
+
+    def decode(self, chunk: bytes) -> np.ndarray:
+        for packet in self._pages.push(chunk):
+            if self._headers == 0:
+                # OpusHead configures the decoder, it must be set before the first packet is decoded
+                self._codec.extradata = packet
+            if self._headers < 2:
+                # OpusHead then OpusTags
+                self._headers += 1
+                continue
+            self._decode(self._av.Packet(packet))
+        return self._out.take()
+
+    def flush(self) -> np.ndarray:
+        self._decode(None)
+        self._resample(None)
+        return self._out.take()
+
+
+DecoderFactory = Callable[[], AudioDecoder]
+
+_decoders: Dict[str, DecoderFactory] = {
+    "pcm": PCMDecoder,
+    "wav": WAVDecoder,
+    "mp3": lambda: PyAVDecoder("mp3"),
+    "opus": OpusDecoder,
+}
+
+
+def register_decoder(response_format: str, factory: DecoderFactory) -> None:
+    """Decode responses of `response_format` with the decoders created by `factory`."""
+    _decoders[response_format] = factory
+
+
+def create_decoder(response_format: str) -> AudioDecoder:
+    factory = _decoders.get(response_format)
+    if factory is None:
+        raise ValueError(f"no decoder for response format {response_format!r}")
+    return factory()
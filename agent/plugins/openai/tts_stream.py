@@ -0,0 +1,142 @@
+import asyncio
+import contextlib
+import logging
+from typing import TYPE_CHECKING, Optional, Set, Tuple
+
+from livekit.agents import tokenize, tts
+
+if TYPE_CHECKING:
+    from .tts import TTS
+
+# (sentence, frames of that sentence terminated by None)
+_Segment = Tuple[str, "asyncio.Queue"]
+
+
+class SynthesizeStream(tts.SynthesizeStream):
+    """
+    Sentence-chunked streaming synthesis.
+
+    Text pushed with `push_text` is split into sentences, up to `max_concurrency` sentences are
+    synthesized at the same time, and the resulting frames are emitted strictly in sentence order
+    as soon as they arrive. Iteration ends after `end_input` once every sentence has been emitted.
+
+    Synthesis runs at most `max_concurrency` sentences, and `frames_ahead` frames per sentence, ahead
+    of the consumer, so a long reply or a slow consumer does not buffer all of its audio.
+    """
+
+    def __init__(
+        self,
+        tts_: "TTS",
+        tokenizer: tokenize.SentenceTokenizer,
+        model: str,
+        voice: str,
+        frame_ms: int = 20,
+        max_concurrency: int = 3,
+        frames_ahead: int = 50,
+    ) -> None:
+        super().__init__()
+        self._tts = tts_
+        self._sentences = tokenizer.stream()
+        self._model = model
+        self._voice = voice
+        self._frame_ms = frame_ms
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._max_concurrency = max_concurrency
+        self._frames_ahead = frames_ahead
+        self._event_queue: asyncio.Queue[Optional[tts.SynthesisEvent]] = asyncio.Queue(frames_ahead)
+        self._closed = False
+
+        self._main_task = asyncio.create_task(self._run())
+
+        def log_exception(task: asyncio.Task) -> None:
+            if not task.cancelled() and task.exception():
+                logging.error("tts stream task failed: %s", task.exception(), exc_info=task.exception())
+
+        self._main_task.add_done_callback(log_exception)
+
+    def push_text(self, token: str) -> None:
+        self._sentences.push_text(token)
+
+    async def flush(self) -> None:
+        await self._sentences.flush()
+
+    async def end_input(self) -> None:
+        """Mark the end of the text, the pending partial sentence is synthesized as well."""
+        await self._sentences.aclose()
+
+    async def aclose(self) -> None:
+        """Stop synthesis immediately and end the iteration, queued text is discarded."""
+        await self._sentences.aclose()
+        self._main_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._main_task
+
+    async def __anext__(self) -> tts.SynthesisEvent:
+        # the end of the stream is not queued when the queue was full, it ends once drained
+        if (self._closed or self._main_task.done()) and self._event_queue.empty():
+            raise StopAsyncIteration
+
+        event = await self._event_queue.get()
+        if event is None:
+            self._closed = True
+            raise StopAsyncIteration
+        return event
+
+    async def _run(self) -> None:
+        # sentences waiting for the one being played, the next sentences are read once there is room
+        segments: asyncio.Queue[Optional[_Segment]] = asyncio.Queue(self._max_concurrency)
+        tasks: Set[asyncio.Task] = set()
+        player = asyncio.create_task(self._play(segments))
+        try:
+            async for sentence in self._sentences:
+                frames: asyncio.Queue = asyncio.Queue(self._frames_ahead)
+                await segments.put((sentence.text, frames))
+                # the semaphore is FIFO, so earlier sentences always get a synthesis slot first
+                task = asyncio.create_task(self._synthesize(sentence.text, frames))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            await segments.put(None)
+            await player
+        finally:
+            player.cancel()
+            for task in list(tasks):
+                task.cancel()
+            with contextlib.suppress(asyncio.QueueFull):
+                self._event_queue.put_nowait(None)
+
+    async def _synthesize(self, text: str, frames: asyncio.Queue) -> None:
+        try:
+            async with self._semaphore:
+                frame_stream = self._tts.synthesize_stream(
+                    text, model=self._model, voice=self._voice, frame_ms=self._frame_ms
+                )
+                # close the HTTP response right away when cancelled instead of when garbage collected
+                async with contextlib.aclosing(frame_stream):
+                    async for frame in frame_stream:
+                        # waits while the frames of this sentence are far enough ahead of playback
+                        await frames.put(frame)
+        except asyncio.CancelledError:
+            # the player is cancelled too, nobody waits for the end of the sentence
+            raise
+        except Exception as e:
+            logging.error("failed to synthesize sentence %r: %s", text, e, exc_info=e)
+        await frames.put(None)
+
+    async def _play(self, segments: asyncio.Queue) -> None:
+        started = False
+        while (segment := await segments.get()) is not None:
+            text, frames = segment
+            while (frame := await frames.get()) is not None:
+                if not started:
+                    started = True
+                    await self._event_queue.put(tts.SynthesisEvent(type=tts.SynthesisEventType.STARTED))
+                await self._event_queue.put(
+                    tts.SynthesisEvent(
+                        type=tts.SynthesisEventType.AUDIO,
+                        audio=tts.SynthesizedAudio(text=text, data=frame),
+                    )
+                )
+
+        if started:
+            await self._event_queue.put(tts.SynthesisEvent(type=tts.SynthesisEventType.FINISHED))
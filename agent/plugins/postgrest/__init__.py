@@ -1,5 +1,8 @@
-from .postgrest import postgrest_client
+from .postgrest import PostgrestClient, get_postgrest_client, open_postgrest_client, close_postgrest_client
 
 __all__ = [
-    "postgrest_client"
+    "PostgrestClient",
+    "get_postgrest_client",
+    "open_postgrest_client",
+    "close_postgrest_client",
 ]
@@ -1,5 +1,106 @@
+import asyncio
+import logging
+import random
+import weakref
+from typing import Dict, Union
+
+import httpx
 from postgrest import AsyncPostgrestClient
 
 from config import settings
 
-postgrest_client = AsyncPostgrestClient(settings.POSTGREST_URL)
+# only requests that are safe to send twice are retried
+_IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+_RETRY_STATUS_CODES = frozenset({502, 503, 504})
+
+
+class RetryTransport(httpx.AsyncBaseTransport):
+    """
+    Retries idempotent requests on transport errors, timeouts and gateway errors, sleeping a random
+    "full jitter" exponential backoff between attempts.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, retries: int, backoff: float) -> None:
+        self._transport = transport
+        self._retries = retries
+        self._backoff = backoff
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        retryable = request.method in _IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                response = await self._transport.handle_async_request(request)
+            except httpx.TransportError as e:
+                if not retryable or attempt >= self._retries:
+                    raise
+                logging.warning("PostgREST request %s %s failed, retrying: %s", request.method, request.url, e)
+            else:
+                if not retryable or attempt >= self._retries or response.status_code not in _RETRY_STATUS_CODES:
+                    return response
+                logging.warning(
+                    "PostgREST request %s %s returned %d, retrying", request.method, request.url, response.status_code
+                )
+                await response.aclose()
+
+            await asyncio.sleep(random.uniform(0, self._backoff * 2 ** attempt))
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class PostgrestClient(AsyncPostgrestClient):
+    """`AsyncPostgrestClient` with a bounded keep-alive connection pool, timeouts and read retries."""
+
+    def create_session(
+        self,
+        base_url: str,
+        headers: Dict[str, str],
+        timeout: Union[int, float, httpx.Timeout],
+    ) -> httpx.AsyncClient:
+        transport = httpx.AsyncHTTPTransport(
+            http2=settings.POSTGREST_HTTP2,
+            limits=httpx.Limits(
+                max_connections=settings.POSTGREST_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.POSTGREST_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.POSTGREST_KEEPALIVE_EXPIRY,
+            ),
+        )
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            transport=RetryTransport(
+                transport, retries=settings.POSTGREST_READ_RETRIES, backoff=settings.POSTGREST_RETRY_BACKOFF
+            ),
+        )
+
+
+# httpx clients must not be shared between event loops, keep one per loop
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, PostgrestClient]" = weakref.WeakKeyDictionary()
+
+
+def get_postgrest_client() -> PostgrestClient:
+    """Return the PostgREST client of the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = PostgrestClient(
+            settings.POSTGREST_URL,
+            timeout=httpx.Timeout(settings.POSTGREST_READ_TIMEOUT, connect=settings.POSTGREST_CONNECT_TIMEOUT),
+        )
+        _clients[loop] = client
+    return client
+
+
+async def open_postgrest_client() -> PostgrestClient:
+    """Create the client of the running loop ahead of the first query, call when the worker starts."""
+    return get_postgrest_client()
+
+
+async def close_postgrest_client() -> None:
+    """Close the client of the running loop and its pooled connections, call when the worker stops."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -1,4 +1,4 @@
-from .service import Service
+from .service import Service, ServiceManager
 from .agent_config.service import AgentService
 
 __all__ = [
@@ -12,4 +12,4 @@ current_module = sys.modules[__name__]
 for _module_name in __all__:
     _module_class = getattr(current_module, _module_name)
     if _module_class and _module_class != Service and issubclass(_module_class, Service):
-        _module_class()
+        ServiceManager.register_service(_module_class)
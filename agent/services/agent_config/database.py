@@ -1,40 +1,134 @@
-from typing import Optional
+from datetime import datetime
+from typing import Optional, Tuple
 
-from postgrest import APIResponse
+from postgrest import APIError, APIResponse
 
-from plugins.postgrest import postgrest_client
+from config import settings
+from core.ttl_cache import AsyncTTLCache
+from plugins.postgrest import get_postgrest_client
 from services.agent_config.model import AgentConfigTable, AgentConfigPayload
 
 _TABLE = "agent"
+_UPDATE_FUNCTION = "update_agent_config"
+# PostgREST error of a function missing from its schema cache
+_FUNCTION_NOT_FOUND = "PGRST202"
 
+# keyed by ("agent_id", <id>) and ("agent_name", <name>), every loaded config is stored under both
+_cache: AsyncTTLCache[Tuple[str, str], AgentConfigPayload] = AsyncTTLCache(ttl=settings.AGENT_CONFIG_CACHE_TTL)
 
-async def get_agent_config(agent_id: Optional[str] = None, agent_name: Optional[str] = None) -> AgentConfigPayload:
-    if not agent_id and not agent_name:
-        raise ValueError("Either agent_id or agent_name must be provided")
 
+async def _fetch_agent_config(agent_id: Optional[str] = None, agent_name: Optional[str] = None) -> AgentConfigPayload:
     result = {}
 
     if agent_id:
-        r: APIResponse = await postgrest_client.from_(_TABLE).select("*").eq("agent_id", agent_id).execute()
+        r: APIResponse = await get_postgrest_client().from_(_TABLE).select("*").eq("agent_id", agent_id).execute()
         result = r.data[0] if r.data else {}
     elif agent_name:
-        r: APIResponse = await postgrest_client.from_(_TABLE).select("*").eq("agent_name", agent_name).execute()
+        r: APIResponse = await get_postgrest_client().from_(_TABLE).select("*").eq("agent_name", agent_name).execute()
         result = r.data[0] if r.data else {}
 
     agent_config_table: AgentConfigTable = AgentConfigTable.model_validate(result)
     return AgentConfigPayload.model_validate_table(agent_config_table)
 
 
+class AgentConfigConflictError(Exception):
+    pass
+
+
+class AgentConfigFunctionMissingError(Exception):
+    pass
+
+
+def _cache_agent_config(agent_config_payload: AgentConfigPayload) -> None:
+    _cache.set(("agent_id", agent_config_payload.agent_id), agent_config_payload)
+    _cache.set(("agent_name", agent_config_payload.agent_name), agent_config_payload)
+
+
+def invalidate_agent_config(agent_id: Optional[str] = None, agent_name: Optional[str] = None) -> None:
+    if agent_id:
+        _cache.invalidate(("agent_id", agent_id))
+    if agent_name:
+        _cache.invalidate(("agent_name", agent_name))
+
+
+async def get_agent_config(
+    agent_id: Optional[str] = None, agent_name: Optional[str] = None, use_cache: bool = True
+) -> AgentConfigPayload:
+    """
+    Fetch an agent config by id or name.
+
+    Results are cached process-wide for `AGENT_CONFIG_CACHE_TTL` seconds and concurrent lookups of
+    the same agent share a single query, so many rooms joining at once cost one round trip.
+    """
+    if not agent_id and not agent_name:
+        raise ValueError("Either agent_id or agent_name must be provided")
+
+    if not use_cache:
+        return await _fetch_agent_config(agent_id=agent_id, agent_name=agent_name)
+
+    async def load() -> AgentConfigPayload:
+        agent_config_payload = await _fetch_agent_config(agent_id=agent_id, agent_name=agent_name)
+        _cache_agent_config(agent_config_payload)
+        return agent_config_payload
+
+    key = ("agent_id", agent_id) if agent_id else ("agent_name", agent_name)
+    agent_config_payload: AgentConfigPayload = await _cache.get_or_load(key, load)
+    # callers get their own copy, the cached instance is shared
+    return agent_config_payload.model_copy()
+
+
 async def update_agent_config(agent_id: str, agent_config_payload: AgentConfigPayload) -> AgentConfigPayload:
-    old_agent_config_payload: AgentConfigPayload = await get_agent_config(agent_id=agent_id)
-    data_dict: dict = agent_config_payload.model_dump(exclude_unset=True, exclude_none=True)
-    updated_agent_config_payload: AgentConfigPayload = old_agent_config_payload.copy(update=data_dict)
+    """
+    Write the fields set on `agent_config_payload` in a single request and return the stored config.
 
-    agent_config_table: AgentConfigTable = AgentConfigTable.model_validate_payload(updated_agent_config_payload)
-    data = agent_config_table.model_dump(by_alias=True, exclude_unset=True, exclude_none=True)
+    Unset fields keep their stored values and model parameters are merged into the stored
+    `model_config`. If the payload carries `updated_at`, the update only applies when the row has not
+    been modified since.
 
-    r: APIResponse = await postgrest_client.from_(_TABLE).update(data).eq("agent_id", agent_id).execute()
-    result = r.data[0] if r.data else {}
+    :raises AgentConfigConflictError: If the row was modified after `updated_at`.
+    :raises AgentConfigFunctionMissingError: If the database lacks the `update_agent_config` function.
+    """
+    expected_updated_at = agent_config_payload.updated_at
+    updated_agent_config_payload = await _update_agent(
+        agent_id, agent_config_payload.model_dump_table_changes(), expected_updated_at
+    )
+    if updated_agent_config_payload is None:
+        if expected_updated_at:
+            raise AgentConfigConflictError(f"Agent config {agent_id} was modified after {expected_updated_at}")
+        raise ValueError(f"Agent config not found for agent {agent_id}")
+    return updated_agent_config_payload
 
-    agent_config_table: AgentConfigTable = AgentConfigTable.model_validate(result)
-    return AgentConfigPayload.model_validate_table(agent_config_table)
+
+async def update_agent_memory(agent_id: str, memory: str) -> Optional[AgentConfigPayload]:
+    """Store the conversation summary of the agent, returns None if the agent does not exist."""
+    return await _update_agent(agent_id, {"memory": memory})
+
+
+async def _update_agent(
+    agent_id: str, changes: dict, expected_updated_at: Optional[datetime] = None
+) -> Optional[AgentConfigPayload]:
+    params = {
+        "p_agent_id": agent_id,
+        "p_changes": changes,
+        "p_expected_updated_at": expected_updated_at.isoformat() if expected_updated_at else None,
+    }
+
+    invalidate_agent_config(agent_id=agent_id)
+    try:
+        r: APIResponse = await get_postgrest_client().rpc(_UPDATE_FUNCTION, params).execute()
+    except APIError as e:
+        if e.code == _FUNCTION_NOT_FOUND:
+            # databases created before the function existed, the initdb scripts only run on new volumes
+            raise AgentConfigFunctionMissingError(
+                f"the database has no {_UPDATE_FUNCTION} function, apply postgrest/initdb/update-agent-config.sql"
+            ) from e
+        raise
+    if not r.data:
+        return None
+
+    agent_config_table: AgentConfigTable = AgentConfigTable.model_validate(r.data[0])
+    updated_agent_config_payload = AgentConfigPayload.model_validate_table(agent_config_table)
+    # discard reads that raced with the write, then serve the returned row without another round trip
+    invalidate_agent_config(agent_id=agent_id, agent_name=updated_agent_config_payload.agent_name)
+    _cache_agent_config(updated_agent_config_payload)
+    return updated_agent_config_payload
@@ -8,7 +8,8 @@ from utils.utils import generate_random_base62
 
 class ModelConfig(BaseModel):
     temperature: Optional[float] = 1
-    max_tokens: Optional[int] = 16
+    # same default as `AgentConfigPayload.max_tokens`, the config is applied to the LLM calls
+    max_tokens: Optional[int] = 200
     top_p: Optional[float] = 1
 
 
@@ -40,6 +41,7 @@ class AgentConfigTable(BaseModel):
             system_message=agent_config_payload.system_message,
             system_message_limit=agent_config_payload.system_message_limit,
             model_type=agent_config_payload.model,
+            model_platform=agent_config_payload.platform or "OpenAI",
             model_config=model_config.model_dump_json(),
             memory_limit=agent_config_payload.memory_limit,
         )
@@ -52,10 +54,33 @@ class AgentConfigPayload(BaseModel):
     system_message: Optional[str] = Field(None, alias="systemMessage")
     system_message_limit: Optional[int] = Field(500, alias="systemMessageLimit")
     model: Optional[str] = Field(None, alias="modelType")
+    # selects the LLM backends the model is requested from, see `LLM_PLATFORMS`
+    platform: Optional[str] = Field(None, alias="modelPlatform")
     memory_limit: Optional[int] = Field(None, alias="dialogRound")
     temperature: Optional[float] = Field(1)
     max_tokens: Optional[int] = Field(200, alias="outputLimit")
     top_p: Optional[float] = Field(1, alias="topP")
+    # version of the stored row, sending it back makes the update fail if the row changed meanwhile
+    updated_at: Optional[datetime] = Field(None, alias="updatedAt")
+    # rolling summary of past conversations, internal to the agent and never sent to clients
+    memory: Optional[str] = Field(None, exclude=True)
+
+    def model_dump_table_changes(self) -> dict:
+        """
+        Return the explicitly set fields as `agent` table columns, with `model_config` holding only the
+        set model parameters so they can be merged into the stored JSON.
+        """
+        data = self.model_dump(exclude_unset=True, exclude_none=True)
+
+        changes = {}
+        for field, column in _PAYLOAD_TABLE_COLUMNS.items():
+            if field in data:
+                changes[column] = data[field]
+
+        model_config = {field: data[field] for field in ModelConfig.model_fields if field in data}
+        if model_config:
+            changes["model_config"] = model_config
+        return changes
 
     @classmethod
     def model_validate_table(cls, agent_config_table: AgentConfigTable) -> "AgentConfigPayload":
@@ -67,9 +92,23 @@ class AgentConfigPayload(BaseModel):
             systemMessage=agent_config_table.system_message,
             systemMessageLimit=agent_config_table.system_message_limit,
             modelType=agent_config_table.llm_model,
+            modelPlatform=agent_config_table.llm_model_platform,
             dialogRound=agent_config_table.memory_limit,
             temperature=model_config.temperature,
             outputLimit=model_config.max_tokens,
             topP=model_config.top_p,
+            updatedAt=agent_config_table.updated_at,
+            memory=agent_config_table.memory,
         )
         return agent_config_payload
+
+
+# AgentConfigPayload fields stored in their own `agent` column
+_PAYLOAD_TABLE_COLUMNS = {
+    "agent_name": "agent_name",
+    "system_message": "system_message",
+    "system_message_limit": "system_message_limit",
+    "model": "model_type",
+    "platform": "model_platform",
+    "memory_limit": "memory_limit",
+}
@@ -1,43 +1,57 @@
 import logging
+from typing import Optional
 
-from .database import update_agent_config, get_agent_config
-from ..service import ServiceMessage, Service, TypedQueue
+from config import settings
+from plugins.camel.executor import run_blocking
+
+from .database import AgentConfigConflictError, update_agent_config, get_agent_config
+from ..service import ServiceMessage, Service
 from .model import AgentConfigPayload
 
 
 class AgentService(Service):
-    def __init__(self):
-        super().__init__("agent-config-topic")
-        self._queue: TypedQueue[AgentConfigPayload] = TypedQueue()
-
-        self.on("service_attached", self.service_attached)
-
-    def close(self):
-        super().close()
-        self.off("service_attached", self.service_attached)
-
-    def service_attached(self):
-        self._ctx.create_task(self.agent_config_worker())
-
-    def service_received(self, msg: "ServiceMessage"):
-        self._queue.put_nowait(msg.message)
-
-    async def send_agent_config(self):
-        agent_config: AgentConfigPayload = await get_agent_config(agent_name=self._lp.name)
-        await self.send_message(agent_config.model_dump_json(by_alias=True))
-
-    async def agent_config_worker(self):
-        while True:
-            msg_message: str = await self._queue.get()
-            agent_config_req: AgentConfigPayload = AgentConfigPayload.model_validate_json(msg_message)
-            try:
-                # save the agent config and return the updated agent config.
-                updated_agent_config = await update_agent_config(agent_config_req.agent_id, agent_config_req)
-
-                if agent_config_req.system_message:
-                    self._chat_agent.init_agent(agent_config_req.system_message)
-                await self.send_message(updated_agent_config.model_dump_json(by_alias=True))
-            except Exception as e:
-                logging.error("Failed to process agent config: %s", e, exc_info=e)
-            finally:
-                self._queue.task_done()
+    TOPIC = "agent-config-topic"
+
+    async def service_received(self, msg: "ServiceMessage"):
+        # scheduled by the emitter one message at a time, so updates are applied in arrival order
+        await self.update_agent_config(msg)
+
+    async def send_agent_config(self, agent_config: Optional[AgentConfigPayload] = None):
+        if agent_config is None:
+            agent_config = await get_agent_config(agent_name=self._lp.name)
+        await self.send_payload(agent_config.model_dump(mode="json", by_alias=True))
+
+    @staticmethod
+    def _parse_payload(msg: ServiceMessage) -> AgentConfigPayload:
+        # legacy clients send the config as a JSON string, version 2 clients as an object
+        if msg.message is not None:
+            return AgentConfigPayload.model_validate_json(msg.message)
+        return AgentConfigPayload.model_validate(msg.payload)
+
+    async def update_agent_config(self, msg: ServiceMessage):
+        try:
+            agent_config_req = self._parse_payload(msg)
+            # save the agent config and return the updated agent config.
+            updated_agent_config = await update_agent_config(agent_config_req.agent_id, agent_config_req)
+
+            # applied in place, the conversation goes on with the new settings; building the backend blocks
+            await run_blocking(
+                self._chat_agent.configure,
+                system_message=updated_agent_config.system_message,
+                model=updated_agent_config.model,
+                platform=updated_agent_config.platform,
+                temperature=updated_agent_config.temperature,
+                max_tokens=updated_agent_config.max_tokens,
+                top_p=updated_agent_config.top_p,
+                memory_limit=updated_agent_config.memory_limit,
+                system_message_limit=updated_agent_config.system_message_limit,
+                timeout=settings.LLM_TIMEOUT,
+            )
+            await self.send_payload(updated_agent_config.model_dump(mode="json", by_alias=True))
+        except AgentConfigConflictError as e:
+            logging.warning("Rejected stale agent config update: %s", e)
+            # let the client catch up with the stored config
+            current_agent_config = await get_agent_config(agent_id=agent_config_req.agent_id, use_cache=False)
+            await self.send_payload(current_agent_config.model_dump(mode="json", by_alias=True))
+        except Exception as e:
+            logging.error("Failed to process agent config: %s", e, exc_info=e)
@@ -1,18 +1,23 @@
 import asyncio
+import contextlib
 import json
 import logging
+import time
 from abc import ABC
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Literal, List, Optional, Dict, Any, cast, Generic, TypeVar
+from typing import Literal, List, Optional, Dict, Any, ClassVar, Generic, Type, TypeVar
 
 from livekit import agents
-from livekit.rtc import Room, DataPacket, Participant, LocalParticipant
+from livekit.rtc import Room, DataPacket, Participant, LocalParticipant, RemoteParticipant
 from pydantic import BaseModel
 
 from plugins.camel import SimpleAgent
+from config import settings
 from .service_topic import service_topic
-from core import EventEmitter
+from .wire import Encoding, WireFormatError, decode, encode, negotiate
+from core import EventEmitter, room_scope
+from core.metrics import get_registry, metrics_enabled
 from utils.utils import generate_random_base62
 
 T = TypeVar('T')
@@ -28,8 +33,13 @@ class TypedQueue(asyncio.Queue, Generic[T]):
 
 
 class Service(ABC, EventEmitter[EventTypes]):
+    # topic served by the subclass, used to route data packets before the service is instantiated
+    TOPIC: ClassVar[Optional[service_topic]] = None
+
     def __init__(self, topic: service_topic = None):
-        super().__init__()
+        # coroutine handlers run one at a time, so the messages of a topic are handled in arrival order
+        super().__init__(max_concurrency=1)
+        topic = topic or self.TOPIC
         if not topic:
             raise ValueError("topic is required for Service")
         self._topic = topic
@@ -37,23 +47,37 @@ class Service(ABC, EventEmitter[EventTypes]):
         self._lp: Optional[LocalParticipant] = None
         self._room: Optional[Room] = None
         self._chat_agent: Optional[SimpleAgent] = None
-
-        ServiceManager.register_service(self)
+        self._publisher: Optional["ServicePublisher"] = None
 
         self.on("service_received", self.service_received)
 
     def close(self):
         self.off("service_received", self.service_received)
+        self.cancel_tasks()
 
     @property
     def topic(self):
         return self._topic
 
-    def attach(self, ctx: agents.JobContext, room: Room, chat_agent: SimpleAgent):
+    @property
+    def attached(self) -> bool:
+        return self._room is not None
+
+    def attach(
+        self,
+        ctx: agents.JobContext,
+        room: Room,
+        chat_agent: SimpleAgent,
+        publisher: Optional["ServicePublisher"] = None,
+    ):
+        if self.attached:
+            raise RuntimeError(f"service {self._topic} is already attached to a room")
+
         self._ctx = ctx
         self._room = room
         self._lp = room.local_participant
         self._chat_agent = chat_agent
+        self._publisher = publisher
 
         self.emit("service_attached")
 
@@ -66,52 +90,222 @@ class Service(ABC, EventEmitter[EventTypes]):
             is_local=True,
             participant=self._lp,
         )
-        await self._lp.publish_data(payload=json.dumps(msg.asjsondict()), topic=self._topic)
+        await self._publish(msg)
         return msg
 
+    async def send_payload(self, payload: Any) -> "ServiceMessage":
+        """Send a JSON serializable value, version 2 clients receive it without a second JSON encoding."""
+        msg = ServiceMessage(
+            payload=payload,
+            is_local=True,
+            participant=self._lp,
+        )
+        await self._publish(msg)
+        return msg
+
+    async def _publish(self, msg: "ServiceMessage") -> None:
+        if self._publisher:
+            await self._publisher.send(self._topic, msg)
+        else:
+            await self._lp.publish_data(payload=json.dumps(msg.asjsondict()), topic=self._topic)
+
+
+class ServicePublisher:
+    """
+    Batches the outgoing service messages of a room.
+
+    Messages sent within `flush_interval` seconds are coalesced per topic into one packet for each
+    wire encoding in use by the remote participants. Participants that never sent a version 2
+    envelope keep receiving one legacy packet per message.
+    """
+
+    def __init__(self, ctx: agents.JobContext, room: Room, flush_interval: float = 0.01, max_batch: int = 32):
+        self._ctx = ctx
+        self._room = room
+        self._lp = room.local_participant
+        self._flush_interval = flush_interval
+        self._max_batch = max_batch
+        # participant sid -> encoding negotiated with it
+        self._encodings: Dict[str, Encoding] = {}
+        # topic -> messages waiting for the next flush
+        self._pending: Dict[str, List["ServiceMessage"]] = {}
+        self._flushed: Optional[asyncio.Future] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._full = asyncio.Event()
+
+    def set_encoding(self, sid: str, encoding: Encoding) -> None:
+        self._encodings[sid] = encoding
+
+    def forget(self, sid: str) -> None:
+        self._encodings.pop(sid, None)
+
+    async def send(self, topic: str, msg: "ServiceMessage") -> None:
+        """Queue `msg` for the next flush and wait until it has been published."""
+        batch = self._pending.setdefault(topic, [])
+        batch.append(msg)
+        if len(batch) >= self._max_batch:
+            self._full.set()
+
+        if self._flushed is None:
+            self._flushed = asyncio.get_running_loop().create_future()
+            # the senders may all be gone, avoid "exception was never retrieved" warnings
+            self._flushed.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._flush_task = self._ctx.create_task(self._flush_later())
+
+        # a cancelled sender must not cancel the flush of the other messages
+        await asyncio.shield(self._flushed)
+
+    def close(self) -> None:
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+    async def _flush_later(self) -> None:
+        flushed = self._flushed
+        try:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._full.wait(), self._flush_interval)
+
+            pending, self._pending = self._pending, {}
+            self._flushed = None
+            self._full.clear()
+            for topic, msgs in pending.items():
+                await self._publish(topic, msgs)
+        except asyncio.CancelledError:
+            flushed.cancel()
+            raise
+        except Exception as e:
+            flushed.set_exception(e)
+        else:
+            flushed.set_result(None)
+
+    async def _publish(self, topic: str, msgs: List["ServiceMessage"]) -> None:
+        groups: Dict[Encoding, List[str]] = {}
+        for sid in self._room.participants:
+            groups.setdefault(self._encodings.get(sid, Encoding.LEGACY), []).append(sid)
+
+        if len(groups) <= 1:
+            # everyone uses the same encoding, broadcast
+            await self._publish_encoded(topic, msgs, next(iter(groups), Encoding.LEGACY), [])
+            return
+
+        for encoding, sids in groups.items():
+            await self._publish_encoded(topic, msgs, encoding, sids)
+
+    async def _publish_encoded(
+        self, topic: str, msgs: List["ServiceMessage"], encoding: Encoding, sids: List[str]
+    ) -> None:
+        if encoding == Encoding.LEGACY:
+            for msg in msgs:
+                await self._lp.publish_data(
+                    payload=json.dumps(msg.asjsondict()), destination_sids=sids, topic=topic
+                )
+        else:
+            # bound the packet size, data channel messages are limited to a few kilobytes
+            for start in range(0, len(msgs), self._max_batch):
+                batch = msgs[start:start + self._max_batch]
+                await self._lp.publish_data(
+                    payload=encode([msg.aswiredict() for msg in batch], encoding), destination_sids=sids, topic=topic
+                )
+
 
 class ServiceManager:
-    registered_services: List[Service] = []
+    """
+    Services of a single room.
+
+    Every registered service type is instantiated and attached once per room, and data packets are
+    routed to them through a topic index. `close` detaches them, call it when the room closes.
+    """
+
+    # topic -> service type, shared by every room of the process
+    registered_services: Dict[str, Type[Service]] = {}
 
     def __init__(self, ctx: agents.JobContext, room: Room, chat_agent: SimpleAgent):
         self._ctx = ctx
         self._room = room
         self._lp = self._room.local_participant
         self._chat_agent = chat_agent
+        self._services: Dict[str, Service] = {}
+        self._publisher = ServicePublisher(
+            ctx, room, flush_interval=settings.SERVICE_FLUSH_INTERVAL, max_batch=settings.SERVICE_MAX_BATCH
+        )
+
+        for topic, service_type in self.registered_services.items():
+            service = service_type()
+            service.attach(self._ctx, self._room, self._chat_agent, self._publisher)
+            self._services[topic] = service
 
         self._room.on("data_received", self._on_data_received)
+        self._room.on("participant_disconnected", self._on_participant_disconnected)
 
     @classmethod
-    def register_service(cls, service: Service):
-        cls.registered_services.append(service)
+    def register_service(cls, service_type: Type[Service]) -> Type[Service]:
+        if not service_type.TOPIC:
+            raise ValueError(f"{service_type.__name__} does not define a TOPIC")
+        cls.registered_services[service_type.TOPIC] = service_type
+        return service_type
 
     def close(self):
         self._room.off("data_received", self._on_data_received)
+        self._room.off("participant_disconnected", self._on_participant_disconnected)
+        self._publisher.close()
+        for service in self._services.values():
+            service.close()
+        self._services.clear()
 
     def fetch_service(self, topic: service_topic) -> Any:
-        for service in self.registered_services:
-            if service.topic == topic:
-                service.attach(self._ctx, self._room, self._chat_agent)
-                return service
+        return self._services.get(topic)
 
     def _on_data_received(self, dp: DataPacket):
         if dp.topic in (_CHAT_TOPIC, _CHAT_UPDATE_TOPIC):
             return
 
-        asserted_topic = cast(service_topic, dp.topic)
-        service = self.fetch_service(asserted_topic)
+        # room events are delivered outside of the room's tasks, account the handlers to the room
+        with room_scope(self._room.name):
+            if not metrics_enabled():
+                self._dispatch(dp)
+                return
+
+            started_at = time.monotonic()
+            try:
+                self._dispatch(dp)
+            finally:
+                get_registry().histogram(
+                    "warda_service_dispatch_seconds", "Time to parse and dispatch a service message", ("topic",)
+                ).observe(time.monotonic() - started_at, dp.topic)
+
+    def _on_participant_disconnected(self, participant: RemoteParticipant):
+        self._publisher.forget(participant.sid)
+
+    def _dispatch(self, dp: DataPacket):
+        service = self._services.get(dp.topic)
 
         if not service:
             raise Exception(f"Service not found for topic {dp.topic}")
 
         try:
-            parsed = json.loads(dp.data)
-            msg = ServiceMessage.from_jsondict(parsed)
-            if dp.participant:
-                msg.participant = dp.participant
-            service.emit("service_received", msg)
-        except Exception as e:
-            logging.warning("failed to parse service message: %s", e, exc_info=e)
+            encoding, accepted, items = decode(dp.data)
+        except WireFormatError as e:
+            logging.warning("failed to decode service packet: %s", e)
+            return
+
+        if dp.participant:
+            # reply in the encoding the participant understands
+            self._publisher.set_encoding(
+                dp.participant.sid, Encoding.LEGACY if encoding == Encoding.LEGACY else negotiate(accepted)
+            )
+
+        for item in items:
+            try:
+                if encoding == Encoding.LEGACY:
+                    msg = ServiceMessage.from_jsondict(item)
+                else:
+                    msg = ServiceMessage.from_wiredict(item)
+                if dp.participant:
+                    msg.participant = dp.participant
+                service.emit("service_received", msg)
+            except Exception as e:
+                logging.warning("failed to parse service message: %s", e, exc_info=e)
 
 
 class ServiceMessagePayload(BaseModel):
@@ -123,6 +317,8 @@ class ServiceMessage:
     message: Optional[str] = None
     id: str = field(default_factory=generate_random_base62)
     timestamp: datetime = field(default_factory=datetime.now)
+    # structured payload of version 2 messages, `message` holds it when it is a string
+    payload: Any = None
 
     # These fields are not part of the wire protocol. They are here to provide
     # context for the application.
@@ -145,15 +341,41 @@ class ServiceMessage:
         msg.update_from_jsondict(d)
         return msg
 
+    @classmethod
+    def from_wiredict(cls, d: Dict[str, Any]) -> "ServiceMessage":
+        timestamp = datetime.now()
+        if d.get("timestamp"):
+            timestamp = datetime.fromtimestamp(d["timestamp"] / 1000.0)
+
+        payload = d.get("payload")
+        return cls(
+            id=d.get("id") or generate_random_base62(),
+            timestamp=timestamp,
+            message=payload if isinstance(payload, str) else None,
+            payload=payload,
+        )
+
     def update_from_jsondict(self, d: Dict[str, Any]) -> None:
         self.message = d.get("message")
 
     def asjsondict(self):
         """Returns a JSON serializable dictionary representation of the message."""
+        message = self.message
+        if message is None and self.payload is not None:
+            # version 1 carries structured payloads as a JSON string
+            message = json.dumps(self.payload, separators=(",", ":"), ensure_ascii=False)
         d = {
             "id": self.id,
-            "message": self.message,
+            "message": message,
             "timestamp": int(self.timestamp.timestamp() * 1000),
         }
         return d
 
+    def aswiredict(self) -> Dict[str, Any]:
+        """Returns the message in the version 2 layout, the payload is embedded as a value."""
+        return {
+            "id": self.id,
+            "payload": self.message if self.payload is None else self.payload,
+            "timestamp": int(self.timestamp.timestamp() * 1000),
+        }
+
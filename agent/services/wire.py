@@ -0,0 +1,88 @@
+"""
+Wire format of service data packets.
+
+Version 1 (legacy) packets carry a single JSON message whose payload is itself a JSON string:
+``{"id": ..., "message": "<json>", "timestamp": ...}``.
+
+Version 2 packets carry an envelope with a batch of messages whose payloads are embedded as values,
+so they are encoded and parsed once: ``{"v": 2, "enc": [...], "msgs": [{"id", "timestamp", "payload"}]}``.
+The envelope is encoded as JSON or, when the `msgpack` package is installed, as msgpack. ``enc`` lists
+the encodings the sender accepts and is used to pick the encoding of the replies.
+"""
+import json
+from enum import Enum
+from typing import Any, Dict, List, Sequence, Tuple
+
+try:
+    import msgpack
+except ImportError:  # optional, JSON is always available
+    msgpack = None
+
+WIRE_VERSION = 2
+
+
+class Encoding(Enum):
+    LEGACY = "legacy"
+    JSON = "json"
+    MSGPACK = "msgpack"
+
+
+# encodings of version 2 envelopes this side understands, in order of preference
+SUPPORTED_ENCODINGS: Tuple[Encoding, ...] = ((Encoding.MSGPACK,) if msgpack else ()) + (Encoding.JSON,)
+
+
+class WireFormatError(ValueError):
+    pass
+
+
+def negotiate(advertised: Sequence[str]) -> Encoding:
+    """Pick the preferred encoding among the ones a participant advertised, JSON if none match."""
+    for encoding in SUPPORTED_ENCODINGS:
+        if encoding.value in advertised:
+            return encoding
+    return Encoding.JSON
+
+
+def encode(items: List[Dict[str, Any]], encoding: Encoding) -> bytes:
+    """
+    Encode a batch of version 2 messages into a single packet.
+
+    :raises WireFormatError: If `encoding` is not a version 2 encoding supported here.
+    """
+    envelope = {"v": WIRE_VERSION, "enc": [e.value for e in SUPPORTED_ENCODINGS], "msgs": items}
+    if encoding == Encoding.JSON:
+        return json.dumps(envelope, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if encoding == Encoding.MSGPACK and msgpack:
+        return msgpack.packb(envelope, use_bin_type=True)
+    raise WireFormatError(f"cannot encode a batch as {encoding.value}")
+
+
+def decode(data: bytes) -> Tuple[Encoding, List[str], List[Dict[str, Any]]]:
+    """
+    Decode a packet of any supported version.
+
+    :return: The encoding of the packet, the encodings the sender accepts and its messages. Legacy
+        packets yield a single message dict in the version 1 layout.
+    :raises WireFormatError: If the packet cannot be decoded.
+    """
+    # JSON objects start with "{", msgpack maps with a 0x8X or 0xDE/0xDF byte
+    if data[:1] == b"{":
+        try:
+            d = json.loads(data)
+        except ValueError as e:
+            raise WireFormatError(f"invalid JSON packet: {e}") from e
+        if "v" not in d:
+            return Encoding.LEGACY, [], [d]
+        encoding = Encoding.JSON
+    elif msgpack:
+        try:
+            d = msgpack.unpackb(data, raw=False)
+        except Exception as e:
+            raise WireFormatError(f"invalid msgpack packet: {e}") from e
+        encoding = Encoding.MSGPACK
+    else:
+        raise WireFormatError("received a binary packet but msgpack is not installed")
+
+    if not isinstance(d, dict) or d.get("v") != WIRE_VERSION or not isinstance(d.get("msgs"), list):
+        raise WireFormatError(f"unsupported envelope version {d.get('v') if isinstance(d, dict) else None}")
+    return encoding, list(d.get("enc") or ()), d["msgs"]
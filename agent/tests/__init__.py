@@ -0,0 +1,19 @@
+"""
+Tests of the agent, run from this directory with:
+
+    python -m unittest discover tests
+
+The settings get defaults here, before the modules of the agent are imported by the tests.
+"""
+import os
+
+# the settings require these, nothing is sent to the real services
+for _name, _value in (
+    ("AGENT_ID", "test-agent"),
+    ("AGENT_NAME", "Test"),
+    ("LIVEKIT_URL", "ws://127.0.0.1:7880"),
+    ("LIVEKIT_API_KEY", "test"),
+    ("LIVEKIT_API_SECRET", "test"),
+    ("OPENAI_API_KEY", "test"),
+):
+    os.environ.setdefault(_name, _value)
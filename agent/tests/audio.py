@@ -0,0 +1,14 @@
+"""Test signals, 16-bit mono PCM."""
+import numpy as np
+
+RATE = 16000
+
+
+def tone(seconds: float, amplitude: float = 3000.0, rate: int = RATE) -> np.ndarray:
+    t = np.arange(int(seconds * rate)) / rate
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+
+
+def noise(seconds: float, amplitude: float = 30.0, rate: int = RATE, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.normal(0, amplitude, int(seconds * rate)).astype(np.int16)
@@ -0,0 +1,66 @@
+import unittest
+from unittest import mock
+
+from camel.models import ModelFactory
+
+from bench.fakes import FakeModelBackend, LLMProfile
+from config import settings
+from plugins.camel import RoutedBackend, SimpleAgent
+from plugins.camel.backend import ScheduledBackend
+from services import AgentService
+from services.agent_config.model import AgentConfigPayload
+from services.service import ServiceMessage
+
+_PLATFORMS = {
+    "OpenAI": ["http://openai.test/v1"],
+    "Local": ["http://local-0.test/v1", "http://local-1.test/v1"],
+}
+
+
+class AgentConfigUpdateTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        for patch in (
+            mock.patch.object(ModelFactory, "create", lambda t, c: FakeModelBackend(t, c, LLMProfile())),
+            mock.patch.object(settings, "LLM_PLATFORMS", _PLATFORMS),
+            mock.patch.object(settings, "LLM_HEDGE_DELAY", 0.0),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.chat_agent = SimpleAgent(system_message="Hello", platform="OpenAI")
+        self.service = AgentService()
+        self.service._chat_agent = self.chat_agent
+        self.service.send_payload = mock.AsyncMock()
+
+    async def _update(self, **payload) -> None:
+        stored = AgentConfigPayload(agentId="agent", systemMessage="Hello", **payload)
+        with mock.patch("services.agent_config.service.update_agent_config", mock.AsyncMock(return_value=stored)):
+            await self.service.update_agent_config(ServiceMessage(payload={"agentId": "agent"}))
+        self.service.send_payload.assert_awaited()
+
+    async def test_platform_change_switches_backend(self) -> None:
+        self.assertIsInstance(self.chat_agent.agent.model_backend, ScheduledBackend)
+
+        await self._update(modelPlatform="Local")
+
+        backend = self.chat_agent.agent.model_backend
+        self.assertEqual(self.chat_agent.platform, "Local")
+        self.assertIsInstance(backend, RoutedBackend)
+        self.assertEqual(
+            [name.partition("@")[2] for name, _ in backend.backends],
+            ["http://local-0.test/v1", "http://local-1.test/v1"],
+        )
+
+    async def test_platform_kept_when_unset(self) -> None:
+        backend = self.chat_agent.agent.model_backend
+
+        await self._update(temperature=0.5)
+
+        self.assertEqual(self.chat_agent.platform, "OpenAI")
+        self.assertEqual(self.chat_agent.agent.model_config.temperature, 0.5)
+        self.assertIsNot(self.chat_agent.agent.model_backend, backend)
+        self.assertIsInstance(self.chat_agent.agent.model_backend, ScheduledBackend)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from postgrest import APIError
+
+from services.agent_config import database
+from services.agent_config.database import (
+    AgentConfigConflictError,
+    AgentConfigFunctionMissingError,
+    update_agent_config,
+)
+from services.agent_config.model import AgentConfigPayload
+
+_ROW = {
+    "agent_id": "agent",
+    "agent_name": "Warda",
+    "system_message": "Hello",
+    "model_platform": "OpenAI",
+    "model_type": "gpt-3.5-turbo",
+    "model_config": '{"temperature": 0.5}',
+    "updated_at": "2024-05-01T12:00:00",
+}
+
+
+class UpdateAgentConfigTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.client = mock.Mock()
+        self.execute = self.client.rpc.return_value.execute = mock.AsyncMock()
+        patch = mock.patch.object(database, "get_postgrest_client", return_value=self.client)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.addCleanup(database.invalidate_agent_config, agent_id="agent", agent_name="Warda")
+
+    async def test_sends_only_set_fields(self) -> None:
+        self.execute.return_value = mock.Mock(data=[_ROW])
+
+        updated = await update_agent_config("agent", AgentConfigPayload(agentId="agent", temperature=0.5))
+
+        name, params = self.client.rpc.call_args.args
+        self.assertEqual(name, "update_agent_config")
+        self.assertEqual(params["p_agent_id"], "agent")
+        self.assertEqual(params["p_changes"], {"model_config": {"temperature": 0.5}})
+        self.assertIsNone(params["p_expected_updated_at"])
+        self.assertEqual((updated.agent_name, updated.temperature), ("Warda", 0.5))
+
+    async def test_conflict(self) -> None:
+        self.execute.return_value = mock.Mock(data=[])
+        payload = AgentConfigPayload(agentId="agent", updatedAt=datetime(2024, 5, 1, 12))
+
+        with self.assertRaises(AgentConfigConflictError):
+            await update_agent_config("agent", payload)
+        self.assertEqual(self.client.rpc.call_args.args[1]["p_expected_updated_at"], "2024-05-01T12:00:00")
+
+    async def test_missing_function(self) -> None:
+        self.execute.side_effect = APIError({"code": "PGRST202", "message": "Could not find the function"})
+
+        with self.assertRaisesRegex(AgentConfigFunctionMissingError, "update-agent-config.sql"):
+            await update_agent_config("agent", AgentConfigPayload(agentId="agent", temperature=0.5))
+
+    async def test_other_errors_are_raised(self) -> None:
+        self.execute.side_effect = APIError({"code": "42501", "message": "permission denied"})
+
+        with self.assertRaises(APIError):
+            await update_agent_config("agent", AgentConfigPayload(agentId="agent", temperature=0.5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+from typing import List
+
+import numpy as np
+from livekit import rtc
+
+from core import AudioOutput, Resampler
+from tests.audio import tone
+
+
+class _Source:
+    def __init__(self) -> None:
+        self.frames: List[rtc.AudioFrame] = []
+
+    async def capture_frame(self, frame: rtc.AudioFrame) -> None:
+        self.frames.append(frame)
+
+    def samples(self) -> np.ndarray:
+        return np.frombuffer(b"".join(bytes(f.data) for f in self.frames), dtype=np.int16)
+
+
+class ResamplerTest(unittest.TestCase):
+    def test_passthrough(self) -> None:
+        resampler = Resampler(24000, 1, 24000)
+        data = tone(0.01, rate=24000).tobytes()
+
+        out = resampler.push(data)
+
+        self.assertTrue(resampler.passthrough)
+        self.assertTrue(np.shares_memory(out, np.frombuffer(data, dtype=np.int16)))
+
+    def test_downmix(self) -> None:
+        stereo = np.array([100, 300, -100, -300, 7, 8], dtype=np.int16)
+
+        out = Resampler(24000, 2, 24000).push(stereo.tobytes())
+
+        self.assertEqual(out.tolist(), [200, -200, 8])
+
+    def test_incomplete_sample_of_a_channel_is_dropped(self) -> None:
+        out = Resampler(24000, 2, 24000, 2).push(np.array([1, 2, 3], dtype=np.int16).tobytes())
+
+        self.assertEqual(out.tolist(), [1, 2])
+
+    def test_downsample(self) -> None:
+        audio = tone(1, rate=48000)
+
+        out = Resampler(48000, 1, 24000).push(audio.tobytes())
+
+        self.assertEqual(len(out), 24000)
+        # every other sample of the input
+        self.assertTrue(np.array_equal(out, audio[::2]))
+
+    def test_chunks_match_one_push(self) -> None:
+        audio = tone(0.5, rate=44100)
+        whole = Resampler(44100, 1, 24000).push(audio.tobytes())
+
+        resampler = Resampler(44100, 1, 24000)
+        chunked = np.concatenate([
+            resampler.push(audio[start:start + 441].tobytes()) for start in range(0, len(audio), 441)
+        ])
+
+        self.assertEqual(len(chunked), len(whole))
+        self.assertLessEqual(int(np.abs(chunked.astype(np.int32) - whole).max()), 1)
+
+    def test_reset(self) -> None:
+        resampler = Resampler(16000, 1, 24000)
+        first = resampler.push(tone(0.1).tobytes())
+
+        resampler.reset()
+
+        self.assertTrue(np.array_equal(resampler.push(tone(0.1).tobytes()), first))
+
+    def test_unsupported_channels(self) -> None:
+        with self.assertRaises(ValueError):
+            Resampler(24000, 1, 24000, 2)
+
+
+class AudioOutputTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.source = _Source()
+        self.output = AudioOutput(self.source, 24000, 1, frame_ms=20)
+
+    async def test_fixed_frames_with_carry(self) -> None:
+        audio = tone(0.06, rate=24000)
+
+        # 30 ms pushes, the second completes the frame started by the first
+        await self.output.push(audio[:720].tobytes(), 24000, 1)
+        self.assertEqual(len(self.source.frames), 1)
+        await self.output.push(audio[720:].tobytes(), 24000, 1)
+
+        self.assertEqual([f.samples_per_channel for f in self.source.frames], [480, 480, 480])
+        self.assertTrue(np.array_equal(self.source.samples(), audio))
+        self.assertEqual((self.output.stats.frames, self.output.stats.samples), (3, 1440))
+
+    async def test_flush_captures_partial_frame(self) -> None:
+        audio = tone(0.03, rate=24000)
+        await self.output.push(audio.tobytes(), 24000, 1)
+
+        await self.output.flush()
+
+        self.assertEqual([f.samples_per_channel for f in self.source.frames], [480, 240])
+        self.assertTrue(np.array_equal(self.source.samples(), audio))
+
+    async def test_clear_drops_partial_frame(self) -> None:
+        await self.output.push(tone(0.03, rate=24000).tobytes(), 24000, 1)
+
+        self.output.clear()
+        await self.output.flush()
+
+        self.assertEqual(len(self.source.frames), 1)
+
+    async def test_converts_to_track_format(self) -> None:
+        stereo = np.repeat(tone(0.1, rate=48000), 2)
+
+        await self.output.push_frame(
+            rtc.AudioFrame(data=stereo.tobytes(), sample_rate=48000, num_channels=2, samples_per_channel=4800)
+        )
+        await self.output.flush()
+
+        self.assertEqual(self.output.format, (24000, 1))
+        self.assertTrue(all(f.sample_rate == 24000 and f.num_channels == 1 for f in self.source.frames))
+        self.assertEqual(sum(f.samples_per_channel for f in self.source.frames), 2400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import asyncio
+import unittest
+from typing import List
+
+from core import EventEmitter
+
+
+class EventEmitterTest(unittest.IsolatedAsyncioTestCase):
+    async def test_handlers_called_in_registration_order(self) -> None:
+        emitter: EventEmitter[str] = EventEmitter()
+        calls: List[str] = []
+        for name in "cab":
+            emitter.on("event", lambda x, name=name: calls.append(name + x))
+
+        emitter.emit("event", "!")
+        self.assertEqual(calls, ["c!", "a!", "b!"])
+
+    async def test_failing_handler_does_not_stop_the_others(self) -> None:
+        emitter: EventEmitter[str] = EventEmitter()
+        calls: List[int] = []
+
+        def fail() -> None:
+            raise RuntimeError("boom")
+
+        emitter.on("event", lambda: calls.append(1))
+        emitter.on("event", fail)
+        emitter.on("event", lambda: calls.append(2))
+
+        with self.assertLogs(level="ERROR"):
+            emitter.emit("event")
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(emitter.stats.handler_errors, 1)
+
+    async def test_changes_during_emit_apply_to_the_next_one(self) -> None:
+        emitter: EventEmitter[str] = EventEmitter()
+        calls: List[str] = []
+
+        def add() -> None:
+            calls.append("add")
+            emitter.on("event", lambda: calls.append("added"))
+
+        emitter.once("event", lambda: calls.append("once"))
+        emitter.on("event", add)
+
+        emitter.emit("event")
+        self.assertEqual(calls, ["once", "add"])
+        calls.clear()
+        emitter.off("event", add)
+        emitter.emit("event")
+        self.assertEqual(calls, ["added"])
+
+    async def test_coroutine_handlers_run_in_emit_order(self) -> None:
+        emitter: EventEmitter[str] = EventEmitter(max_concurrency=1)
+        running = 0
+        calls: List[int] = []
+
+        async def handler(i: int) -> None:
+            nonlocal running
+            running += 1
+            self.assertEqual(running, 1)
+            await asyncio.sleep(0.01 if i == 0 else 0)
+            calls.append(i)
+            running -= 1
+
+        emitter.on("event", handler)
+        for i in range(3):
+            emitter.emit("event", i)
+        await emitter.drain()
+
+        self.assertEqual(calls, [0, 1, 2])
+        self.assertEqual((emitter.stats.tasks_started, emitter.stats.tasks_running), (3, 0))
+
+    async def test_failing_coroutine_handler_is_logged(self) -> None:
+        emitter: EventEmitter[str] = EventEmitter()
+
+        async def fail() -> None:
+            raise RuntimeError("boom")
+
+        emitter.on("event", fail)
+        with self.assertLogs(level="ERROR"):
+            emitter.emit("event")
+            await emitter.drain()
+        self.assertEqual(emitter.stats.handler_errors, 1)
+
+    async def test_cancel_tasks(self) -> None:
+        emitter: EventEmitter[str] = EventEmitter()
+        emitter.on("event", lambda: asyncio.sleep(10))
+        emitter.emit("event")
+
+        emitter.cancel_tasks()
+        await emitter.drain()
+        self.assertEqual(emitter.stats.tasks_running, 0)
+
+    async def test_wait_for(self) -> None:
+        emitter: EventEmitter[str] = EventEmitter()
+        waiter = asyncio.create_task(emitter.wait_for("event"))
+        await asyncio.sleep(0)
+
+        emitter.emit("event", 1, 2)
+        self.assertEqual(await waiter, (1, 2))
+        with self.assertRaises(asyncio.TimeoutError):
+            await emitter.wait_for("event", timeout=0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from core import LoadController
+from core.load import rss_mb
+
+
+class LoadControllerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.rooms = 0
+        self.lag = 0.0
+
+    def _controller(self, rooms: float = 2, lag: float = 0.5) -> LoadController:
+        return LoadController(
+            {"rooms": lambda: self.rooms, "lag": lambda: self.lag}, {"rooms": rooms, "lag": lag}, reserve="rooms"
+        )
+
+    def test_score_is_the_largest_ratio(self) -> None:
+        controller = self._controller(rooms=4, lag=0.5)
+        self.rooms, self.lag = 1, 0.25
+
+        self.assertEqual(controller.sample(), {"rooms": 1.0, "lag": 0.25, "score": 0.5})
+        self.assertEqual(controller.stats.score, 0.5)
+
+    def test_admission_reserves_until_release(self) -> None:
+        controller = self._controller(rooms=2)
+
+        self.assertTrue(controller.admit())
+        self.assertTrue(controller.admit())
+        # both jobs are still being set up, their rooms do not show in the probe yet
+        self.assertFalse(controller.admit())
+
+        controller.release(accepted=False)
+        self.assertTrue(controller.admit())
+        controller.release(accepted=True)
+        controller.release(accepted=True)
+        self.rooms = 2
+        self.assertFalse(controller.admit())
+        self.assertEqual((controller.stats.admitted, controller.stats.rejected), (2, 3))
+
+    def test_component_at_its_limit_rejects(self) -> None:
+        controller = self._controller()
+        self.lag = 0.5
+
+        self.assertFalse(controller.admit())
+
+    def test_limit_of_zero_does_not_count(self) -> None:
+        controller = self._controller(rooms=0, lag=0)
+        self.rooms, self.lag = 100, 10.0
+
+        self.assertEqual(controller.sample()["score"], 0.0)
+        self.assertTrue(controller.admit())
+
+    def test_drain_stops_admission(self) -> None:
+        controller = self._controller()
+        controller.drain()
+
+        self.assertTrue(controller.draining)
+        self.assertFalse(controller.admit())
+
+    def test_rss(self) -> None:
+        self.assertGreater(rss_mb(), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+from typing import List
+
+from camel.memories import MemoryRecord
+from camel.messages import BaseMessage, OpenAIMessage
+from camel.types import OpenAIBackendRole
+from camel.utils import BaseTokenCounter
+
+from plugins.camel import ConversationMemory
+
+
+class _Encoding:
+    """One token per word."""
+
+    @staticmethod
+    def encode(text: str) -> List[str]:
+        return text.split()
+
+    @staticmethod
+    def decode(tokens: List[str]) -> str:
+        return " ".join(tokens)
+
+
+class _TokenCounter(BaseTokenCounter):
+    """Counts words, plus 3 tokens priming the reply as the OpenAI counters do."""
+
+    encoding = _Encoding()
+
+    def count_tokens_from_messages(self, messages: List[OpenAIMessage]) -> int:
+        return sum(len(m["content"].split()) for m in messages) + 3
+
+
+def _system(content: str) -> MemoryRecord:
+    return MemoryRecord(BaseMessage.make_assistant_message("agent", content), OpenAIBackendRole.SYSTEM)
+
+
+def _user(content: str) -> MemoryRecord:
+    return MemoryRecord(BaseMessage.make_user_message("user", content), OpenAIBackendRole.USER)
+
+
+def _reply(content: str) -> MemoryRecord:
+    return MemoryRecord(BaseMessage.make_assistant_message("agent", content), OpenAIBackendRole.ASSISTANT)
+
+
+def _contents(memory: ConversationMemory) -> List[str]:
+    return [m["content"] for m in memory.get_context()[0]]
+
+
+class ConversationMemoryTest(unittest.TestCase):
+    def test_oldest_rounds_evicted_past_max_rounds(self) -> None:
+        memory = ConversationMemory(_TokenCounter(), token_limit=1000, max_rounds=2, collect_evicted=True)
+        memory.write_records([_system("be brief")])
+        for i in range(3):
+            memory.write_records([_user(f"question {i}"), _reply(f"answer {i}")])
+
+        self.assertEqual(_contents(memory), ["be brief", "question 1", "answer 1", "question 2", "answer 2"])
+        self.assertEqual([m["content"] for m in memory.pop_evicted()], ["question 0", "answer 0"])
+        self.assertEqual(memory.pop_evicted(), [])
+        self.assertEqual((memory.stats.rounds, memory.stats.messages, memory.stats.evicted), (2, 4, 2))
+
+    def test_rounds_evicted_to_fit_the_token_limit(self) -> None:
+        # 3 priming + 2 system + 4 per round
+        memory = ConversationMemory(_TokenCounter(), token_limit=12)
+        memory.write_records([_system("be brief")])
+        for i in range(3):
+            memory.write_records([_user(f"question {i}"), _reply(f"answer {i}")])
+
+        messages, tokens = memory.get_context()
+        self.assertEqual([m["content"] for m in messages], ["be brief", "question 2", "answer 2"])
+        self.assertEqual(tokens, 9)
+
+    def test_round_being_answered_is_kept(self) -> None:
+        memory = ConversationMemory(_TokenCounter(), token_limit=5)
+        memory.write_records([_user("a question far longer than the limit")])
+
+        self.assertEqual(_contents(memory), ["a question far longer than the limit"])
+
+    def test_system_message_truncated(self) -> None:
+        memory = ConversationMemory(_TokenCounter(), token_limit=1000, system_token_limit=3)
+        memory.write_records([_system("one two three four five")])
+
+        self.assertEqual(memory.get_context(), ([{"role": "system", "content": "one two three"}], 6))
+
+    def test_summary_appended_and_counted(self) -> None:
+        memory = ConversationMemory(_TokenCounter(), token_limit=14)
+        memory.write_records([_system("be brief"), _user("question 0"), _reply("answer 0")])
+        memory.write_records([_user("question 1"), _reply("answer 1")])
+        memory.summary = "they said hi"
+
+        messages, tokens = memory.get_context()
+        self.assertTrue(messages[0]["content"].endswith("they said hi"))
+        # the summary left room for the last round only
+        self.assertEqual([m["content"] for m in messages[1:]], ["question 1", "answer 1"])
+        self.assertEqual(tokens, 12)
+
+    def test_lower_limits_evict(self) -> None:
+        memory = ConversationMemory(_TokenCounter(), token_limit=1000)
+        for i in range(3):
+            memory.write_records([_user(f"question {i}"), _reply(f"answer {i}")])
+
+        memory.set_limits(max_rounds=1)
+        self.assertEqual(_contents(memory), ["question 2", "answer 2"])
+
+    def test_empty_memory(self) -> None:
+        memory = ConversationMemory(_TokenCounter(), token_limit=1000)
+        with self.assertRaises(ValueError):
+            memory.get_context()
+
+        memory.write_records([_user("hi")])
+        memory.clear()
+        with self.assertRaises(ValueError):
+            memory.get_context()
+
+
+if __name__ == "__main__":
+    unittest.main()
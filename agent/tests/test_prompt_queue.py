@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import pydantic
+
+from config.config import Settings
+from core import OverflowPolicy, PromptQueue, PromptQueueFull
+
+
+class PromptQueueTest(unittest.IsolatedAsyncioTestCase):
+    async def test_prompts_in_order(self) -> None:
+        queue = PromptQueue(maxsize=3)
+        trace = mock.Mock()
+        queue.put_nowait("a", trace)
+        queue.put_nowait("b")
+
+        self.assertEqual(await queue.get_traced(), ("a", trace))
+        self.assertEqual(await queue.get(), "b")
+        self.assertTrue(queue.empty())
+        self.assertEqual((queue.stats.enqueued, queue.stats.dequeued, queue.stats.max_depth), (2, 2, 2))
+
+    async def test_get_waits_for_a_prompt(self) -> None:
+        queue = PromptQueue()
+        getter = asyncio.create_task(queue.get())
+        await asyncio.sleep(0)
+        self.assertFalse(getter.done())
+
+        queue.put_nowait("hello")
+        self.assertEqual(await asyncio.wait_for(getter, 1), "hello")
+
+    async def test_coalesce_joins_the_newest_prompt(self) -> None:
+        queue = PromptQueue(maxsize=2, overflow=OverflowPolicy.COALESCE)
+        first, second, third = mock.Mock(), mock.Mock(), mock.Mock()
+        queue.put_nowait("a", first)
+        queue.put_nowait("b", second)
+        queue.put_nowait("c", third)
+
+        self.assertEqual(queue.qsize(), 2)
+        self.assertEqual(await queue.get(), "a")
+        # the joined prompt keeps the turn of the one it joined
+        self.assertEqual(await queue.get_traced(), ("b\nc", second))
+        third.finish.assert_called_once_with("coalesced")
+        second.finish.assert_not_called()
+        self.assertEqual(queue.stats.coalesced, 1)
+
+    async def test_drop_oldest_finishes_its_trace(self) -> None:
+        queue = PromptQueue(maxsize=2, overflow=OverflowPolicy.DROP_OLDEST)
+        first = mock.Mock()
+        queue.put_nowait("a", first)
+        queue.put_nowait("b")
+        queue.put_nowait("c")
+
+        first.finish.assert_called_once_with("dropped")
+        self.assertEqual([await queue.get(), await queue.get()], ["b", "c"])
+        self.assertEqual(queue.stats.dropped, 1)
+
+    async def test_reject_raises_and_keeps_the_queue(self) -> None:
+        queue = PromptQueue(maxsize=1, overflow=OverflowPolicy.REJECT)
+        queue.put_nowait("a")
+
+        with self.assertRaises(PromptQueueFull):
+            queue.put_nowait("b")
+        self.assertEqual(await queue.get(), "a")
+        self.assertEqual(queue.stats.rejected, 1)
+
+    async def test_clear_drops_queued_turns(self) -> None:
+        queue = PromptQueue()
+        trace = mock.Mock()
+        queue.put_nowait("a", trace)
+        queue.clear()
+
+        self.assertTrue(queue.empty())
+        trace.finish.assert_called_once_with("dropped")
+
+    def test_maxsize_must_be_positive(self) -> None:
+        with self.assertRaises(ValueError):
+            PromptQueue(maxsize=0)
+
+    def test_unknown_overflow_setting_rejected(self) -> None:
+        with self.assertRaises(pydantic.ValidationError):
+            Settings(PROMPT_QUEUE_OVERFLOW="drop_newest")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from core import RoomRegistry
+
+
+class RoomRegistryTest(unittest.TestCase):
+    def test_quota_per_agent(self) -> None:
+        rooms = RoomRegistry(max_rooms_per_agent=2)
+
+        self.assertTrue(rooms.try_acquire("a", "r1"))
+        self.assertTrue(rooms.try_acquire("a", "r2"))
+        self.assertFalse(rooms.try_acquire("a", "r3"))
+        # the quota of one agent does not limit the others
+        self.assertTrue(rooms.try_acquire("b", "r3"))
+
+        self.assertEqual(rooms.active("a"), 2)
+        self.assertEqual(rooms.active(), 3)
+        self.assertEqual((rooms.stats.accepted, rooms.stats.rejected), (3, 1))
+
+    def test_release_frees_quota(self) -> None:
+        rooms = RoomRegistry(max_rooms_per_agent=1)
+        rooms.try_acquire("a", "r1")
+
+        rooms.release("a", "r1")
+
+        self.assertEqual(rooms.active(), 0)
+        self.assertEqual(rooms.agents(), set())
+        self.assertTrue(rooms.try_acquire("a", "r2"))
+
+    def test_duplicate_acquire_is_rejected(self) -> None:
+        rooms = RoomRegistry()
+        self.assertTrue(rooms.try_acquire("a", "r1"))
+
+        self.assertFalse(rooms.try_acquire("a", "r1"))
+        self.assertTrue(rooms.holds("a", "r1"))
+        self.assertEqual(rooms.active(), 1)
+
+        # the first holder releases the room once, as it was only counted once
+        rooms.release("a", "r1")
+        self.assertFalse(rooms.holds("a", "r1"))
+        self.assertEqual(rooms.active(), 0)
+
+    def test_release_of_unknown_room_is_ignored(self) -> None:
+        rooms = RoomRegistry()
+        rooms.try_acquire("a", "r1")
+
+        rooms.release("a", "r2")
+        rooms.release("b", "r1")
+
+        self.assertEqual(rooms.active(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
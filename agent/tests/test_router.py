@@ -0,0 +1,82 @@
+import unittest
+import uuid
+from unittest import mock
+
+import openai
+from camel.types import ModelType
+
+from bench.fakes import FakeModelBackend, LLMProfile
+from config import settings
+from plugins.camel import RoutedBackend, get_router_stats
+
+_CONFIG = {"stream": True}
+_MESSAGES = [{"role": "user", "content": "Hello"}]
+
+
+def _backend(**profile) -> FakeModelBackend:
+    return FakeModelBackend(ModelType.GPT_3_5_TURBO, _CONFIG, LLMProfile(reply_words=3, **profile))
+
+
+class RoutedBackendTest(unittest.TestCase):
+    def setUp(self) -> None:
+        patch = mock.patch.object(settings, "LLM_BACKEND_COOLDOWN", 30.0)
+        patch.start()
+        self.addCleanup(patch.stop)
+        # the health of the backends is process-wide, every test gets backends of its own
+        self.prefix = uuid.uuid4().hex
+
+    def _router(self, backends, hedge_delay: float = 0.0) -> RoutedBackend:
+        return RoutedBackend([(f"{self.prefix}-{i}", b) for i, b in enumerate(backends)], hedge_delay=hedge_delay)
+
+    def test_hedge_skips_failed_backend(self) -> None:
+        failing = _backend(first_token_latency=0.0, error_rate=1.0)
+        slow = _backend(first_token_latency=0.3)
+        router = self._router([failing, slow], hedge_delay=0.1)
+
+        stream = router.run(_MESSAGES)
+        self.assertTrue(list(stream))
+        stream.close()
+
+        self.assertEqual(failing.calls, 1)
+        # failed over to the slow backend, which is the only one left, so it is not asked twice
+        self.assertEqual(slow.calls, 1)
+
+    def test_hedge_skipped_without_another_backend(self) -> None:
+        slow = _backend(first_token_latency=0.2)
+        router = self._router([slow], hedge_delay=0.05)
+        hedged = get_router_stats().hedged
+
+        stream = router.run(_MESSAGES)
+        self.assertTrue(list(stream))
+        stream.close()
+
+        self.assertEqual(slow.calls, 1)
+        self.assertEqual(get_router_stats().hedged, hedged)
+
+    def test_hedge_to_another_backend_wins(self) -> None:
+        slow = _backend(first_token_latency=1.0)
+        fast = _backend(first_token_latency=0.0)
+        router = self._router([slow, fast], hedge_delay=0.05)
+        stats = get_router_stats()
+        hedged, hedge_wins = stats.hedged, stats.hedge_wins
+
+        stream = router.run(_MESSAGES)
+        self.assertTrue(list(stream))
+        stream.close()
+
+        self.assertEqual([slow.calls, fast.calls], [1, 1])
+        self.assertEqual(stats.hedged, hedged + 1)
+        self.assertEqual(stats.hedge_wins, hedge_wins + 1)
+
+    def test_failover_tries_each_backend_once(self) -> None:
+        backends = [_backend(first_token_latency=0.0, error_rate=1.0) for _ in range(3)]
+        router = self._router(backends, hedge_delay=0.05)
+
+        with self.assertRaises(openai.APIConnectionError):
+            router.run(_MESSAGES)
+
+        self.assertEqual([b.calls for b in backends], [1, 1, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
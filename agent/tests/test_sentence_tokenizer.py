@@ -0,0 +1,72 @@
+import unittest
+from typing import List
+
+from core.sentence_tokenizer import SentenceTokenizer
+
+
+def _texts(sentences) -> List[str]:
+    return [s.text for s in sentences]
+
+
+class SentenceTokenizerTest(unittest.TestCase):
+    def test_split_on_punctuation(self) -> None:
+        tokenizer = SentenceTokenizer(min_length=0)
+        text = 'He said "hi there." Then he left! Did he? Yes'
+
+        self.assertEqual(
+            _texts(tokenizer.tokenize(text=text)), ['He said "hi there."', "Then he left!", "Did he?", "Yes"]
+        )
+
+    def test_decimals_are_not_sentence_ends(self) -> None:
+        tokenizer = SentenceTokenizer(min_length=0)
+
+        self.assertEqual(
+            _texts(tokenizer.tokenize(text="It costs 3.50 today. Buy it.")), ["It costs 3.50 today.", "Buy it."]
+        )
+
+    def test_cjk_and_line_breaks(self) -> None:
+        tokenizer = SentenceTokenizer(min_length=0)
+
+        self.assertEqual(
+            _texts(tokenizer.tokenize(text="你好。今天天气很好！\nitem one\nitem two")),
+            ["你好。", "今天天气很好！", "item one", "item two"],
+        )
+
+    def test_short_sentences_merged(self) -> None:
+        tokenizer = SentenceTokenizer(min_length=20)
+
+        self.assertEqual(
+            _texts(tokenizer.tokenize(text="Hi! OK. This one is long enough. Bye.")),
+            ["Hi! OK. This one is long enough.", "Bye."],
+        )
+
+
+class SentenceStreamTest(unittest.IsolatedAsyncioTestCase):
+    async def test_sentences_emitted_as_they_complete(self) -> None:
+        stream = SentenceTokenizer(min_length=0).stream()
+        for chunk in ["Hel", "lo there. How ", "are you? I am", " fine"]:
+            stream.push_text(chunk)
+        self.assertEqual([(await stream.__anext__()).text for _ in range(2)], ["Hello there.", "How are you?"])
+
+        await stream.aclose()
+        self.assertEqual(_texts([s async for s in stream]), ["I am fine"])
+
+    async def test_flush_emits_unterminated_text(self) -> None:
+        stream = SentenceTokenizer(min_length=50).stream()
+        stream.push_text("Short. ")
+        await stream.flush()
+        stream.push_text("Next")
+        await stream.aclose()
+
+        self.assertEqual(_texts([s async for s in stream]), ["Short.", "Next"])
+
+    async def test_push_after_close_fails(self) -> None:
+        stream = SentenceTokenizer().stream()
+        await stream.aclose()
+
+        with self.assertRaises(RuntimeError):
+            stream.push_text("late")
+
+
+if __name__ == "__main__":
+    unittest.main()
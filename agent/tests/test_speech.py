@@ -0,0 +1,117 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import main
+from core import PromptQueue, SpeechController
+
+
+class SpeechControllerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_completed(self) -> None:
+        speech = SpeechController()
+
+        async def say() -> None:
+            await asyncio.sleep(0)
+
+        self.assertTrue(await speech.run(say()))
+        self.assertFalse(speech.speaking)
+        self.assertEqual((speech.stats.started, speech.stats.completed), (1, 1))
+
+    async def test_interrupt(self) -> None:
+        speech = SpeechController()
+        started = asyncio.Event()
+
+        async def say() -> None:
+            started.set()
+            await asyncio.sleep(10)
+
+        run = asyncio.ensure_future(speech.run(say()))
+        await started.wait()
+        self.assertTrue(speech.speaking)
+
+        self.assertTrue(speech.interrupt())
+        # a speech is only interrupted once
+        self.assertFalse(speech.interrupt())
+        self.assertFalse(await run)
+        self.assertEqual((speech.stats.interrupted, speech.stats.completed), (1, 0))
+
+    async def test_new_speech_interrupts_previous(self) -> None:
+        speech = SpeechController()
+        started = asyncio.Event()
+
+        async def long() -> None:
+            started.set()
+            await asyncio.sleep(10)
+
+        async def short() -> None:
+            pass
+
+        first = asyncio.ensure_future(speech.run(long()))
+        await started.wait()
+
+        self.assertTrue(await speech.run(short()))
+        self.assertFalse(await first)
+
+    async def test_error_is_raised_and_counted(self) -> None:
+        speech = SpeechController()
+
+        async def fail() -> None:
+            raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            await speech.run(fail())
+        self.assertEqual((speech.stats.failed, speech.stats.completed), (1, 0))
+
+
+class TurnOutcomeTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        agent = self.agent = main.WardaAgent.__new__(main.WardaAgent)
+        agent.prompts = PromptQueue()
+        agent.speech = SpeechController()
+        agent.state = mock.Mock()
+        agent.chat_agent = mock.Mock()
+
+    async def _turn_outcome(self, reply=None) -> str:
+        agent = self.agent
+        if reply is not None:
+            agent.reply = reply
+
+        finished = asyncio.get_running_loop().create_future()
+        trace = mock.Mock()
+        trace.finish.side_effect = finished.set_result
+        agent.prompts.put_nowait("Hello", trace)
+
+        worker = asyncio.ensure_future(agent.chat_publish_worker())
+        try:
+            return await asyncio.wait_for(finished, 1)
+        finally:
+            worker.cancel()
+
+    async def test_completed(self) -> None:
+        async def reply(prompt: str) -> None:
+            pass
+
+        self.assertEqual(await self._turn_outcome(reply), "completed")
+
+    async def test_llm_timeout(self) -> None:
+        async def reply(prompt: str) -> None:
+            raise asyncio.TimeoutError()
+
+        self.assertEqual(await self._turn_outcome(reply), "timeout")
+
+    async def test_llm_failure(self) -> None:
+        async def reply(prompt: str) -> None:
+            raise RuntimeError("LLM unavailable")
+
+        with self.assertLogs(level="ERROR"):
+            self.assertEqual(await self._turn_outcome(reply), "failed")
+
+    async def test_reply_raises_llm_timeout(self) -> None:
+        self.agent.chat_agent.astep = mock.AsyncMock(side_effect=asyncio.TimeoutError())
+
+        with mock.patch.object(main.settings, "TTS_STREAMING", False), self.assertLogs(level="ERROR"):
+            self.assertEqual(await self._turn_outcome(), "timeout")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import asyncio
+import unittest
+from typing import List
+
+from core import StatePublisher
+
+
+class StatePublisherTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.sent: List[str] = []
+        self.fail = False
+
+    async def _publish(self, state: str) -> None:
+        if self.fail:
+            raise RuntimeError("offline")
+        self.sent.append(state)
+
+    def _publisher(self, window: float = 0.01, min_interval: float = 0.0) -> StatePublisher[str]:
+        publisher = StatePublisher(self._publish, window=window, min_interval=min_interval)
+        self.addCleanup(publisher.close)
+        return publisher
+
+    async def test_burst_published_as_the_last_state(self) -> None:
+        publisher = self._publisher()
+        for state in ["listening", "thinking", "speaking"]:
+            publisher.set(state)
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(self.sent, ["speaking"])
+        self.assertEqual(publisher.published, "speaking")
+        self.assertEqual((publisher.stats.published, publisher.stats.coalesced), (1, 2))
+
+    async def test_published_state_not_sent_again(self) -> None:
+        publisher = self._publisher()
+        publisher.set("listening")
+        await asyncio.sleep(0.05)
+        publisher.set("listening")
+        # flapping back within the window sends nothing
+        publisher.set("speaking")
+        publisher.set("listening")
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(self.sent, ["listening"])
+        self.assertEqual((publisher.stats.published, publisher.stats.skipped), (1, 1))
+
+    async def test_updates_spaced_by_min_interval(self) -> None:
+        publisher = self._publisher(window=0.0, min_interval=0.1)
+        publisher.set("listening")
+        await asyncio.sleep(0.02)
+        publisher.set("speaking")
+        await asyncio.sleep(0.02)
+        self.assertEqual(self.sent, ["listening"])
+
+        await asyncio.sleep(0.15)
+        self.assertEqual(self.sent, ["listening", "speaking"])
+
+    async def test_failed_publish_retried_by_the_next_set(self) -> None:
+        publisher = self._publisher()
+        self.fail = True
+        with self.assertLogs(level="WARNING"):
+            publisher.set("listening")
+            await asyncio.sleep(0.05)
+        self.assertEqual(publisher.stats.failed, 1)
+
+        self.fail = False
+        publisher.set("speaking")
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.sent, ["speaking"])
+
+    async def test_closed_publisher_ignores_states(self) -> None:
+        publisher = self._publisher()
+        publisher.set("listening")
+        publisher.close()
+        publisher.set("speaking")
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(self.sent, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+from core import ttl_cache
+from core.ttl_cache import AsyncTTLCache
+
+
+class _Loader:
+    """Loader counting its calls, each call waits for `release` and returns the next value."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> int:
+        self.calls += 1
+        value = self.calls
+        await self.release.wait()
+        return value
+
+
+class AsyncTTLCacheTest(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_loads_share_one_call(self) -> None:
+        cache: AsyncTTLCache[str, int] = AsyncTTLCache(ttl=60)
+        loader = _Loader()
+
+        tasks = [asyncio.create_task(cache.get_or_load("a", loader)) for _ in range(5)]
+        await asyncio.sleep(0)
+        loader.release.set()
+
+        self.assertEqual(await asyncio.gather(*tasks), [1] * 5)
+        self.assertEqual(loader.calls, 1)
+        self.assertEqual((cache.stats.loads, cache.stats.coalesced), (1, 4))
+        self.assertEqual(await cache.get_or_load("a", loader), 1)
+        self.assertEqual(cache.stats.hits, 1)
+
+    async def test_expired_value_is_loaded_again(self) -> None:
+        cache: AsyncTTLCache[str, int] = AsyncTTLCache(ttl=10)
+        loader = _Loader()
+        loader.release.set()
+
+        with mock.patch.object(ttl_cache.time, "monotonic", return_value=100.0):
+            self.assertEqual(await cache.get_or_load("a", loader), 1)
+        with mock.patch.object(ttl_cache.time, "monotonic", return_value=111.0):
+            self.assertIsNone(cache.get("a"))
+            self.assertEqual(await cache.get_or_load("a", loader), 2)
+
+    async def test_oldest_entry_evicted(self) -> None:
+        cache: AsyncTTLCache[str, int] = AsyncTTLCache(ttl=60, maxsize=2)
+        for i, key in enumerate("abc"):
+            cache.set(key, i)
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual((cache.get("b"), cache.get("c")), (1, 2))
+
+    async def test_invalidate_during_load_discards_result(self) -> None:
+        cache: AsyncTTLCache[str, int] = AsyncTTLCache(ttl=60)
+        loader = _Loader()
+
+        first = asyncio.create_task(cache.get_or_load("a", loader))
+        await asyncio.sleep(0)
+        cache.invalidate("a")
+        # the stale load is no longer shared, a new caller loads again
+        second = asyncio.create_task(cache.get_or_load("a", loader))
+        await asyncio.sleep(0)
+        loader.release.set()
+
+        self.assertEqual(await first, 1)
+        self.assertEqual(await second, 2)
+        self.assertEqual(loader.calls, 2)
+        # only the load started after the invalidation is cached
+        self.assertEqual(cache.get("a"), 2)
+
+    async def test_failed_load_is_not_cached(self) -> None:
+        cache: AsyncTTLCache[str, int] = AsyncTTLCache(ttl=60)
+
+        async def fail() -> int:
+            raise RuntimeError("down")
+
+        with self.assertRaises(RuntimeError):
+            await cache.get_or_load("a", fail)
+        self.assertIsNone(cache.get("a"))
+
+    async def test_cancelled_loader_does_not_fail_waiters(self) -> None:
+        cache: AsyncTTLCache[str, int] = AsyncTTLCache(ttl=60)
+        loader = _Loader()
+
+        owner = asyncio.create_task(cache.get_or_load("a", loader))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_load("a", loader))
+        await asyncio.sleep(0)
+        owner.cancel()
+        await asyncio.sleep(0)
+        loader.release.set()
+
+        self.assertEqual(await waiter, 2)
+        with self.assertRaises(asyncio.CancelledError):
+            await owner
+
+    async def test_loads_are_per_event_loop(self) -> None:
+        cache: AsyncTTLCache[str, int] = AsyncTTLCache(ttl=60)
+        loader = _Loader()
+        pending = asyncio.create_task(cache.get_or_load("a", loader))
+        await asyncio.sleep(0)
+
+        # a load in flight on this loop is not awaited from another loop, which loads on its own
+        result = []
+        thread = threading.Thread(target=lambda: result.append(asyncio.run(cache.get_or_load("a", self._ready))))
+        thread.start()
+        thread.join()
+        self.assertEqual(result, ["other loop"])
+        self.assertEqual(cache.get("a"), "other loop")
+
+        loader.release.set()
+        self.assertEqual(await pending, 1)
+
+    @staticmethod
+    async def _ready() -> str:
+        return "other loop"
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from plugins.openai import tts as tts_module
+from plugins.openai.tts_cache import TTSCache
+from plugins.openai.tts_codecs import PCM_SAMPLE_RATE
+
+
+def _key(text: str) -> str:
+    return TTSCache.key(text, "tts-1", "shimmer", PCM_SAMPLE_RATE)
+
+
+class TTSCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def test_key_depends_on_every_part(self) -> None:
+        keys = {
+            TTSCache.key("hi", "tts-1", "shimmer", 24000),
+            TTSCache.key("hi", "tts-1-hd", "shimmer", 24000),
+            TTSCache.key("hi", "tts-1", "alloy", 24000),
+            TTSCache.key("hi", "tts-1", "shimmer", 16000),
+            TTSCache.key("hi!", "tts-1", "shimmer", 24000),
+        }
+        self.assertEqual(len(keys), 5)
+        self.assertEqual(TTSCache.key("hi", "tts-1", "shimmer", 24000), TTSCache.key("hi", "tts-1", "shimmer", 24000))
+
+    def test_memory_lru(self) -> None:
+        cache = TTSCache(memory_limit=8)
+        cache.put("a", b"aaaa")
+        cache.put("b", b"bbbb")
+        # `a` becomes the most recently used, `b` is evicted by `c`
+        self.assertEqual(cache.get("a"), b"aaaa")
+        cache.put("c", b"cccc")
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), b"cccc")
+        self.assertEqual(cache.stats.memory_bytes, 8)
+        self.assertEqual(cache.stats.evictions, 1)
+        self.assertEqual((cache.stats.memory_hits, cache.stats.misses), (2, 1))
+
+    def test_entries_larger_than_memory_are_not_kept(self) -> None:
+        cache = TTSCache(memory_limit=4)
+        cache.put("a", b"aaaaaaaa")
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats.memory_bytes, 0)
+
+    def test_disk_hit_after_memory_eviction(self) -> None:
+        cache = TTSCache(memory_limit=4, disk_dir=self.dir, disk_limit=1024)
+        cache.put("a", b"aaaa")
+        cache.put("b", b"bbbb")
+
+        data = cache.get("a")
+        self.assertIsInstance(data, memoryview)
+        self.assertEqual(bytes(data), b"aaaa")
+        self.assertEqual((cache.stats.memory_hits, cache.stats.disk_hits), (0, 1))
+
+    def test_disk_index_survives_restart(self) -> None:
+        TTSCache(memory_limit=0, disk_dir=self.dir, disk_limit=1024).put("a", b"aaaa")
+
+        cache = TTSCache(memory_limit=0, disk_dir=self.dir, disk_limit=1024)
+
+        self.assertEqual(cache.stats.disk_bytes, 4)
+        self.assertEqual(bytes(cache.get("a")), b"aaaa")
+
+    def test_disk_eviction(self) -> None:
+        cache = TTSCache(memory_limit=0, disk_dir=self.dir, disk_limit=8)
+        cache.put("a", b"aaaa")
+        cache.put("b", b"bbbb")
+        cache.put("c", b"cccc")
+
+        self.assertIsNone(cache.get("a"))
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "a.pcm")))
+        self.assertEqual(bytes(cache.get("c")), b"cccc")
+        self.assertEqual((cache.stats.disk_bytes, cache.stats.disk_evictions), (8, 1))
+
+    def test_missing_disk_file_is_a_miss(self) -> None:
+        cache = TTSCache(memory_limit=0, disk_dir=self.dir, disk_limit=1024)
+        cache.put("a", b"aaaa")
+        os.unlink(os.path.join(self.dir, "a.pcm"))
+
+        with self.assertLogs(level="WARNING"):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats.disk_bytes, 0)
+
+    def test_empty_entries_are_not_cached(self) -> None:
+        cache = TTSCache(memory_limit=8, disk_dir=self.dir, disk_limit=8)
+        cache.put("a", b"")
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(os.listdir(self.dir), [])
+
+
+class CachedSynthesisTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = TTSCache(memory_limit=0, disk_dir=tmp.name, disk_limit=1 << 20)
+        self.tts = tts_module.TTS(cache=self.cache, client=mock.Mock(), scheduler=mock.Mock())
+
+    async def test_stream_serves_disk_hit_as_bounded_frames(self) -> None:
+        # 50 ms of audio, 20 ms frames
+        samples = PCM_SAMPLE_RATE // 20
+        self.cache.put(_key("Hello"), b"\1\0" * samples)
+
+        frames = [frame async for frame in self.tts.synthesize_stream("Hello", frame_ms=20)]
+
+        frame_samples = PCM_SAMPLE_RATE // 50
+        self.assertEqual([f.samples_per_channel for f in frames], [frame_samples, frame_samples, samples // 5])
+        self.assertEqual(b"".join(bytes(f.data) for f in frames), b"\1\0" * samples)
+        self.assertEqual(self.cache.stats.disk_hits, 1)
+        self.tts._client.audio.speech.create.assert_not_called()
+
+    async def test_synthesize_serves_hit_as_one_frame(self) -> None:
+        self.cache.put(_key("Hello"), b"\1\0" * 480)
+
+        audio = await self.tts.synthesize("Hello")
+
+        self.assertEqual(audio.data.samples_per_channel, 480)
+        self.tts._client.audio.speech.create.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
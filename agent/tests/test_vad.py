@@ -0,0 +1,118 @@
+import unittest
+
+import numpy as np
+from livekit import rtc
+from livekit.agents import vad
+
+from core import EnergyVAD
+from core.vad import FrameDetector
+from tests.audio import RATE, noise, tone
+
+FRAME = RATE // 50
+
+
+def speech_samples(events) -> int:
+    return sum(len(samples) for event_type, samples in events if event_type != vad.VADEventType.END_SPEAKING)
+
+
+class FrameDetectorTest(unittest.TestCase):
+    def test_segment_with_padding_and_trailing_silence(self) -> None:
+        detector = FrameDetector(min_speech=0.1, min_silence=0.5, padding=0.2)
+
+        events = detector.process(np.concatenate((noise(1), tone(1), noise(1))))
+
+        types = [event_type for event_type, _ in events]
+        self.assertEqual(
+            types, [vad.VADEventType.START_SPEAKING, vad.VADEventType.SPEAKING, vad.VADEventType.END_SPEAKING]
+        )
+        # 0.2 s of padding and the 0.1 s confirming the speech
+        self.assertEqual(len(events[0][1]), 15 * FRAME)
+        # the rest of the speech and the 0.5 s of silence ending it
+        self.assertEqual(len(events[1][1]), (45 + 25) * FRAME)
+        self.assertFalse(detector.speaking)
+        self.assertEqual(detector.stats.segments, 1)
+        self.assertEqual(detector.stats.speech_frames, 85)
+        self.assertEqual(detector.stats.frames, 150)
+
+    def test_chunks_are_carried_across_calls(self) -> None:
+        audio = np.concatenate((noise(1), tone(1), noise(1)))
+        whole = FrameDetector().process(audio)
+
+        detector = FrameDetector()
+        chunked = []
+        # chunk boundaries inside frames
+        for start in range(0, len(audio), 777):
+            chunked.extend(detector.process(audio[start:start + 777]))
+
+        def boundaries(events):
+            return [t for t, _ in events if t != vad.VADEventType.SPEAKING]
+
+        def samples(events):
+            return np.concatenate([s for _, s in events if len(s)])
+
+        self.assertEqual(boundaries(chunked), boundaries(whole))
+        self.assertTrue(np.array_equal(samples(chunked), samples(whole)))
+
+    def test_steady_noise_is_not_speech(self) -> None:
+        detector = FrameDetector()
+
+        self.assertEqual(detector.process(noise(3, amplitude=3000)), [])
+        self.assertEqual(detector.stats.segments, 0)
+
+    def test_short_noise_is_not_speech(self) -> None:
+        detector = FrameDetector(min_speech=0.1)
+
+        # 60 ms, less than the 100 ms of voiced frames starting speech
+        self.assertEqual(detector.process(np.concatenate((noise(1), tone(0.06), noise(1)))), [])
+
+    def test_max_speech_ends_segment(self) -> None:
+        detector = FrameDetector(max_speech=1.0)
+
+        events = detector.process(np.concatenate((noise(1), tone(3))))
+
+        end = next(i for i, (t, _) in enumerate(events) if t == vad.VADEventType.END_SPEAKING)
+        self.assertEqual(speech_samples(events[:end]), 50 * FRAME)
+        # the speech goes on in a new segment
+        self.assertEqual(events[end + 1][0], vad.VADEventType.START_SPEAKING)
+        self.assertTrue(detector.speaking)
+
+
+class EnergyVADStreamTest(unittest.IsolatedAsyncioTestCase):
+    async def test_events_of_resampled_frames(self) -> None:
+        stream = EnergyVAD().stream()
+        # 48 kHz stereo, as published by browsers
+        mono = np.concatenate((noise(1, rate=48000), tone(1, rate=48000), noise(1, rate=48000)))
+        stereo = np.repeat(mono, 2)
+        for start in range(0, len(stereo), 960 * 2):
+            chunk = stereo[start:start + 960 * 2]
+            stream.push_frame(
+                rtc.AudioFrame(
+                    data=chunk.tobytes(), sample_rate=48000, num_channels=2, samples_per_channel=len(chunk) // 2
+                )
+            )
+        await stream.aclose()
+
+        events = [event async for event in stream]
+
+        self.assertEqual(events[0].type, vad.VADEventType.START_SPEAKING)
+        self.assertEqual(events[-1].type, vad.VADEventType.END_SPEAKING)
+        streamed = sum(f.samples_per_channel for e in events[:-1] for f in e.speech)
+        # END_SPEAKING carries every frame of the segment, at the sample rate of the detector
+        self.assertEqual(sum(f.samples_per_channel for f in events[-1].speech), streamed)
+        self.assertAlmostEqual(events[-1].duration, streamed / RATE)
+        self.assertTrue(all(f.sample_rate == RATE and f.num_channels == 1 for f in events[-1].speech))
+        self.assertEqual(stream.stats.segments, 1)
+
+    async def test_closed_stream(self) -> None:
+        stream = EnergyVAD().stream()
+        await stream.aclose()
+
+        with self.assertRaises(RuntimeError):
+            stream.push_frame(
+                rtc.AudioFrame(data=bytes(640), sample_rate=RATE, num_channels=1, samples_per_channel=320)
+            )
+        self.assertEqual([event async for event in stream], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+from typing import List, Optional
+
+import numpy as np
+from livekit import rtc
+from livekit.agents import stt, utils
+
+from core import EnergyVAD, VoiceInput
+from tests.audio import RATE, noise, tone
+
+
+class _STT(stt.STT):
+    """Recognizes whole buffers, returning the next of `texts` after `delays` seconds."""
+
+    def __init__(self, texts: List[str], delays: Optional[List[float]] = None) -> None:
+        super().__init__(streaming_supported=False)
+        self._texts = list(texts)
+        self._delays = list(delays or [0.0] * len(texts))
+        self.seconds: List[float] = []
+
+    async def recognize(self, *, buffer: utils.AudioBuffer, language: Optional[str] = None) -> stt.SpeechEvent:
+        frame = utils.merge_frames(buffer)
+        self.seconds.append(frame.samples_per_channel / frame.sample_rate)
+        text, delay = self._texts.pop(0), self._delays.pop(0)
+        await asyncio.sleep(delay)
+        if text is None:
+            raise RuntimeError("STT failed")
+        return stt.SpeechEvent(is_final=True, alternatives=[stt.SpeechData(language="", text=text)])
+
+
+async def _frames(audio: np.ndarray):
+    for start in range(0, len(audio), RATE // 50):
+        chunk = audio[start:start + RATE // 50]
+        yield rtc.AudioFrame(data=chunk.tobytes(), sample_rate=RATE, num_channels=1, samples_per_channel=len(chunk))
+
+
+def _speech(*segments: float) -> np.ndarray:
+    parts = [noise(0.5)]
+    for seconds in segments:
+        parts += [tone(seconds), noise(1)]
+    return np.concatenate(parts)
+
+
+class VoiceInputTest(unittest.IsolatedAsyncioTestCase):
+    async def _run(self, recognizer: stt.STT, audio: np.ndarray) -> List[str]:
+        transcripts = []
+        voice_input = VoiceInput(recognizer, EnergyVAD(), lambda text, trace: transcripts.append(text))
+        await asyncio.wait_for(voice_input.run(_frames(audio)), 5)
+        self.voice_input = voice_input
+        return transcripts
+
+    async def test_only_speech_is_transcribed(self) -> None:
+        recognizer = _STT([" Hello "])
+
+        self.assertEqual(await self._run(recognizer, _speech(0.5)), ["Hello"])
+        # the padding, the speech and the silence ending it, not the whole 2 s track
+        self.assertLess(recognizer.seconds[0], 1.3)
+        self.assertEqual(self.voice_input.stats.segments, 1)
+        self.assertEqual(self.voice_input.stats.transcripts, 1)
+        self.assertAlmostEqual(self.voice_input.stats.audio_seconds, 2.0)
+
+    async def test_transcripts_keep_segment_order(self) -> None:
+        # the first segment takes longer to transcribe than the second
+        recognizer = _STT(["one", "two"], delays=[0.3, 0.0])
+
+        self.assertEqual(await self._run(recognizer, _speech(0.5, 0.5)), ["one", "two"])
+
+    async def test_empty_and_failed_segments_are_skipped(self) -> None:
+        recognizer = _STT(["", None, "three"])
+
+        with self.assertLogs(level="ERROR"):
+            transcripts = await self._run(recognizer, _speech(0.5, 0.5, 0.5))
+
+        self.assertEqual(transcripts, ["three"])
+        stats = self.voice_input.stats
+        self.assertEqual((stats.empty, stats.failed, stats.transcripts), (1, 1, 1))
+
+    async def test_speech_at_the_end_of_the_track(self) -> None:
+        recognizer = _STT(["cut off"])
+
+        self.assertEqual(await self._run(recognizer, np.concatenate((noise(0.5), tone(0.5)))), ["cut off"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import json
+import unittest
+from unittest import mock
+
+from services import wire
+from services.wire import Encoding, WireFormatError, decode, encode, negotiate
+
+_MSGS = [
+    {"id": "1", "timestamp": 1700000000000, "payload": {"text": "你好", "final": True}},
+    {"id": "2", "timestamp": 1700000000001, "payload": {"state": "speaking", "values": [1, 2.5, None]}},
+]
+
+
+class WireTest(unittest.TestCase):
+    def test_json_round_trip(self) -> None:
+        encoding, accepted, msgs = decode(encode(_MSGS, Encoding.JSON))
+
+        self.assertEqual(encoding, Encoding.JSON)
+        self.assertEqual(accepted, [e.value for e in wire.SUPPORTED_ENCODINGS])
+        self.assertEqual(msgs, _MSGS)
+
+    @unittest.skipUnless(wire.msgpack, "msgpack is not installed")
+    def test_msgpack_round_trip(self) -> None:
+        data = encode(_MSGS, Encoding.MSGPACK)
+
+        self.assertNotEqual(data[:1], b"{")
+        self.assertEqual(decode(data), (Encoding.MSGPACK, [e.value for e in wire.SUPPORTED_ENCODINGS], _MSGS))
+
+    def test_legacy_packet_passed_through(self) -> None:
+        legacy = {"id": "1", "message": json.dumps({"text": "hi"}), "timestamp": 1}
+
+        self.assertEqual(decode(json.dumps(legacy).encode()), (Encoding.LEGACY, [], [legacy]))
+
+    def test_negotiate_prefers_supported_encodings(self) -> None:
+        self.assertEqual(negotiate([]), Encoding.JSON)
+        self.assertEqual(negotiate(["cbor", "json"]), Encoding.JSON)
+        self.assertEqual(negotiate(["json", "msgpack"]), wire.SUPPORTED_ENCODINGS[0])
+
+    def test_legacy_cannot_be_encoded(self) -> None:
+        with self.assertRaises(WireFormatError):
+            encode(_MSGS, Encoding.LEGACY)
+
+    def test_invalid_packets_rejected(self) -> None:
+        for data in [b"{not json", json.dumps({"v": 3, "msgs": []}).encode(), json.dumps({"v": 2}).encode()]:
+            with self.subTest(data=data), self.assertRaises(WireFormatError):
+                decode(data)
+
+    def test_binary_packet_without_msgpack(self) -> None:
+        with mock.patch.object(wire, "msgpack", None), self.assertRaises(WireFormatError):
+            decode(b"\x81\xa1v\x02")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -76,7 +76,7 @@ export const AgentMultibandAudioVisualizer = ({
         let shadow = `shadow-lg-${accentColor}`;
         let transform;
 
-        if (state === "listening" || state === "idle") {
+        if (state === "listening" || state === "idle" || state === "interrupted") {
           color = isCenter ? `${accentColor}-${accentShade}` : "gray-950";
           shadow = !isCenter ? "" : shadow;
           transform = !isCenter ? "scale(1.0)" : "scale(1.2)";
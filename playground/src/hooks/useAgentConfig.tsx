@@ -1,12 +1,41 @@
-import {ChatMessage, useDataChannel} from "@livekit/components-react";
+import {useDataChannel} from "@livekit/components-react";
 import {useCallback, useState} from "react";
 import {ReceivedChatMessage, ReceivedDataMessage} from "@livekit/components-core";
 import {generateRandomAlphanumeric} from "@/lib/util";
 
 const agentConfigTopic = "agent-config-topic";
 
+// version 2 envelopes batch messages and embed payloads as values, see agent/services/wire.py
+const wireVersion = 2;
+
+interface WireMessage {
+  id: string;
+  payload: unknown;
+  timestamp: number;
+}
+
+interface WireEnvelope {
+  v: number;
+  enc?: string[];
+  msgs: WireMessage[];
+}
+
+function decodePacket(payload: Uint8Array): WireMessage[] {
+  const decoded = JSON.parse(new TextDecoder("utf-8").decode(payload));
+  if ("v" in decoded) {
+    return (decoded as WireEnvelope).msgs;
+  }
+  // legacy packets carry one message with the payload as a JSON string
+  return [{
+    id: decoded.id,
+    payload: JSON.parse(decoded.message),
+    timestamp: decoded.timestamp,
+  }];
+}
+
 export interface ModelConfig {
   modelType?: string;
+  modelPlatform?: string;
   dialogRound?: number;
   temperature?: number;
   outputLimit?: number;
@@ -30,40 +59,45 @@ export function useAgentConfig() {
   const [agentConfigServiceMessages, setAgentConfigServiceMessages ]= useState<ReceivedChatMessage[]>([]);
 
   const onDataReceived = useCallback((msg: ReceivedDataMessage) => {
-    const decoded = JSON.parse(
-      new TextDecoder("utf-8").decode(msg.payload)
-    );
-
-    let timestamp = new Date().getTime();
-    if ("timestamp" in decoded && decoded.timestamp > 0) {
-      timestamp = decoded.timestamp;
+    const wireMessages = decodePacket(msg.payload);
+    if (wireMessages.length === 0) {
+      return;
     }
 
-    const agentConfigServiceMessage: ReceivedChatMessage = {
-      id: generateRandomAlphanumeric(12),
-      message: decoded.message,
-      timestamp: timestamp,
-      from: decoded.from,
-    };
+    const received = wireMessages.map((wireMessage): ReceivedChatMessage => {
+      let timestamp = new Date().getTime();
+      if (wireMessage.timestamp > 0) {
+        timestamp = wireMessage.timestamp;
+      }
+
+      return {
+        id: generateRandomAlphanumeric(12),
+        message: JSON.stringify(wireMessage.payload),
+        timestamp: timestamp,
+        from: msg.from,
+      };
+    });
 
     setAgentConfigServiceMessages([
       ...agentConfigServiceMessages,
-      agentConfigServiceMessage
+      ...received
     ]);
 
-    setAgentConfig(JSON.parse(decoded.message) as AgentConfig);
+    setAgentConfig(wireMessages[wireMessages.length - 1].payload as AgentConfig);
 
   }, [agentConfigServiceMessages]);
 
   const {send, isSending} = useDataChannel(agentConfigTopic, onDataReceived);
 
   const sendAgentConfig = (agentConfig: AgentConfig) => {
-    const message = JSON.stringify(agentConfig);
-    const timestamp = Date.now();
-    const id = generateRandomAlphanumeric(12);
-    const chatMessage: ChatMessage = {id, message, timestamp};
+    const envelope: WireEnvelope = {
+      v: wireVersion,
+      // the agent replies in the first of these it supports
+      enc: ["json"],
+      msgs: [{id: generateRandomAlphanumeric(12), payload: agentConfig, timestamp: Date.now()}],
+    };
 
-    const encodedMsg = new TextEncoder().encode(JSON.stringify(chatMessage));
+    const encodedMsg = new TextEncoder().encode(JSON.stringify(envelope));
 
     send(encodedMsg, {reliable: true, topic: agentConfigTopic});
   }
@@ -20,5 +20,6 @@ export type AgentState =
   | "listening"
   | "speaking"
   | "thinking"
+  | "interrupted"
   | "offline"
   | "starting";
@@ -0,0 +1,32 @@
+-- Partial, single round trip update used by the agent through PostgREST (POST /rpc/update_agent_config).
+-- Only the columns present in `p_changes` are written and `model_config` keys are merged into the stored
+-- JSON, so concurrent edits of different settings do not overwrite each other. When
+-- `p_expected_updated_at` is given the row is only updated if it has not changed since, otherwise no row
+-- is returned.
+--
+-- Runs after agent.sql on a fresh volume. Databases created before the function existed need it applied
+-- once, see the README; applying it again only replaces the function and reloads the PostgREST schema cache.
+CREATE OR REPLACE FUNCTION update_agent_config(
+    p_agent_id VARCHAR,
+    p_changes JSONB,
+    p_expected_updated_at TIMESTAMP DEFAULT NULL
+) RETURNS SETOF agent AS $$
+    UPDATE agent SET
+        agent_name = CASE WHEN p_changes ? 'agent_name' THEN p_changes->>'agent_name' ELSE agent_name END,
+        system_message = CASE WHEN p_changes ? 'system_message' THEN p_changes->>'system_message' ELSE system_message END,
+        system_message_limit = CASE WHEN p_changes ? 'system_message_limit'
+            THEN (p_changes->>'system_message_limit')::INT ELSE system_message_limit END,
+        model_platform = CASE WHEN p_changes ? 'model_platform' THEN p_changes->>'model_platform' ELSE model_platform END,
+        model_type = CASE WHEN p_changes ? 'model_type' THEN p_changes->>'model_type' ELSE model_type END,
+        model_config = CASE WHEN p_changes ? 'model_config'
+            THEN (COALESCE(NULLIF(model_config, ''), '{}')::JSONB || (p_changes->'model_config'))::TEXT
+            ELSE model_config END,
+        memory = CASE WHEN p_changes ? 'memory' THEN p_changes->>'memory' ELSE memory END,
+        memory_limit = CASE WHEN p_changes ? 'memory_limit' THEN (p_changes->>'memory_limit')::INT ELSE memory_limit END,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE agent_id = p_agent_id
+      AND (p_expected_updated_at IS NULL OR updated_at = p_expected_updated_at)
+    RETURNING *;
+$$ LANGUAGE SQL VOLATILE;
+
+NOTIFY pgrst, 'reload schema';